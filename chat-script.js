@@ -125,7 +125,7 @@ class OllamaChat {
                 body: JSON.stringify({
                     model: this.selectedModel,
                     prompt: prompt,
-                    stream: false
+                    stream: true
                 }),
             });
             
@@ -133,13 +133,54 @@ class OllamaChat {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const data = await response.json();
+            if (!response.body) {
+                // No readable stream in this browser; wait for the whole reply
+                const text = await response.text();
+                const reply = text.split('\n').filter(line => line.trim())
+                    .map(line => JSON.parse(line).response || '').join('');
+                this.removeTypingIndicator(typingId);
+                this.addMessage('assistant', reply || 'No response received');
+                return;
+            }
             
-            // Remove typing indicator
-            this.removeTypingIndicator(typingId);
+            // Show tokens as they arrive, re-rendering at most once per frame
+            let message = null;
+            let renderer = null;
+            let contentDiv = null;
+            await window.MarkdownUtils.readNdjson(response, (chunk) => {
+                if (chunk.error) {
+                    throw new Error(chunk.error);
+                }
+                if (!message) {
+                    this.removeTypingIndicator(typingId);
+                    message = {
+                        role: 'assistant',
+                        content: '',
+                        timestamp: new Date().toLocaleTimeString()
+                    };
+                    contentDiv = this.renderMessage(message);
+                    contentDiv.innerHTML = '';
+                    renderer = window.MarkdownUtils
+                        ? window.MarkdownUtils.createStreamingRenderer(contentDiv, () => this.scrollToBottom())
+                        : null;
+                }
+                message.content += chunk.response || '';
+                if (renderer) {
+                    renderer.append(chunk.response || '');
+                } else {
+                    contentDiv.textContent = message.content;
+                }
+            });
             
-            // Add assistant response
-            this.addMessage('assistant', data.response || 'No response received');
+            if (!message) {
+                this.removeTypingIndicator(typingId);
+                this.addMessage('assistant', 'No response received');
+                return;
+            }
+            if (renderer) {
+                renderer.finish();
+            }
+            this.chatHistory.push(message);
             
         } catch (error) {
             console.error('Error sending message:', error);
@@ -193,6 +234,7 @@ class OllamaChat {
         }
         
         this.chatHistoryDiv.appendChild(messageDiv);
+        return contentDiv;
     }
     
     addTypingIndicator() {
@@ -11,7 +11,11 @@ import requests
 import subprocess
 import time
 import json
-from typing import Dict, Any
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Iterator, List, Tuple
 
 class OllamaWrapperCLI:
     def __init__(self):
@@ -94,6 +98,80 @@ class OllamaWrapperCLI:
         
         return {"success": False, "error": "No stop command succeeded"}
     
+    def read_corpus(self, path: str) -> Iterator[Tuple[Any, str]]:
+        """Yield (id, text) pairs from a text file (one chunk per line) or JSONL ({"id", "text"})"""
+        is_jsonl = path.endswith('.jsonl')
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                if is_jsonl:
+                    record = json.loads(line)
+                    yield record.get('id', line_number), record['text']
+                else:
+                    yield line_number, line.rstrip('\n')
+    
+    def embed_batch(self, session: requests.Session, model: str, texts: List[str],
+                    retries: int = 3) -> List[List[float]]:
+        """Embed a batch with one /api/embed call, sending duplicate texts once"""
+        unique = list(dict.fromkeys(texts))
+        for attempt in range(retries):
+            try:
+                response = session.post(f"{self.ollama_host}/api/embed",
+                                        json={"model": model, "input": unique}, timeout=300)
+                response.raise_for_status()
+                by_text = dict(zip(unique, response.json()["embeddings"]))
+                return [by_text[text] for text in texts]
+            except requests.RequestException:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+    
+    def embed_file(self, path: str, model: str, output: str, workers: int = 4,
+                   batch_size: int = 64) -> Dict[str, Any]:
+        """Embed a corpus into a JSONL file of {"id", "embedding"} records.
+        
+        Batches are sent by a pool of ``workers`` threads. Only a few batches
+        are held in memory at once and output keeps the input order, so
+        corpora of millions of chunks can be streamed through.
+        """
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        session.mount('https://', HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        
+        def batches():
+            batch = []
+            for record in self.read_corpus(path):
+                batch.append(record)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        
+        started = time.time()
+        count = 0
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool, open(output, 'w', encoding='utf-8') as out:
+            def write_oldest():
+                nonlocal count
+                batch, future = in_flight.popleft()
+                for (record_id, _), embedding in zip(batch, future.result()):
+                    out.write(json.dumps({"id": record_id, "embedding": embedding}) + "\n")
+                count += len(batch)
+                rate = count / max(time.time() - started, 1e-9)
+                print(f"\rEmbedded {count} texts ({rate:.0f}/s)", end="", file=sys.stderr, flush=True)
+            
+            for batch in batches():
+                texts = [text for _, text in batch]
+                in_flight.append((batch, pool.submit(self.embed_batch, session, model, texts)))
+                if len(in_flight) >= workers * 2:
+                    write_oldest()
+            while in_flight:
+                write_oldest()
+        print(file=sys.stderr)
+        return {"texts": count, "seconds": time.time() - started}
+    
     def print_status(self):
         """Print the current server status"""
         print("Checking Ollama server status...")
@@ -186,13 +264,36 @@ class OllamaWrapperCLI:
                 print("\nGoodbye!")
                 break
 
+def embed_main(cli: OllamaWrapperCLI, argv: List[str]):
+    """Bulk-embed a corpus file: python cli.py embed INPUT --model NAME"""
+    parser = argparse.ArgumentParser(prog="cli.py embed",
+                                     description="Embed a text file (one chunk per line) or JSONL corpus")
+    parser.add_argument("input", help="Text file, or .jsonl with {\"id\", \"text\"} records")
+    parser.add_argument("--model", required=True, help="Embedding model, e.g. nomic-embed-text")
+    parser.add_argument("--output", default=None, help="Output JSONL (default: INPUT.embeddings.jsonl)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent /api/embed calls")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per /api/embed call")
+    parser.add_argument("--host", default=cli.ollama_host, help="Ollama base URL")
+    args = parser.parse_args(argv)
+    
+    cli.ollama_host = args.host.rstrip('/')
+    output = args.output or f"{args.input}.embeddings.jsonl"
+    try:
+        result = cli.embed_file(args.input, args.model, output, args.workers, args.batch_size)
+    except (OSError, ValueError, KeyError, requests.RequestException) as e:
+        print(f"✗ Embedding failed: {e}")
+        sys.exit(1)
+    print(f"✓ Embedded {result['texts']} texts in {result['seconds']:.1f}s → {output}")
+
 def main():
     """Main entry point"""
     cli = OllamaWrapperCLI()
     
     if len(sys.argv) > 1:
         command = sys.argv[1].lower()
-        if command == "status":
+        if command == "embed":
+            embed_main(cli, sys.argv[2:])
+        elif command == "status":
             cli.print_status()
         elif command == "start":
             result = cli.start_server()
@@ -220,7 +321,7 @@ def main():
                 print(f"✗ Stop failed: {stop_result['error']}")
         else:
             print(f"Unknown command: {command}")
-            print("Usage: python cli.py [status|start|stop|restart]")
+            print("Usage: python cli.py [status|start|stop|restart|embed]")
     else:
         cli.run_interactive()
 
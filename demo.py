@@ -7,7 +7,7 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ollama_manager import app, create_templates
+from ollama_manager import build_arg_parser, create_templates, serve
 from unittest.mock import patch
 
 # Mock data for demonstration
@@ -38,6 +38,10 @@ def mock_list_models():
 def mock_pull_model(model_name):
     return True
 
+def mock_pull_model_stream(model_name):
+    yield {'status': 'pulling manifest'}
+    yield {'status': 'success'}
+
 def mock_delete_model(model_name):
     return True
 
@@ -57,20 +61,22 @@ def mock_show_model_info(model_name):
 
 def main():
     """Run the demo version with mocked data"""
+    args = build_arg_parser().parse_args()
     create_templates()
     
     print("Starting Ollama Model Manager Demo...")
     print("This version runs with mock data for demonstration purposes.")
-    print("Open your browser and go to: http://localhost:5000")
+    print(f"Open your browser and go to: http://localhost:{args.port}")
     print()
     
     # Patch the API methods with mock implementations
     with patch('ollama_manager.api.list_models', side_effect=mock_list_models), \
          patch('ollama_manager.api.pull_model', side_effect=mock_pull_model), \
+         patch('ollama_manager.api.pull_model_stream', side_effect=mock_pull_model_stream), \
          patch('ollama_manager.api.delete_model', side_effect=mock_delete_model), \
          patch('ollama_manager.api.show_model_info', side_effect=mock_show_model_info):
         
-        app.run(host='0.0.0.0', port=5000, debug=False)
+        serve(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Load test for concurrent streamed generations
+
+Opens many /api/generate streams at once and reports how many were in
+flight together, time-to-first-token and total wall time.
+
+Against a running manager (Flask or ASGI):
+    python load_test.py --url http://localhost:5000 --concurrency 300
+
+In-process, with the ASGI app wired to a fake Ollama that streams tokens
+slowly (no Ollama or GPU needed):
+    python load_test.py --in-process --concurrency 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+
+class FakeOllama:
+    """Minimal Ollama stand-in that streams tokens with a fixed delay"""
+
+    def __init__(self, tokens: int = 10, delay: float = 0.05):
+        self.tokens = tokens
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    def app(self) -> Starlette:
+        async def generate(request):
+            await request.json()
+
+            async def chunks():
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                try:
+                    for i in range(self.tokens):
+                        await asyncio.sleep(self.delay)
+                        yield json.dumps({'response': f'tok{i} ', 'done': False}) + '\n'
+                    yield json.dumps({'response': '', 'done': True}) + '\n'
+                finally:
+                    self.active -= 1
+
+            return StreamingResponse(chunks(), media_type='application/x-ndjson')
+
+        return Starlette(routes=[Route('/api/generate', generate, methods=['POST'])])
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_load_test(client: httpx.AsyncClient, concurrency: int,
+                        model: str = 'llama2', timeout: float = 120.0) -> Dict:
+    """Fire ``concurrency`` streamed generations at once and collect timings"""
+    in_flight = 0
+    peak = 0
+    first_token: List[float] = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal in_flight, peak, failures
+        started = time.perf_counter()
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            async with client.stream('POST', '/api/generate', timeout=timeout, json={
+                'model': model,
+                'prompt': f'Request {i}',
+                'stream': True
+            }) as response:
+                if response.status_code != 200:
+                    failures += 1
+                    return
+                seen_first = False
+                async for line in response.aiter_lines():
+                    if line and not seen_first:
+                        first_token.append(time.perf_counter() - started)
+                        seen_first = True
+        except httpx.HTTPError:
+            failures += 1
+        finally:
+            in_flight -= 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': concurrency,
+        'failures': failures,
+        'peak_client_concurrency': peak,
+        'ttft_p50': percentile(first_token, 0.5),
+        'ttft_p99': percentile(first_token, 0.99),
+        'elapsed': elapsed
+    }
+
+
+async def run_in_process(concurrency: int, tokens: int, delay: float) -> Dict:
+    """Run the load test against the ASGI app and a fake upstream"""
+    from ollama_manager_asgi import AsyncOllamaAPI, create_app
+
+    fake = FakeOllama(tokens=tokens, delay=delay)
+    api = AsyncOllamaAPI(pool_size=concurrency,
+                         transport=httpx.ASGITransport(app=fake.app()))
+    app = create_app(api)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://manager') as client:
+        result = await run_load_test(client, concurrency)
+    await api.aclose()
+    result['peak_upstream_streams'] = fake.peak
+    result['ideal_elapsed'] = tokens * delay
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='Manager base URL')
+    parser.add_argument('--model', default='llama2', help='Model to generate with')
+    parser.add_argument('-c', '--concurrency', type=int, default=200, help='Concurrent streams')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Test the ASGI app against a fake in-process Ollama')
+    parser.add_argument('--tokens', type=int, default=20, help='Fake upstream tokens per reply')
+    parser.add_argument('--delay', type=float, default=0.05, help='Fake upstream delay per token')
+    args = parser.parse_args(argv)
+
+    if args.in_process:
+        result = asyncio.run(run_in_process(args.concurrency, args.tokens, args.delay))
+    else:
+        async def remote():
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=args.url, limits=limits) as client:
+                return await run_load_test(client, args.concurrency, args.model)
+        result = asyncio.run(remote())
+
+    for key, value in result.items():
+        print(f"{key:>24}: {value:.3f}" if isinstance(value, float) else f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
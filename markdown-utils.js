@@ -104,6 +104,115 @@ function renderChatContent(content) {
     }
 }
 
+/**
+ * Renders a message that arrives in pieces (a streamed reply) into an element.
+ * Text is re-rendered at most once per animation frame. Completed blocks
+ * (text up to a blank line outside a code fence) are rendered once and left
+ * alone, so each frame only re-renders the unfinished last block and the
+ * total work stays linear in the reply length.
+ * @param {HTMLElement} element - The element to render into
+ * @param {Function} [onRender] - Called after each render (e.g. to scroll)
+ * @returns {{append: Function, finish: Function}} - append(text) adds text;
+ *     finish() renders the whole reply once more and returns its text
+ */
+function createStreamingRenderer(element, onRender) {
+    let text = '';
+    let settled = 0;     // Characters already rendered into finished blocks
+    let boundary = 0;    // End of the last complete block seen so far
+    let lineStart = 0;   // Start of the first line not yet scanned
+    let inFence = false;
+    let frame = null;
+    
+    const tail = document.createElement('div');
+    tail.className = 'markdown-tail';
+    element.appendChild(tail);
+    
+    function scanLines() {
+        // Each character is scanned once, as part of a completed line
+        let newline = text.indexOf('\n', lineStart);
+        while (newline !== -1) {
+            const line = text.slice(lineStart, newline);
+            if (/^\s*(```|~~~)/.test(line)) {
+                inFence = !inFence;
+            } else if (!inFence && line.trim() === '') {
+                boundary = newline + 1;
+            }
+            lineStart = newline + 1;
+            newline = text.indexOf('\n', lineStart);
+        }
+    }
+    
+    function render() {
+        frame = null;
+        scanLines();
+        if (boundary > settled) {
+            const block = document.createElement('div');
+            block.className = 'markdown-block';
+            block.innerHTML = renderChatContent(text.slice(settled, boundary));
+            element.insertBefore(block, tail);
+            settled = boundary;
+        }
+        tail.innerHTML = renderChatContent(text.slice(settled));
+        if (onRender) {
+            onRender();
+        }
+    }
+    
+    return {
+        append(chunk) {
+            text += chunk;
+            if (frame === null) {
+                frame = requestAnimationFrame(render);
+            }
+        },
+        finish() {
+            if (frame !== null) {
+                cancelAnimationFrame(frame);
+                frame = null;
+            }
+            // One full render so lists and paragraphs split across blocks join up
+            element.innerHTML = renderChatContent(text);
+            if (onRender) {
+                onRender();
+            }
+            return text;
+        }
+    };
+}
+
+/**
+ * Reads an NDJSON response body (a streamed reply), calling onChunk with each
+ * parsed object as soon as its line is complete.
+ * @param {Response} response - A fetch response with a streaming body
+ * @param {Function} onChunk - Called with each parsed object; may throw to stop
+ * @returns {Promise<void>} - Resolves once the body has been read
+ */
+async function readNdjson(response, onChunk) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    try {
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.trim()) {
+                    onChunk(JSON.parse(line));
+                }
+            }
+        }
+        buffer += decoder.decode();
+        if (buffer.trim()) {
+            onChunk(JSON.parse(buffer));
+        }
+    } finally {
+        reader.releaseLock();
+    }
+}
+
 // Export functions for use in different contexts
 if (typeof module !== 'undefined' && module.exports) {
     // Node.js environment
@@ -111,6 +220,8 @@ if (typeof module !== 'undefined' && module.exports) {
         hasMarkdownContent,
         renderMarkdown,
         renderChatContent,
+        createStreamingRenderer,
+        readNdjson,
         escapeHtml
     };
 } else {
@@ -119,6 +230,8 @@ if (typeof module !== 'undefined' && module.exports) {
         hasMarkdownContent,
         renderMarkdown,
         renderChatContent,
+        createStreamingRenderer,
+        readNdjson,
         escapeHtml
     };
 }
\ No newline at end of file
@@ -12,104 +12,3100 @@ A simple web-based GUI for managing local Ollama models with the ability to:
 - Delete models (with confirmation)
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, stream_with_context
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import threading
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 import os
+import argparse
+import base64
+import tempfile
+import uuid
+import hashlib
+import re
+import bisect
+import heapq
+import math
+import gzip
+import zlib
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+try:
+    import brotli  # Optional: enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+
+class Metrics:
+    """Prometheus-style counters, gauges and histograms.
+    
+    Each thread records into its own shard, so recording takes no lock;
+    shards are only summed when /metrics is scraped. The shard of a
+    finished thread is folded into a shared "retired" shard.
+    """
+    
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+    
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Dict] = []
+        self._retired: Dict = {}
+        self._families: Dict[str, tuple] = {}
+        self._callbacks: Dict[str, object] = {}
+    
+    def describe(self, name: str, kind: str, help_text: str, buckets: Optional[tuple] = None):
+        """Declare a metric family (kind is 'counter', 'gauge' or 'histogram')"""
+        self._families[name] = (kind, help_text, tuple(buckets or self.DEFAULT_BUCKETS))
+    
+    def gauge_callback(self, name: str, callback):
+        """Report a gauge by calling ``callback()`` at scrape time"""
+        self._callbacks[name] = callback
+    
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """Add to a counter (or to a gauge, with a negative amount to subtract)"""
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        shard[key] = shard.get(key, 0.0) + amount
+    
+    def observe(self, name: str, value: float, **labels):
+        """Record one histogram observation"""
+        buckets = self._families[name][2]
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket, then +Inf, then the running sum
+            counts = shard[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+    
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(threading.current_thread(), self._retire, shard)
+        return shard
+    
+    def _retire(self, shard: Dict):
+        with self._lock:
+            self._merge(self._retired, shard)
+            self._shards = [s for s in self._shards if s is not shard]
+    
+    @staticmethod
+    def _merge(target: Dict, shard: Dict):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                current = target.get(key)
+                target[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target[key] = target.get(key, 0.0) + value
+    
+    def snapshot(self) -> Dict:
+        """Sum all shards into ``{(name, labels): value}``"""
+        totals: Dict = {}
+        with self._lock:
+            self._merge(totals, self._retired)
+            shards = list(self._shards)
+        for shard in shards:
+            self._merge(totals, shard)
+        return totals
+    
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        totals = self.snapshot()
+        for name, callback in self._callbacks.items():
+            try:
+                totals[(name, ())] = float(callback())
+            except Exception:
+                pass
+        
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._families.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(totals.items()):
+                if metric != name:
+                    continue
+                if kind != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {value:g}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else f'{bound:g}'
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]:g}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: tuple) -> str:
+    """Format label pairs as a Prometheus label set"""
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+metrics = Metrics()
+metrics.describe('ollama_manager_http_request_duration_seconds', 'histogram',
+                 'Time spent serving requests, by route (streams are timed until they finish)')
+metrics.describe('ollama_manager_http_requests_in_flight', 'gauge',
+                 'Requests currently being served, including open streams')
+metrics.describe('ollama_manager_upstream_request_duration_seconds', 'histogram',
+                 'Time until Ollama responded with headers, by Ollama endpoint')
+metrics.describe('ollama_manager_upstream_errors_total', 'counter',
+                 'Requests to Ollama that failed without a response, by Ollama endpoint')
+metrics.describe('ollama_manager_generate_time_to_first_token_seconds', 'histogram',
+                 'Time from receiving a /api/generate request to relaying the first token, by model')
+metrics.describe('ollama_manager_generate_duration_seconds', 'histogram',
+                 'Time from receiving a non-streamed /api/generate request to the full reply, by model',
+                 buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300))
+metrics.describe('ollama_manager_generate_tokens_per_second', 'histogram',
+                 "Generation speed reported by Ollama's eval_count/eval_duration, by model",
+                 buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300))
+metrics.describe('ollama_manager_generated_tokens_total', 'counter',
+                 'Tokens generated by Ollama, by model')
+metrics.describe('ollama_manager_cache_requests_total', 'counter',
+                 'Cache lookups by cache and result (hit, miss or coalesced)')
+metrics.describe('ollama_manager_generate_failovers_total', 'counter',
+                 'Generation requests that failed on a host and were retried on the next, by host')
+metrics.describe('ollama_manager_admission_queue_seconds', 'histogram',
+                 'Time generation requests waited for a slot, by priority class')
+metrics.describe('ollama_manager_admission_rejected_total', 'counter',
+                 'Generation requests turned away, by reason (queue_full or queue_timeout) and priority class')
+metrics.describe('ollama_manager_admission_queued', 'gauge',
+                 'Generation requests waiting for a slot in this process')
+metrics.describe('ollama_manager_embed_batch_size', 'histogram',
+                 'Distinct texts per batched /api/embed call, by model',
+                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+metrics.describe('ollama_manager_pull_jobs_active', 'gauge',
+                 'Model pull jobs queued or running in this process')
+metrics.describe('ollama_manager_compressed_responses_total', 'counter',
+                 'Responses sent compressed, by encoding and mode (buffered or streamed)')
+
+
+class QuantileSketch:
+    """Streaming quantile estimate in bounded memory.
+    
+    Values fall into logarithmic buckets, so any quantile is accurate to
+    within ``accuracy`` (relative). At most ``max_buckets`` buckets are
+    kept; beyond that the lowest ones are merged, which only costs
+    accuracy at the fast end. Counts are halved every ``decay_every``
+    values so the estimate follows the recent baseline.
+    """
+    
+    def __init__(self, accuracy: float = 0.02, max_buckets: int = 256, decay_every: int = 1000):
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self.max_buckets = max_buckets
+        self.decay_every = decay_every
+        self._buckets: Dict[int, float] = {}
+        self._since_decay = 0
+        self.count = 0.0
+    
+    def add(self, value: float):
+        index = math.ceil(math.log(max(value, 1e-6)) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0.0) + 1
+        self.count += 1
+        if len(self._buckets) > self.max_buckets:
+            lowest, second = sorted(self._buckets)[:2]
+            self._buckets[second] += self._buckets.pop(lowest)
+        self._since_decay += 1
+        if self._since_decay >= self.decay_every:
+            self._since_decay = 0
+            self._buckets = {i: n / 2 for i, n in self._buckets.items() if n > 0.02}
+            self.count = sum(self._buckets.values())
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                break
+        # Midpoint of the bucket (gamma**(index-1), gamma**index]
+        return 2 * math.exp(index * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+
+class LatencyBaseline:
+    """Learned latency baseline for one endpoint or model.
+    
+    Flags a single value as slow when it exceeds the baseline's ``quantile``
+    times ``factor``, and a sustained regression when the EWMA drifts past
+    the median times ``drift``. Neither fires before ``min_samples``.
+    """
+    
+    def __init__(self, alpha: float = 0.1, quantile: float = 0.99, factor: float = 3.0,
+                 drift: float = 2.0, min_samples: int = 20):
+        self.alpha = alpha
+        self.quantile = quantile
+        self.factor = factor
+        self.drift = drift
+        self.min_samples = min_samples
+        self.sketch = QuantileSketch()
+        self.ewma: Optional[float] = None
+        self.samples = 0
+    
+    def add(self, seconds: float):
+        self.samples += 1
+        self.sketch.add(seconds)
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+    
+    def threshold(self) -> Optional[float]:
+        """Slow-value threshold, or None while the baseline is still being learned"""
+        if self.samples < self.min_samples:
+            return None
+        return self.sketch.quantile(self.quantile) * self.factor
+    
+    def regressed(self) -> bool:
+        if self.samples < self.min_samples:
+            return False
+        return self.ewma > self.sketch.quantile(0.5) * self.drift
+    
+    def to_dict(self) -> Dict:
+        return {
+            'samples': self.samples,
+            'ewma': self.ewma,
+            'p50': self.sketch.quantile(0.5),
+            'p99': self.sketch.quantile(0.99),
+            'threshold': self.threshold(),
+            'regressed': self.regressed()
+        }
+
+
+class LatencyMonitor:
+    """Latency baselines per upstream endpoint and per model.
+    
+    Keys are ``(kind, name)`` pairs such as ``('endpoint', '/api/tags')``
+    or ``('model', 'llama2:latest')``; the least recently updated ones are
+    dropped beyond ``max_keys``.
+    """
+    
+    def __init__(self, max_keys: int = 256, **baseline_options):
+        self.max_keys = max_keys
+        self.baseline_options = baseline_options
+        self._lock = threading.Lock()
+        self._baselines: OrderedDict = OrderedDict()
+    
+    def observe(self, kind: str, name: str, seconds: float):
+        with self._lock:
+            baseline = self._baselines.get((kind, name))
+            if baseline is None:
+                baseline = self._baselines[(kind, name)] = LatencyBaseline(**self.baseline_options)
+                while len(self._baselines) > self.max_keys:
+                    self._baselines.popitem(last=False)
+            else:
+                self._baselines.move_to_end((kind, name))
+            baseline.add(seconds)
+    
+    def threshold(self, kind: str, name: str) -> Optional[float]:
+        with self._lock:
+            baseline = self._baselines.get((kind, name))
+            return baseline.threshold() if baseline else None
+    
+    def regressed(self, kind: str, name: str) -> bool:
+        with self._lock:
+            baseline = self._baselines.get((kind, name))
+            return baseline.regressed() if baseline else False
+    
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        with self._lock:
+            result: Dict[str, Dict[str, Dict]] = {}
+            for (kind, name), baseline in self._baselines.items():
+                result.setdefault(kind, {})[name] = baseline.to_dict()
+            return result
+
+
+latency = LatencyMonitor()
+
+
+class ModelListCache:
+    """Shared, time-limited cache for a single upstream result.
+    
+    Concurrent callers that miss the cache wait on one in-flight fetch
+    instead of each hitting Ollama. ``invalidate`` drops the cached value
+    and discards any fetch that was already running when it was called.
+    """
+    
+    def __init__(self, fetch, ttl: float = 5.0, name: str = 'models'):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0.0
+        self._inflight: Optional[threading.Event] = None
+        self._generation = 0
+    
+    def get(self):
+        """Return the cached value, fetching it if missing or expired"""
+        while True:
+            with self._lock:
+                if self._value is not None and time.monotonic() < self._expires:
+                    metrics.inc('ollama_manager_cache_requests_total', cache=self.name, result='hit')
+                    return self._value
+                event = self._inflight
+                if event is None:
+                    event = self._inflight = threading.Event()
+                    generation = self._generation
+                    break
+            # Another thread is already fetching; wait for it and re-check
+            metrics.inc('ollama_manager_cache_requests_total', cache=self.name, result='coalesced')
+            event.wait()
+        metrics.inc('ollama_manager_cache_requests_total', cache=self.name, result='miss')
+        
+        try:
+            value = self._fetch()
+        except BaseException:
+            with self._lock:
+                if self._inflight is event:
+                    self._inflight = None
+            event.set()
+            raise
+        
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._expires = time.monotonic() + self.ttl
+            if self._inflight is event:
+                self._inflight = None
+        event.set()
+        return value
+    
+    def set(self, value):
+        """Store a value fetched elsewhere as the current cached value"""
+        with self._lock:
+            self._value = value
+            self._expires = time.monotonic() + self.ttl
+    
+    def invalidate(self):
+        """Drop the cached value so the next call fetches fresh data"""
+        with self._lock:
+            self._value = None
+            self._expires = 0.0
+            self._generation += 1
+            self._inflight = None
+
+
+class ModelInfoCache:
+    """Bounded LRU cache for /api/show payloads with single-flight fetches.
+    
+    Keys are ``(model_name, digest, modified_at)`` tuples so a re-pulled
+    model gets a fresh entry. Concurrent lookups for a key that is being
+    fetched wait for that fetch and share its result or error.
+    """
+    
+    def __init__(self, maxsize: int = 64, name: str = 'model_info'):
+        self.maxsize = maxsize
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[tuple, Dict] = {}
+    
+    def get(self, key: tuple, fetch):
+        """Return the cached value for ``key``, calling ``fetch`` on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                metrics.inc('ollama_manager_cache_requests_total', cache=self.name, result='hit')
+                return self._entries[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {'event': threading.Event()}
+        
+        metrics.inc('ollama_manager_cache_requests_total', cache=self.name,
+                    result='miss' if leader else 'coalesced')
+        if not leader:
+            flight['event'].wait()
+            if 'error' in flight:
+                raise flight['error']
+            return flight['value']
+        
+        try:
+            value = fetch()
+        except Exception as e:
+            flight['error'] = e
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['event'].set()
+            raise
+        
+        flight['value'] = value
+        with self._lock:
+            # Only store if the key was not evicted while we were fetching
+            if self._inflight.pop(key, None) is flight:
+                self._entries[key] = value
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        flight['event'].set()
+        return value
+    
+    def evict(self, model_name: str):
+        """Remove every cached entry for a model"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_name]:
+                del self._entries[key]
+            for key in [k for k in self._inflight if k[0] == model_name]:
+                del self._inflight[key]
+
+
+class ResponseCache:
+    """Byte-bounded LRU cache of finished generations, with TTL and a disk tier.
+    
+    Entries hold the reply text and Ollama's final chunk, serialized as
+    JSON. The memory tier evicts least recently used entries beyond
+    ``max_bytes``. With ``disk_dir`` set, entries are also written there
+    and read back on memory misses (the disk tier is capped at
+    ``disk_max_bytes``, oldest files first), so they survive restarts and
+    are shared between worker processes.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+    
+    @staticmethod
+    def key(digest: str, prompt: str, context: Optional[List[int]], options: Optional[Dict]) -> str:
+        """Cache key for a generation of ``prompt`` by the model with ``digest``"""
+        material = json.dumps([digest, prompt, context or [], options or {}], sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """The cached ``{'response', 'final'}`` entry for ``key``, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    metrics.inc('ollama_manager_cache_requests_total', cache='response', result='hit')
+                    return json.loads(entry[1])
+                self._remove(key)
+        
+        body = self._read_disk(key, now)
+        if body is None:
+            metrics.inc('ollama_manager_cache_requests_total', cache='response', result='miss')
+            return None
+        metrics.inc('ollama_manager_cache_requests_total', cache='response', result='hit')
+        with self._lock:
+            self._store(key, body, now + self.ttl)
+        return json.loads(body)
+    
+    def put(self, key: str, response: str, final: Dict):
+        body = json.dumps({'response': response, 'final': final}).encode()
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, body, time.time() + self.ttl)
+        self._write_disk(key, body)
+    
+    def _store(self, key: str, body: bytes, expires: float):
+        self._remove(key)
+        self._entries[key] = (expires, body)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+    
+    def _read_disk(self, key: str, now: float) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, f'{key}.json')
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _write_disk(self, key: str, body: bytes):
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, f'{key}.json')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(
+                    entry.stat().st_size for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json')
+                )
+            else:
+                self._disk_bytes += len(body)
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+            # Over the cap: drop the oldest files until 10% below it
+            files = sorted(
+                (entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json')),
+                key=lambda entry: entry.stat().st_mtime
+            )
+            self._disk_bytes = sum(entry.stat().st_size for entry in files)
+            for entry in files:
+                if self._disk_bytes <= self.disk_max_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class ResponseCompressor:
+    """Negotiated gzip/brotli compression of response bodies.
+    
+    Buffered bodies smaller than ``min_size`` are sent as they are.
+    Streamed bodies (generation NDJSON) are compressed chunk by chunk with a
+    sync flush after each chunk, so tokens still reach the client as they
+    are produced. Compressed copies of responses that carry an ETag are
+    kept in a byte-bounded LRU, so a cacheable payload is compressed once
+    rather than on every request. Brotli is offered only when the
+    ``brotli`` package is installed.
+    """
+    
+    MIMETYPES = frozenset({
+        'application/json', 'application/x-ndjson', 'application/javascript',
+        'text/html', 'text/plain', 'text/css', 'text/javascript'
+    })
+    
+    def __init__(self, min_size: int = 1024, level: int = 6, brotli_quality: int = 5,
+                 cache_bytes: int = 16 * 1024 * 1024):
+        self.enabled = True
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._cache: OrderedDict = OrderedDict()
+        self._cached_bytes = 0
+    
+    def encodings(self) -> tuple:
+        """Supported encodings, most preferred first"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+    
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """The encoding to use for an Accept-Encoding header, or None for identity"""
+        if not accept_encoding:
+            return None
+        weights = {}
+        for part in accept_encoding.split(','):
+            name, _, params = part.strip().partition(';')
+            weight = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    weight = float(params[2:])
+                except ValueError:
+                    weight = 0.0
+            weights[name.strip().lower()] = weight
+        wildcard = weights.get('*', 0.0)
+        best, best_weight = None, 0.0
+        for encoding in self.encodings():
+            weight = weights.get(encoding, wildcard)
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+    
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+    
+    def stream_compressor(self, encoding: str):
+        """``(step, finish)`` for incremental compression.
+        
+        ``step(data)`` returns everything needed to decode ``data`` on the
+        client (it sync-flushes); ``finish()`` returns the stream's trailer.
+        """
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return (lambda data: compressor.process(data) + compressor.flush()), compressor.finish
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return (lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+    
+    def compress_stream(self, chunks, encoding: str):
+        """Compress an iterable of chunks, flushing after each one"""
+        step, finish = self.stream_compressor(encoding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if chunk:
+                    yield step(chunk)
+            yield finish()
+        finally:
+            # Closing the wrapper must still close the wrapped stream
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+    
+    def cached(self, data: bytes, encoding: str) -> bytes:
+        """Compressed ``data``, reusing an earlier compression of the same bytes"""
+        key = (hashlib.sha1(data).digest(), encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+        if body is not None:
+            metrics.inc('ollama_manager_cache_requests_total', cache='compressed', result='hit')
+            return body
+        metrics.inc('ollama_manager_cache_requests_total', cache='compressed', result='miss')
+        body = self.compress(data, encoding)
+        if len(body) <= self.cache_bytes:
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = body
+                    self._cached_bytes += len(body)
+                while self._cached_bytes > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return body
+    
+    def apply(self, response: Response, accept_encoding: Optional[str]) -> Response:
+        """Compress ``response`` in place if the client and the payload allow it"""
+        if not self.enabled or response.mimetype not in self.MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            return response
+        
+        if response.is_streamed:
+            response.response = self.compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            mode = 'streamed'
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            etag = response.headers.get('ETag')
+            body = self.cached(data, encoding) if etag else self.compress(data, encoding)
+            if len(body) >= len(data):
+                return response
+            response.set_data(body)
+            mode = 'buffered'
+        response.headers['Content-Encoding'] = encoding
+        # The encoded bytes differ, so a strong validator must become weak
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response.headers['ETag'] = f'W/{etag}'
+        metrics.inc('ollama_manager_compressed_responses_total', encoding=encoding, mode=mode)
+        return response
 
 
 class OllamaAPI:
     """Client for interacting with the Ollama API"""
     
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    # Default per-endpoint timeouts in seconds
+    DEFAULT_TIMEOUTS = {
+        '/api/tags': 10,
+        '/api/pull': 300,  # 5 minutes timeout for downloads
+        '/api/delete': 30,
+        '/api/show': 30,
+        '/api/ps': 5,
+        '/api/embed': 120,
+        '/api/generate': 60
+    }
+    
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 pool_size: int = 10, timeouts: Optional[Dict[str, float]] = None,
+                 models_ttl: float = 5.0, info_cache_size: int = 64):
         self.base_url = base_url.rstrip('/')
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        
+        # Shared keep-alive session so repeated calls reuse TCP connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Every /api/tags consumer shares one cached probe
+        self.models_cache = ModelListCache(self._probe_tags, ttl=models_ttl)
+        self.info_cache = ModelInfoCache(maxsize=info_cache_size)
+        
+        # Optional stamp file shared by worker processes; touching it
+        # invalidates the model list cache in every worker
+        self.invalidation_path: Optional[str] = None
+        self._invalidation_seen: Optional[int] = None
+    
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request to Ollama through the pooled session.
+        
+        Uses the configured timeout for ``path`` unless one is given.
+        Request errors are raised unchanged so callers can tell them apart.
+        """
+        kwargs.setdefault('timeout', self.timeouts.get(path, 30))
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException:
+            metrics.inc('ollama_manager_upstream_errors_total', endpoint=path)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.observe('ollama_manager_upstream_request_duration_seconds', elapsed, endpoint=path)
+        latency.observe('endpoint', path, elapsed)
+        return response
+    
+    def _probe_tags(self) -> Dict:
+        """Fetch /api/tags once and describe the outcome as a status dict"""
+        checked_at = datetime.now().isoformat()
+        try:
+            response = self.request('GET', '/api/tags')
+        except requests.exceptions.ConnectionError:
+            return {'status': 'stopped', 'error': 'Connection refused', 'checked_at': checked_at}
+        except requests.exceptions.Timeout:
+            return {'status': 'timeout', 'error': 'Request timed out', 'checked_at': checked_at}
+        except requests.RequestException as e:
+            return {'status': 'error', 'error': str(e), 'checked_at': checked_at}
+        
+        if response.status_code != 200:
+            return {
+                'status': 'error',
+                'error': f'HTTP {response.status_code}',
+                'response_time': response.elapsed.total_seconds(),
+                'checked_at': checked_at
+            }
+        try:
+            models = response.json().get('models', [])
+        except ValueError as e:
+            return {'status': 'error', 'error': f'Invalid response: {e}', 'checked_at': checked_at}
+        return {
+            'status': 'running',
+            'models': models,
+            'response_time': response.elapsed.total_seconds(),
+            'checked_at': checked_at
+        }
+    
+    def server_status(self) -> Dict:
+        """Get the (cached) result of the latest /api/tags probe"""
+        if self.invalidation_path:
+            stamp = self._invalidation_stamp()
+            if stamp != self._invalidation_seen:
+                self._invalidation_seen = stamp
+                self.models_cache.invalidate()
+        return self.models_cache.get()
+    
+    def refresh_status(self) -> Dict:
+        """Probe /api/tags now and store the result in the model list cache"""
+        status = self._probe_tags()
+        self.models_cache.set(status)
+        return status
+    
+    def invalidate_models(self):
+        """Force the next model list or status lookup to hit Ollama"""
+        self.models_cache.invalidate()
+        if self.invalidation_path:
+            with open(self.invalidation_path, 'a'):
+                os.utime(self.invalidation_path, None)
+    
+    def _invalidation_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.invalidation_path).st_mtime_ns
+        except OSError:
+            return None
     
     def list_models(self) -> List[Dict]:
         """List all local models"""
+        status = self.server_status()
+        if status['status'] != 'running':
+            raise Exception(f"Failed to connect to Ollama: {status.get('error', 'Unknown error')}")
+        return status['models']
+    
+    def pull_model(self, model_name: str) -> bool:
+        """Download/pull a model"""
+        try:
+            response = self.request('POST', '/api/pull', json={"name": model_name})
+            response.raise_for_status()
+            return True
+        except requests.RequestException as e:
+            raise Exception(f"Failed to pull model: {e}")
+        finally:
+            self.invalidate_models()
+            self.info_cache.evict(normalize_model_name(model_name))
+    
+    def pull_model_stream(self, model_name: str):
+        """Pull a model, yielding Ollama's progress updates as they arrive.
+        
+        The caller may stop iterating at any time; the upstream connection
+        is closed and the model caches are invalidated either way.
+        """
+        try:
+            response = self.request('POST', '/api/pull',
+                                    json={"name": model_name, "stream": True}, stream=True)
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    update = json.loads(line)
+                    if 'error' in update:
+                        raise Exception(f"Failed to pull model: {update['error']}")
+                    yield update
+            finally:
+                response.close()
+        except requests.RequestException as e:
+            raise Exception(f"Failed to pull model: {e}")
+        finally:
+            self.invalidate_models()
+            self.info_cache.evict(normalize_model_name(model_name))
+    
+    def delete_model(self, model_name: str) -> bool:
+        """Delete a model"""
+        try:
+            response = self.request('DELETE', '/api/delete', json={"name": model_name})
+            response.raise_for_status()
+            self.invalidate_models()
+            self.info_cache.evict(normalize_model_name(model_name))
+            return True
+        except requests.RequestException as e:
+            raise Exception(f"Failed to delete model: {e}")
+    
+    def embed(self, model: str, inputs: List[str]) -> List[List[float]]:
+        """Embed several texts with one /api/embed call"""
+        try:
+            response = self.request('POST', '/api/embed', json={"model": model, "input": inputs})
+            response.raise_for_status()
+            return response.json()['embeddings']
+        except requests.RequestException as e:
+            raise Exception(f"Failed to embed: {e}")
+    
+    def running_models(self) -> List[Dict]:
+        """List the models currently loaded in memory (/api/ps)"""
+        try:
+            response = self.request('GET', '/api/ps')
+            response.raise_for_status()
+            return response.json().get('models', [])
+        except requests.RequestException as e:
+            raise Exception(f"Failed to list running models: {e}")
+    
+    def show_model_info(self, model_name: str) -> Dict:
+        """Get detailed information about a model"""
+        name = normalize_model_name(model_name)
+        digest = modified_at = None
+        try:
+            for model in self.list_models():
+                if model.get('name') == name:
+                    digest = model.get('digest')
+                    modified_at = model.get('modified_at')
+                    break
+        except Exception:
+            pass  # Fall back to a name-only key; the fetch reports the error
+        return self.info_cache.get(
+            (name, digest, modified_at),
+            lambda: self._fetch_model_info(model_name)
+        )
+    
+    def _fetch_model_info(self, model_name: str) -> Dict:
+        """Fetch /api/show for a model without caching"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response = self.request('POST', '/api/show', json={"name": model_name})
             response.raise_for_status()
-            data = response.json()
-            return data.get('models', [])
+            return response.json()
         except requests.RequestException as e:
-            raise Exception(f"Failed to connect to Ollama: {e}")
+            raise Exception(f"Failed to get model info: {e}")
+
+
+class OllamaFleet:
+    """Several Ollama hosts queried concurrently.
+    
+    Calls fan out to every registered host at once. Each host has its own
+    small thread pool and its own deadline (the timeout of the Ollama
+    endpoint being called); a host that misses it is reported as timed out
+    while the other hosts' results are still returned. Until a timed-out
+    call finally returns, that host is skipped rather than given more work,
+    so a hung host never ties up threads that other hosts need. The primary
+    host (the one pulls, deletes and chats go to) is always registered
+    first and cannot be removed. With ``hosts_path`` set, the registry is
+    shared between worker processes through a JSON file.
+    """
+    
+    def __init__(self, primary: 'OllamaAPI', primary_name: str = 'local',
+                 workers_per_host: int = 4, hosts_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.primary_name = primary_name
+        self.workers_per_host = workers_per_host
+        self._hosts: OrderedDict = OrderedDict([(primary_name, self._host(primary_name, primary, None))])
+        self.hosts_path = hosts_path
+        self._hosts_mtime: Optional[int] = None
+    
+    def _host(self, name: str, client, timeout: Optional[float]) -> Dict:
+        return {
+            'client': client,
+            'timeout': timeout,
+            'executor': ThreadPoolExecutor(max_workers=self.workers_per_host,
+                                           thread_name_prefix=f'ollama-fleet-{name}'),
+            'overdue': 0
+        }
+    
+    def __len__(self) -> int:
+        self._sync()
+        with self._lock:
+            return len(self._hosts)
+    
+    def add_host(self, name: str, client, timeout: Optional[float] = None):
+        """Register a host by base URL or OllamaAPI client (replacing ``name``)"""
+        if isinstance(client, str):
+            client = OllamaAPI(client)
+        with self._lock:
+            previous = self._hosts.get(name)
+            self._hosts[name] = self._host(name, client, timeout)
+        if previous is not None:
+            previous['executor'].shutdown(wait=False)
+        self._save()
+        return client
+    
+    def remove_host(self, name: str) -> bool:
+        if name == self.primary_name:
+            raise ValueError('The primary host cannot be removed')
+        with self._lock:
+            host = self._hosts.pop(name, None)
+        if host is None:
+            return False
+        host['executor'].shutdown(wait=False)
+        self._save()
+        return True
+    
+    def client(self, name: str):
+        """The client for a registered host (KeyError if unknown)"""
+        self._sync()
+        with self._lock:
+            return self._hosts[name]['client']
+    
+    def hosts(self) -> List[Dict]:
+        self._sync()
+        with self._lock:
+            return [
+                {'name': name, 'base_url': host['client'].base_url, 'timeout': host['timeout']}
+                for name, host in self._hosts.items()
+            ]
+    
+    def fan_out(self, call, path: str = '/api/tags') -> Dict[str, Dict]:
+        """Run ``call(client)`` on every host at once.
+        
+        ``path`` is the Ollama endpoint ``call`` uses; its timeout is the
+        per-host deadline unless the host was registered with its own.
+        Returns ``{host: {'result': ...}}`` or ``{host: {'error': ...}}``
+        in registration order.
+        """
+        self._sync()
+        with self._lock:
+            hosts = list(self._hosts.items())
+        started = time.monotonic()
+        futures = []
+        results = {}
+        for name, host in hosts:
+            timeout = host['timeout'] or host['client'].timeouts.get(path, 10)
+            with self._lock:
+                busy = host['overdue'] > 0
+            if busy:
+                results[name] = {'error': 'Still waiting on an earlier call that timed out', 'timed_out': True}
+                continue
+            try:
+                futures.append((name, host, host['executor'].submit(call, host['client']), timeout))
+            except RuntimeError:  # Removed (executor shut down) while we were submitting
+                results[name] = {'error': 'Host was removed'}
+        for name, host, future, timeout in futures:
+            try:
+                results[name] = {'result': future.result(timeout=max(0.0, started + timeout - time.monotonic()))}
+            except FutureTimeout:
+                results[name] = {'error': f'No response within {timeout:g}s', 'timed_out': True}
+                self._mark_overdue(host, future)
+            except Exception as e:
+                results[name] = {'error': str(e)}
+        return OrderedDict((name, results[name]) for name, _ in hosts)
+    
+    def _mark_overdue(self, host: Dict, future: Future):
+        """Skip ``host`` in fan-outs until ``future`` (which missed its deadline) finishes"""
+        with self._lock:
+            host['overdue'] += 1
+        
+        def finished(_):
+            with self._lock:
+                host['overdue'] -= 1
+        future.add_done_callback(finished)
+    
+    def list_models(self):
+        """Models from every host, each tagged with ``host``, plus per-host errors"""
+        models = []
+        errors = {}
+        for name, outcome in self.fan_out(lambda client: client.list_models()).items():
+            if 'error' in outcome:
+                errors[name] = outcome['error']
+            else:
+                models.extend(dict(model, host=name) for model in outcome['result'])
+        return models, errors
+    
+    def server_status(self) -> Dict[str, Dict]:
+        """The latest status probe of every host"""
+        statuses = {}
+        for name, outcome in self.fan_out(lambda client: client.server_status()).items():
+            if 'error' in outcome:
+                statuses[name] = {
+                    'status': 'timeout' if outcome.get('timed_out') else 'error',
+                    'error': outcome['error']
+                }
+            else:
+                statuses[name] = outcome['result']
+        return statuses
+    
+    def show_model_info(self, model_name: str):
+        """Ask every host about a model; returns (host, info) from the first that has it"""
+        results = self.fan_out(lambda client: client.show_model_info(model_name), '/api/show')
+        for name, outcome in results.items():
+            if 'result' in outcome:
+                return name, outcome['result']
+        errors = [outcome['error'] for outcome in results.values()]
+        raise Exception(errors[0] if len(errors) == 1 else '; '.join(
+            f'{name}: {outcome["error"]}' for name, outcome in results.items()
+        ))
+    
+    def _save(self):
+        if not self.hosts_path:
+            return
+        with self._lock:
+            hosts = [
+                {'name': name, 'base_url': host['client'].base_url, 'timeout': host['timeout']}
+                for name, host in self._hosts.items()
+            ]
+            tmp_path = f'{self.hosts_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(hosts, f)
+            os.replace(tmp_path, self.hosts_path)
+            self._hosts_mtime = os.stat(self.hosts_path).st_mtime_ns
+    
+    def _sync(self):
+        """Reload the registry if another process changed the hosts file"""
+        if not self.hosts_path:
+            return
+        try:
+            mtime = os.stat(self.hosts_path).st_mtime_ns
+            if mtime == self._hosts_mtime:
+                return
+            with open(self.hosts_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            # Keep existing clients (and their caches and pools) for unchanged hosts
+            existing = {(name, host['client'].base_url): host for name, host in self._hosts.items()}
+            hosts = OrderedDict()
+            for entry in saved:
+                host = existing.pop((entry['name'], entry['base_url']), None)
+                if host is None:
+                    host = self._host(entry['name'], OllamaAPI(entry['base_url']), entry.get('timeout'))
+                host['timeout'] = entry.get('timeout')
+                hosts[entry['name']] = host
+            self._hosts = hosts
+            self._hosts_mtime = mtime
+        for host in existing.values():
+            host['executor'].shutdown(wait=False)
+
+
+class GenerationRouter:
+    """Chooses the Ollama host for each generation request.
+    
+    ``least-loaded`` orders hosts by generations in flight, breaking ties
+    by recent tokens/second. ``affinity`` puts hosts that already have the
+    model loaded (per /api/ps) first, so a model is not loaded onto every
+    GPU, unless they are more than ``spill`` requests busier than the
+    least loaded host. Hosts without the model are skipped, and a host
+    that failed is tried last for ``cooldown`` seconds. Callers try the
+    returned hosts in order until one answers.
+    """
+    
+    STRATEGIES = ('affinity', 'least-loaded')
+    
+    def __init__(self, fleet: OllamaFleet, strategy: str = 'affinity', placement_ttl: float = 5.0,
+                 spill: int = 2, cooldown: float = 30.0, alpha: float = 0.3):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown routing strategy: {strategy}')
+        self.fleet = fleet
+        self.strategy = strategy
+        self.placement_ttl = placement_ttl
+        self.spill = spill
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self._speed: Dict[str, float] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._placement: Dict[str, Optional[Dict]] = {}
+        self._placement_expires = 0.0
+    
+    def placement(self) -> Dict[str, Optional[Dict]]:
+        """Installed and loaded model names per host (None for unreachable hosts)"""
+        if time.monotonic() < self._placement_expires:
+            return self._placement
+        # Only the first lookup waits; later refreshes serve the stale view meanwhile
+        if not self._refresh_lock.acquire(blocking=not self._placement):
+            return self._placement
+        try:
+            if time.monotonic() >= self._placement_expires:
+                results = self.fleet.fan_out(lambda client: {
+                    'installed': {model['name'] for model in client.list_models()},
+                    'loaded': {model['name'] for model in client.running_models()}
+                })
+                self._placement = {name: outcome.get('result') for name, outcome in results.items()}
+                self._placement_expires = time.monotonic() + self.placement_ttl
+        finally:
+            self._refresh_lock.release()
+        return self._placement
+    
+    def candidates(self, model: str) -> List[str]:
+        """Hosts to try for ``model``, best first"""
+        hosts = [host['name'] for host in self.fleet.hosts()]
+        if len(hosts) == 1:
+            return hosts
+        name = normalize_model_name(model)
+        placement = self.placement()
+        now = time.monotonic()
+        with self._lock:
+            def load(host):
+                return (self._in_flight.get(host, 0), -self._speed.get(host, 0.0))
+            
+            installed = [host for host in hosts if placement.get(host) and name in placement[host]['installed']]
+            ordered = sorted(installed or hosts, key=load)
+            if self.strategy == 'affinity':
+                least = load(ordered[0])[0]
+                warm = [
+                    host for host in ordered
+                    if placement.get(host) and name in placement[host]['loaded']
+                    and self._in_flight.get(host, 0) <= least + self.spill
+                ]
+                ordered = warm + [host for host in ordered if host not in warm]
+            healthy = [host for host in ordered if self._failed_until.get(host, 0) <= now]
+            return healthy + [host for host in ordered if host not in healthy]
+    
+    def acquire(self, host: str, model: str):
+        """Count a generation starting on ``host``"""
+        with self._lock:
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            # Ollama loads the model for this request; prefer the host next time
+            placed = self._placement.get(host)
+            if placed:
+                placed['loaded'].add(normalize_model_name(model))
+    
+    def release(self, host: str, final: Optional[Dict] = None, failed: bool = False):
+        """Count a generation ending, learning speed from Ollama's final chunk"""
+        with self._lock:
+            self._in_flight[host] = max(0, self._in_flight.get(host, 0) - 1)
+            if failed:
+                self._failed_until[host] = time.monotonic() + self.cooldown
+                return
+            self._failed_until.pop(host, None)
+            if final and final.get('eval_count') and final.get('eval_duration'):
+                speed = final['eval_count'] / (final['eval_duration'] / 1e9)
+                previous = self._speed.get(host)
+                self._speed[host] = speed if previous is None else self.alpha * speed + (1 - self.alpha) * previous
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        placement = self._placement
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host['name']: {
+                    'in_flight': self._in_flight.get(host['name'], 0),
+                    'tokens_per_second': self._speed.get(host['name']),
+                    'cooling_down': self._failed_until.get(host['name'], 0) > now,
+                    'loaded': sorted(placement[host['name']]['loaded']) if placement.get(host['name']) else []
+                }
+                for host in self.fleet.hosts()
+            }
+
+
+class EmbeddingBatcher:
+    """Gathers concurrent embedding requests into batched /api/embed calls.
+    
+    The first text queued for a model opens a batch; everything queued for
+    that model in the next ``window`` seconds (up to ``max_batch`` distinct
+    texts) goes upstream in the same call. Identical texts share one slot.
+    The caller that opened a batch sends it, so no extra thread is needed.
+    """
+    
+    def __init__(self, client, window: float = 0.01, max_batch: int = 256):
+        self.client = client
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: Dict[str, OrderedDict] = {}
+    
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Embed ``texts`` with ``model``, batched with other callers"""
+        futures = []
+        opened = []
+        full = []
+        with self._lock:
+            for text in texts:
+                batch = self._pending.get(model)
+                if batch is None:
+                    batch = self._pending[model] = {'items': OrderedDict(), 'sent': False}
+                    opened.append(batch)
+                future = batch['items'].get(text)
+                if future is None:
+                    future = batch['items'][text] = Future()
+                else:
+                    metrics.inc('ollama_manager_cache_requests_total', cache='embed', result='coalesced')
+                futures.append(future)
+                if len(batch['items']) >= self.max_batch:
+                    # Full; the next text opens a new batch
+                    del self._pending[model]
+                    full.append(batch)
+        
+        for batch in full:
+            self._send(model, batch)
+        # Identity, not ==: two batches with equal contents are still different batches
+        if any(not any(batch is sent for sent in full) for batch in opened):
+            time.sleep(self.window)
+        for batch in opened:
+            with self._lock:
+                if self._pending.get(model) is batch:
+                    del self._pending[model]
+            self._send(model, batch)
+        return [future.result() for future in futures]
+    
+    def _send(self, model: str, batch: Dict):
+        with self._lock:
+            if batch['sent']:
+                return
+            batch['sent'] = True
+        items = batch['items']
+        metrics.observe('ollama_manager_embed_batch_size', len(items), model=model)
+        try:
+            embeddings = self.client.embed(model, list(items))
+            if len(embeddings) != len(items):
+                # zip() would leave some callers waiting on their future forever
+                raise Exception(f'Failed to embed: Ollama returned {len(embeddings)} embeddings '
+                                f'for {len(items)} inputs')
+        except Exception as e:
+            for future in items.values():
+                future.set_exception(e)
+            return
+        for future, embedding in zip(items.values(), embeddings):
+            future.set_result(embedding)
+
+
+class AdmissionRejected(Exception):
+    """A generation request was turned away; ``status`` is 429 or 503"""
+    
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A running generation's slot; release it exactly once when done"""
+    
+    def __init__(self, controller: 'AdmissionController', model: str):
+        self._controller = controller
+        self.model = model
+        self.started = time.monotonic()
+        self._released = False
+    
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self.model, time.monotonic() - self.started)
+
+
+class AdmissionController:
+    """Limits how many generations reach Ollama at once.
+    
+    At most ``max_concurrent`` generations run in this process, and at
+    most ``max_per_model`` per model, so bursts do not make Ollama load
+    and unload models. Others wait in a bounded queue, served by priority
+    class and then in arrival order; a waiter whose model is at its cap
+    does not block waiters for other models. Lower classes may only fill
+    part of the queue. Requests are rejected with 429 when their share of
+    the queue is full and with 503 after waiting ``max_wait`` seconds,
+    along with a Retry-After estimate.
+    """
+    
+    PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+    QUEUE_SHARE = {'high': 1.0, 'normal': 0.75, 'low': 0.5}
+    
+    def __init__(self, max_concurrent: int = 8, max_per_model: int = 4,
+                 max_queue: int = 64, max_wait: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.max_per_model = max_per_model
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._active = 0
+        self._per_model: Dict[str, int] = {}
+        self._queue: List[tuple] = []
+        self._sequence = 0
+        self._service_time = 5.0
+    
+    def admit(self, model: str, priority: str = 'normal') -> AdmissionTicket:
+        """Wait for a slot for ``model``; raises AdmissionRejected if none comes"""
+        rank = self.PRIORITIES[priority]
+        model = normalize_model_name(model)
+        started = time.monotonic()
+        with self._lock:
+            # Queued waiters are never runnable, so a free slot can be taken directly
+            if self._can_run(model):
+                self._start(model)
+                waiter = None
+            elif len(self._queue) >= int(self.max_queue * self.QUEUE_SHARE[priority]):
+                metrics.inc('ollama_manager_admission_rejected_total', reason='queue_full', priority=priority)
+                raise AdmissionRejected('Too many requests queued, try again later', 429, self._retry_after())
+            else:
+                waiter = {'model': model, 'ready': threading.Event(), 'admitted': False}
+                self._sequence += 1
+                heapq.heappush(self._queue, (rank, self._sequence, waiter))
+        
+        if waiter is not None and not waiter['ready'].wait(self.max_wait):
+            with self._lock:
+                if not waiter['admitted']:
+                    self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                    heapq.heapify(self._queue)
+                    metrics.inc('ollama_manager_admission_rejected_total', reason='queue_timeout', priority=priority)
+                    raise AdmissionRejected(
+                        f'No generation slot became free within {self.max_wait:g}s', 503, self._retry_after()
+                    )
+        metrics.observe('ollama_manager_admission_queue_seconds', time.monotonic() - started,
+                        priority=priority)
+        return AdmissionTicket(self, model)
+    
+    def _can_run(self, model: str) -> bool:
+        return self._active < self.max_concurrent and self._per_model.get(model, 0) < self.max_per_model
+    
+    def _start(self, model: str):
+        self._active += 1
+        self._per_model[model] = self._per_model.get(model, 0) + 1
+    
+    def _release(self, model: str, service_time: float):
+        with self._lock:
+            self._active -= 1
+            self._per_model[model] -= 1
+            if not self._per_model[model]:
+                del self._per_model[model]
+            self._service_time = 0.2 * service_time + 0.8 * self._service_time
+            # Wake queued waiters in priority order while slots allow
+            waiting = []
+            for entry in sorted(self._queue):
+                waiter = entry[2]
+                if self._can_run(waiter['model']):
+                    self._start(waiter['model'])
+                    waiter['admitted'] = True
+                    waiter['ready'].set()
+                else:
+                    waiting.append(entry)
+            self._queue = waiting
+    
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained enough to get in"""
+        estimate = self._service_time * (len(self._queue) / self.max_concurrent + 1)
+        return max(1, min(120, math.ceil(estimate)))
+    
+    def queued(self) -> int:
+        with self._lock:
+            return len(self._queue)
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'active': self._active,
+                'queued': len(self._queue),
+                'per_model': dict(self._per_model),
+                'max_concurrent': self.max_concurrent,
+                'max_per_model': self.max_per_model,
+                'max_queue': self.max_queue
+            }
+
+
+class PullJob:
+    """State of a single background model pull"""
+    
+    def __init__(self, model_name: str):
+        self.id = uuid.uuid4().hex
+        self.model_name = model_name
+        self.status = 'queued'
+        self.message = ''
+        self.error: Optional[str] = None
+        self.layers: Dict[str, Dict] = {}
+        self.created_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.version = 0
+    
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+    
+    def to_dict(self) -> Dict:
+        completed = sum(layer['completed'] for layer in self.layers.values())
+        total = sum(layer['total'] for layer in self.layers.values())
+        return {
+            'job_id': self.id,
+            'model_name': self.model_name,
+            'status': self.status,
+            'message': self.message,
+            'error': self.error,
+            'completed': completed,
+            'total': total,
+            'percent': round(completed * 100.0 / total, 1) if total else 0.0,
+            'layers': self.layers,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PullJob':
+        """Rebuild a read-only snapshot of a job persisted by another process"""
+        job = cls(data['model_name'])
+        job.id = data['job_id']
+        for name in ('status', 'message', 'error', 'layers', 'created_at', 'finished_at', 'version'):
+            setattr(job, name, data.get(name, getattr(job, name)))
+        return job
+
+
+class PullJobManager:
+    """Runs model pulls on a bounded worker pool and tracks their progress.
+    
+    Pulls of a model that already has an active job return that job
+    instead of starting a second download. When ``state_dir`` is set, job
+    state is mirrored to files there so that every worker process of a
+    multi-process deployment can list, follow, cancel and de-duplicate
+    jobs started by any other worker.
+    """
+    
+    # Minimum seconds between progress writes to ``state_dir``
+    PERSIST_INTERVAL = 0.5
+    # Seconds without progress after which another worker's job is presumed dead
+    STALE_AFTER = 300
+    
+    def __init__(self, client: 'OllamaAPI', max_workers: int = 2, max_finished: int = 50,
+                 state_dir: Optional[str] = None):
+        self.client = client
+        self.max_finished = max_finished
+        self.state_dir = state_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ollama-pull')
+        self._changed = threading.Condition()
+        self._jobs: OrderedDict = OrderedDict()
+        self._active: Dict[str, PullJob] = {}
+        self._persisted_at: Dict[str, float] = {}
+    
+    def submit(self, model_name: str) -> PullJob:
+        """Start pulling a model, or return the job already pulling it"""
+        key = normalize_model_name(model_name)
+        with self._changed:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = PullJob(model_name)
+            if self.state_dir:
+                existing = self._claim_model(key, job.id)
+                if existing is not None:
+                    return existing
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._persist(job, force=True)
+            self._prune()
+        self._executor.submit(self._run, job, key)
+        return job
+    
+    def get(self, job_id: str) -> Optional[PullJob]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir:
+            job = self._load(job_id)
+        return job
+    
+    def list_jobs(self) -> List[Dict]:
+        with self._changed:
+            jobs = {job.id: job for job in self._jobs.values()}
+        if self.state_dir:
+            for name in os.listdir(self.state_dir):
+                job_id, ext = os.path.splitext(name)
+                if ext == '.json' and job_id not in jobs:
+                    job = self._load(job_id)
+                    if job is not None:
+                        jobs[job_id] = job
+        return [job.to_dict() for job in sorted(jobs.values(), key=lambda job: job.created_at)]
+    
+    def active_count(self) -> int:
+        with self._changed:
+            return len(self._active)
+    
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a queued or running job"""
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_event.set()
+        if self.state_dir and job_id not in self._jobs:
+            # Owned by another worker; it picks up the marker on its next update
+            open(self._path(job_id, '.cancel'), 'w').close()
+        return True
+    
+    def wait_for_update(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[PullJob]:
+        """Block until a job changes past ``version`` or ``timeout`` expires.
+        
+        Returns the latest state of the job, or None if it is unknown.
+        """
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._changed.wait_for(lambda: job.version != version or job.done, timeout=timeout)
+                return job
+        # Jobs owned by another worker are followed through their state file
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.version != version or job.done or time.monotonic() >= deadline:
+                return job
+            time.sleep(self.PERSIST_INTERVAL)
+    
+    def _update(self, job: PullJob, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._persist(job)
+            self._changed.notify_all()
+    
+    def _finish(self, job: PullJob, key: str, status: str, error: Optional[str] = None):
+        with self._changed:
+            job.status = status
+            job.error = error
+            job.finished_at = datetime.now().isoformat()
+            job.version += 1
+            if self._active.get(key) is job:
+                del self._active[key]
+            self._persist(job, force=True)
+            if self.state_dir:
+                self._release_model(key, job.id)
+            self._changed.notify_all()
+    
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``max_finished``"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+            self._persisted_at.pop(job_id, None)
+            if self.state_dir:
+                for ext in ('.json', '.cancel'):
+                    try:
+                        os.remove(self._path(job_id, ext))
+                    except OSError:
+                        pass
+    
+    def _cancel_requested(self, job: PullJob) -> bool:
+        if job.cancel_event.is_set():
+            return True
+        if self.state_dir and os.path.exists(self._path(job.id, '.cancel')):
+            job.cancel_event.set()
+            return True
+        return False
+    
+    def _run(self, job: PullJob, key: str):
+        if self._cancel_requested(job):
+            self._finish(job, key, 'cancelled')
+            return
+        self._update(job, status='running')
+        try:
+            updates = self.client.pull_model_stream(job.model_name)
+            try:
+                for update in updates:
+                    if self._cancel_requested(job):
+                        break
+                    layers = job.layers
+                    if 'digest' in update:
+                        layers = dict(layers)
+                        layers[update['digest']] = {
+                            'completed': update.get('completed', 0),
+                            'total': update.get('total', 0)
+                        }
+                    self._update(job, message=update.get('status', ''), layers=layers)
+            finally:
+                updates.close()
+        except Exception as e:
+            self._finish(job, key, 'failed', str(e))
+            return
+        self._finish(job, key, 'cancelled' if job.cancel_event.is_set() else 'completed')
+    
+    # --- Shared state for multi-process deployments ---
+    
+    def _path(self, name: str, ext: str) -> str:
+        return os.path.join(self.state_dir, name + ext)
+    
+    def _lock_path(self, key: str) -> str:
+        return self._path('model-' + uuid.uuid5(uuid.NAMESPACE_URL, key).hex, '.lock')
+    
+    def _persist(self, job: PullJob, force: bool = False):
+        """Write a job's state file, at most every PERSIST_INTERVAL seconds"""
+        if not self.state_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._persisted_at.get(job.id, 0.0) < self.PERSIST_INTERVAL:
+            return
+        self._persisted_at[job.id] = now
+        data = job.to_dict()
+        data['version'] = job.version
+        tmp_path = self._path(job.id, f'.tmp{os.getpid()}')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path(job.id, '.json'))
+    
+    def _load(self, job_id: str) -> Optional[PullJob]:
+        try:
+            with open(self._path(job_id, '.json')) as f:
+                return PullJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _claim_model(self, key: str, job_id: str) -> Optional[PullJob]:
+        """Atomically claim ``key`` for ``job_id``; return the owning job if taken"""
+        lock_path = self._lock_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(lock_path) as f:
+                        owner_id = f.read().strip()
+                except OSError:
+                    continue
+                owner = self._load(owner_id)
+                stale = owner is None or owner.done
+                if not stale:
+                    try:
+                        age = time.time() - os.path.getmtime(self._path(owner_id, '.json'))
+                        stale = age > self.STALE_AFTER
+                    except OSError:
+                        stale = True
+                if not stale:
+                    return owner
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(job_id)
+            return None
+        return None
+    
+    def _release_model(self, key: str, job_id: str):
+        lock_path = self._lock_path(key)
+        try:
+            with open(lock_path) as f:
+                if f.read().strip() == job_id:
+                    os.remove(lock_path)
+        except OSError:
+            pass
+
+
+class HealthSampler:
+    """Probes Ollama on a fixed cadence and keeps recent samples in memory.
+    
+    The server status, logs and errors endpoints read the latest sample
+    instead of probing Ollama themselves, so their cost does not depend
+    on how many clients poll them. The sampler thread starts on first
+    use in each process, which also covers forked worker processes.
+    """
+    
+    def __init__(self, client: 'OllamaAPI', interval: float = 5.0, history: int = 720):
+        self.client = client
+        self.interval = interval
+        self.samples: deque = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._first_sample = threading.Event()
+        self._stop = threading.Event()
+        # Called as listener(sample, previous_sample) after every sample
+        self.listeners: List = []
+    
+    def start(self):
+        """Start the sampler thread if it is not running in this process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+            thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+    
+    def sample_now(self) -> Dict:
+        """Take one sample immediately"""
+        try:
+            sample = self.client.refresh_status()
+        except Exception as e:
+            sample = {'status': 'error', 'error': str(e), 'checked_at': datetime.now().isoformat()}
+        previous = self.samples[-1] if self.samples else None
+        self.samples.append(sample)
+        self._first_sample.set()
+        for listener in self.listeners:
+            listener(sample, previous)
+        return sample
+    
+    def latest(self) -> Dict:
+        """Return the most recent sample, waiting for the first one if needed"""
+        self.start()
+        if not self._first_sample.wait(timeout=self.client.timeouts.get('/api/tags', 10) + 1):
+            return self.sample_now()
+        return self.samples[-1]
+    
+    def recent(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return up to ``limit`` recent samples, oldest first"""
+        samples = list(self.samples)
+        return samples[-limit:] if limit else samples
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample_now()
+            self._stop.wait(self.interval)
+
+
+SLOG_FIELD = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S*)')
+GIN_LINE = re.compile(r'^\[GIN\] (\S+ - \S+) \| +(\d{3}) \| +(\S+) \| +(\S+) \| +(\w+) +"([^"]*)"')
+LOG_LEVEL_NAMES = {'WARN': 'WARNING', 'FATAL': 'CRITICAL', 'PANIC': 'CRITICAL'}
+
+
+def parse_log_line(line: str, source: str) -> Dict:
+    """Parse one Ollama server log line into a structured record.
+    
+    Understands Go slog lines (``time=... level=INFO msg="..."``) and GIN
+    access lines (``[GIN] 2024/01/15 - 10:30:00 | 200 | ...``). Anything
+    else, such as llama.cpp output, is kept verbatim.
+    """
+    line = line.rstrip('\r\n')
+    if line.startswith('time='):
+        fields = {}
+        for key, value in SLOG_FIELD.findall(line):
+            if value.startswith('"'):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    value = value.strip('"')
+            fields[key] = value
+        level = fields.pop('level', 'INFO').upper()
+        return {
+            'timestamp': fields.pop('time', datetime.now().isoformat()),
+            'level': LOG_LEVEL_NAMES.get(level, level),
+            'message': fields.pop('msg', line),
+            'fields': fields,
+            'source': source
+        }
+    
+    match = GIN_LINE.match(line)
+    if match:
+        when, status, latency, client, method, path = match.groups()
+        try:
+            timestamp = datetime.strptime(when, '%Y/%m/%d - %H:%M:%S').isoformat()
+        except ValueError:
+            timestamp = datetime.now().isoformat()
+        code = int(status)
+        return {
+            'timestamp': timestamp,
+            'level': 'ERROR' if code >= 500 else 'WARNING' if code >= 400 else 'INFO',
+            'message': f'{method} {path} {status} in {latency}',
+            'fields': {'status': code, 'latency': latency, 'client': client, 'method': method, 'path': path},
+            'source': source
+        }
+    
+    lowered = line.lower()
+    level = 'ERROR' if 'error' in lowered or 'panic' in lowered else 'WARNING' if 'warn' in lowered else 'INFO'
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'level': level,
+        'message': line,
+        'fields': {},
+        'source': source
+    }
+
+
+class LogStore:
+    """Bounded in-memory log buffer indexed by sequence number.
+    
+    Records live in a fixed-size ring, so "entries after cursor N" is a
+    direct index lookup. Cursors are strings that include an id unique to
+    this store, so a cursor from another process (or from before a
+    restart) is recognised as foreign and answered from the beginning.
+    """
+    
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self.stream_id = uuid.uuid4().hex[:8]
+        self._ring: List[Optional[Dict]] = [None] * max_entries
+        self._last_id = 0
+        self._lock = threading.Lock()
+        # Called as listener(records, cursor) after every append
+        self.listeners: List = []
+    
+    def append(self, record: Dict) -> Dict:
+        self.extend([record])
+        return record
+    
+    def extend(self, records: List[Dict]):
+        """Append several records, notifying listeners once"""
+        if not records:
+            return
+        with self._lock:
+            for record in records:
+                self._last_id += 1
+                record['id'] = self._last_id
+                self._ring[self._last_id % self.max_entries] = record
+            cursor = self.cursor()
+        for listener in self.listeners:
+            listener(records, cursor)
+    
+    def cursor(self, entry_id: Optional[int] = None) -> str:
+        return f'{self.stream_id}-{self._last_id if entry_id is None else entry_id}'
+    
+    def after(self, cursor: Optional[str] = None, levels: Optional[set] = None,
+              limit: int = 500) -> Dict:
+        """Return records after ``cursor``, optionally filtered by level"""
+        after_id = 0
+        reset = False
+        if cursor:
+            stream_id, _, position = cursor.rpartition('-')
+            if stream_id == self.stream_id and position.isdigit():
+                after_id = int(position)
+            else:
+                reset = True
+        
+        records = []
+        with self._lock:
+            first_id = max(1, self._last_id - self.max_entries + 1)
+            if after_id + 1 < first_id and after_id:
+                reset = True  # Older entries were evicted
+            entry_id = max(after_id, first_id - 1)
+            while entry_id < self._last_id and len(records) < limit:
+                entry_id += 1
+                record = self._ring[entry_id % self.max_entries]
+                if levels is None or record['level'] in levels:
+                    records.append(record)
+        return {'logs': records, 'cursor': self.cursor(entry_id), 'reset': reset}
+
+
+class LogTailer:
+    """Follows the Ollama server log into a LogStore.
+    
+    A log file is polled by byte offset, so each poll reads only what was
+    appended; truncation and rotation are detected and followed.
+    """
+    
+    INITIAL_BYTES = 64 * 1024
+    
+    def __init__(self, store: LogStore, path: Optional[str] = None, poll_interval: float = 1.0):
+        self.store = store
+        self.path = path
+        self.poll_interval = poll_interval
+        self._offset: Optional[int] = None
+        self._inode: Optional[int] = None
+        self._partial = b''
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+    
+    @property
+    def available(self) -> bool:
+        return bool(self.path)
+    
+    def start(self):
+        """Start polling the log file if it is not followed in this process"""
+        if not self.path or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self.poll()
+            threading.Thread(target=self._run, name='ollama-log-tail', daemon=True).start()
+    
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+    
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+    
+    def poll(self) -> int:
+        """Read lines appended since the last poll; return how many were stored"""
+        with self._poll_lock:
+            return self._poll()
+    
+    def _poll(self) -> int:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0
+        if self._offset is None:
+            # First poll: load only the tail of an existing log
+            self._offset = max(0, stat.st_size - self.INITIAL_BYTES)
+            self._inode = stat.st_ino
+            skip_partial = self._offset > 0
+        else:
+            skip_partial = False
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._offset, self._inode, self._partial = 0, stat.st_ino, b''
+        if stat.st_size == self._offset:
+            return 0
+        
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if skip_partial and lines:
+            lines.pop(0)
+        self.store.extend([
+            parse_log_line(line.decode('utf-8', 'replace'), self.path)
+            for line in lines if line.strip()
+        ])
+        return len(lines)
+
+
+def default_ollama_log_path() -> Optional[str]:
+    """Find the Ollama server log in its usual locations"""
+    candidates = [
+        os.environ.get('OLLAMA_LOG_PATH'),
+        os.path.expanduser('~/.ollama/logs/server.log'),
+        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Ollama', 'server.log')
+    ]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+ERROR_NUMBER = re.compile(r'0x[0-9a-fA-F]+|\b[0-9a-f]{12,}\b|\d+(?:\.\d+)*')
+
+
+def error_fingerprint(title: str, message: str) -> str:
+    """Fingerprint an error by its title and message with numbers and ids masked"""
+    normalized = ERROR_NUMBER.sub('#', ' '.join(str(message).lower().split()))
+    return hashlib.sha1(f'{title}\n{normalized}'.encode()).hexdigest()[:16]
+
+
+class ErrorTracker:
+    """Aggregates repeated errors by fingerprint with rolling window counts.
+    
+    Each fingerprint keeps its first/last sighting and total count. Counts
+    for the 1m/5m/1h windows are running totals over time buckets, updated
+    as events arrive and buckets expire, so reading them costs
+    O(fingerprints) no matter how many events were recorded.
+    """
+    
+    # name -> (window seconds, bucket seconds)
+    WINDOWS = {'1m': (60, 5), '5m': (300, 15), '1h': (3600, 60)}
+    
+    def __init__(self, max_fingerprints: int = 500):
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+    
+    def record(self, error: Dict, now: Optional[float] = None) -> bool:
+        """Count one occurrence of ``error``; True if its fingerprint is new"""
+        now = time.time() if now is None else now
+        fingerprint = error_fingerprint(error.get('title', ''), error.get('error', ''))
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            is_new = entry is None
+            if is_new:
+                entry = self._entries[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'first_seen': now,
+                    'count': 0,
+                    'buckets': {name: deque() for name in self.WINDOWS},
+                    'totals': dict.fromkeys(self.WINDOWS, 0)
+                }
+                while len(self._entries) > self.max_fingerprints:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(fingerprint)
+            entry['error'] = error
+            entry['last_seen'] = now
+            entry['count'] += 1
+            for name, (_, bucket_seconds) in self.WINDOWS.items():
+                start = now - now % bucket_seconds
+                buckets = entry['buckets'][name]
+                if buckets and buckets[-1][0] == start:
+                    buckets[-1][1] += 1
+                else:
+                    buckets.append([start, 1])
+                entry['totals'][name] += 1
+        return is_new
+    
+    def _expire(self, entry: Dict, now: float):
+        for name, (window, bucket_seconds) in self.WINDOWS.items():
+            buckets = entry['buckets'][name]
+            while buckets and buckets[0][0] + bucket_seconds <= now - window:
+                entry['totals'][name] -= buckets.popleft()[1]
+    
+    def summary(self, window: Optional[str] = None, now: Optional[float] = None,
+                fingerprints=None) -> List[Dict]:
+        """Aggregated errors, most recently seen first.
+        
+        With ``window`` ('1m', '5m' or '1h'), only errors seen in it are
+        listed; with ``fingerprints``, only those errors.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if fingerprints is None:
+                entries = list(reversed(self._entries.values()))
+            else:
+                entries = [entry for entry in reversed(self._entries.values())
+                           if entry['fingerprint'] in fingerprints]
+            for entry in entries:
+                self._expire(entry, now)
+            return [
+                dict(
+                    entry['error'],
+                    timestamp=datetime.fromtimestamp(entry['last_seen']).isoformat(),
+                    fingerprint=entry['fingerprint'],
+                    count=entry['count'],
+                    first_seen=datetime.fromtimestamp(entry['first_seen']).isoformat(),
+                    last_seen=datetime.fromtimestamp(entry['last_seen']).isoformat(),
+                    windows=dict(entry['totals'])
+                )
+                for entry in entries
+                if window is None or entry['totals'][window] > 0
+            ]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class EventBroadcaster:
+    """Fans monitoring events out to Server-Sent Events subscribers.
+    
+    Every subscriber has a bounded queue. Publishing never blocks: when a
+    slow subscriber's queue is full, its backlog is dropped and replaced
+    by a single ``resync`` event telling the client to refetch a snapshot.
+    """
+    
+    def __init__(self, max_queue: int = 256, max_subscribers: int = 100):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: List[Dict] = []
+    
+    def subscribe(self) -> Optional[Dict]:
+        """Register a subscriber, or return None if there are too many"""
+        subscriber = {'queue': deque(), 'ready': threading.Condition(), 'closed': False}
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.append(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: Dict):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscriber]
+    
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+    
+    def publish(self, event: str, data):
+        message = (event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            with subscriber['ready']:
+                queue = subscriber['queue']
+                if len(queue) >= self.max_queue:
+                    queue.clear()
+                    queue.append(('resync', {'reason': 'client fell behind'}))
+                else:
+                    queue.append(message)
+                subscriber['ready'].notify()
+    
+    def next_events(self, subscriber: Dict, timeout: float = 15.0) -> List[tuple]:
+        """Wait for and drain a subscriber's pending events ([] on timeout)"""
+        with subscriber['ready']:
+            if not subscriber['queue']:
+                subscriber['ready'].wait(timeout)
+            events = list(subscriber['queue'])
+            subscriber['queue'].clear()
+        return events
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count of a message (about 4 chars per token)"""
+    return len(text) // 4 + 4
+
+
+class ContextBudget:
+    """Keeps the prompt built from a chat history within a token budget.
+    
+    System messages are always kept. The other messages form a sliding
+    window of the most recent turns that fit. If a ``summarizer`` is set,
+    evicted turns are replaced by a summary. Eviction happens in blocks of
+    ``summary_block`` messages, and each block's summary is built from the
+    previous one, so only one new block is summarised at a time.
+    """
+    
+    def __init__(self, max_tokens: int = 4096, summarizer=None,
+                 summary_tokens: int = 256, summary_block: int = 8, max_summaries: int = 256):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summary_tokens = summary_tokens
+        self.summary_block = summary_block
+        self.max_summaries = max_summaries
+        self._summaries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def history_tokens(self, messages: List[Dict]) -> int:
+        return sum(estimate_tokens(m.get('content', '')) for m in messages)
+    
+    def fits(self, used_tokens: int, prompt: str) -> bool:
+        """Whether ``used_tokens`` of context plus ``prompt`` stay within budget"""
+        return used_tokens + estimate_tokens(prompt) <= self.max_tokens
+    
+    def window(self, model: str, messages: List[Dict], prompt: str) -> List[Dict]:
+        """Return the messages to send with ``prompt``"""
+        pinned = [m for m in messages if m.get('role') == 'system']
+        others = [m for m in messages if m.get('role') != 'system']
+        remaining = self.max_tokens - estimate_tokens(prompt) - self.history_tokens(pinned)
+        if self.history_tokens(others) <= remaining:
+            return messages
+        if self.summarizer is not None:
+            remaining -= self.summary_tokens
+        
+        kept = 0
+        for message in reversed(others):
+            tokens = estimate_tokens(message.get('content', ''))
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            kept += 1
+        evicted = len(others) - kept
+        if self.summarizer is None:
+            return pinned + others[evicted:]
+        
+        # Evict whole blocks so the summarised prefix changes rarely
+        evicted = -(-evicted // self.summary_block) * self.summary_block
+        evicted = min(evicted, len(others))
+        summary = self._summary(model, others[:evicted])
+        if summary:
+            pinned = pinned + [{'role': 'system', 'content': f'Summary of the earlier conversation: {summary}'}]
+        return pinned + others[evicted:]
+    
+    def _summary(self, model: str, evicted: List[Dict]) -> Optional[str]:
+        """Summarise ``evicted`` block by block, reusing cached block summaries"""
+        keys = []
+        digest = hashlib.sha1(model.encode())
+        for i, message in enumerate(evicted, 1):
+            digest.update(json.dumps([message.get('role'), message.get('content')]).encode())
+            if i % self.summary_block == 0 or i == len(evicted):
+                keys.append((i, digest.hexdigest()))
+        
+        summary = None
+        start = 0
+        with self._lock:
+            for end, key in reversed(keys):
+                if key in self._summaries:
+                    self._summaries.move_to_end(key)
+                    summary, start = self._summaries[key], end
+                    break
+        for end, key in keys:
+            if end <= start:
+                continue
+            try:
+                summary = self.summarizer(model, summary, evicted[start:end])
+            except Exception:
+                return summary  # Best effort; send what we have
+            start = end
+            with self._lock:
+                self._summaries[key] = summary
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+        return summary
+
+
+class Conversation:
+    """A server-side chat: its messages and Ollama's context tokens"""
+    
+    def __init__(self, conversation_id: str, model: Optional[str] = None):
+        self.id = conversation_id
+        self.model = model
+        self.messages: List[Dict] = []
+        self.context: Optional[List[int]] = None
+        self.updated_at = datetime.now().isoformat()
+        self.lock = threading.Lock()
+        self.persisted_size = 0
+    
+    def next_prompt(self, model: str, prompt: str, budget: Optional['ContextBudget'] = None):
+        """Return ``(prompt, context)`` for the next turn.
+        
+        While the model is unchanged and the context stays within
+        ``budget``, only the new turn is sent, together with the context
+        tokens Ollama returned last time. Otherwise the prompt is rebuilt
+        once from the (windowed) stored messages.
+        """
+        if self.context and self.model == model:
+            if budget is None or budget.fits(len(self.context), prompt):
+                return build_prompt([], prompt), self.context
+        messages = budget.window(model, self.messages, prompt) if budget else self.messages
+        return build_prompt(messages, prompt), None
+    
+    def to_dict(self) -> Dict:
+        return {
+            'conversation_id': self.id,
+            'model': self.model,
+            'messages': self.messages,
+            'updated_at': self.updated_at
+        }
+
+
+class ConversationStore:
+    """Bounded LRU store of conversations with optional disk persistence.
+    
+    With ``persist_dir`` set, each turn is appended to a JSON-lines file
+    per conversation, so evicted or pre-restart conversations are reloaded
+    on their next request. A cached conversation whose file was extended
+    by another worker process is reloaded as well.
+    """
+    
+    def __init__(self, max_conversations: int = 256, persist_dir: Optional[str] = None):
+        self.max_conversations = max_conversations
+        self.persist_dir = persist_dir
+        self._lock = threading.Lock()
+        self._conversations: OrderedDict = OrderedDict()
+    
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Look up a conversation in memory, then on disk"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                self._conversations.move_to_end(conversation_id)
+                if not self._is_stale(conversation):
+                    return conversation
+                del self._conversations[conversation_id]
+        conversation = self._load(conversation_id)
+        if conversation is not None:
+            conversation = self._remember(conversation)
+        return conversation
+    
+    def get_or_create(self, conversation_id: str, history: Optional[List[Dict]] = None) -> Conversation:
+        """Return a conversation, seeding a new one from ``history`` if given"""
+        conversation = self.get(conversation_id)
+        if conversation is None:
+            conversation = Conversation(conversation_id)
+            if history:
+                conversation.messages = [
+                    {'role': turn.get('role', 'user'), 'content': turn.get('content', '')}
+                    for turn in history
+                ]
+                self._append(conversation, conversation.messages, None)
+            conversation = self._remember(conversation)
+        return conversation
+    
+    def record_turn(self, conversation: Conversation, model: str, prompt: str,
+                    reply: str, context: Optional[List[int]]):
+        """Append a finished turn and the context tokens Ollama returned"""
+        turn = [
+            {'role': 'user', 'content': prompt},
+            {'role': 'assistant', 'content': reply}
+        ]
+        with conversation.lock:
+            conversation.messages.extend(turn)
+            conversation.model = model
+            conversation.context = context
+            conversation.updated_at = datetime.now().isoformat()
+        self._append(conversation, turn, context)
+    
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            removed = self._conversations.pop(conversation_id, None) is not None
+        if self.persist_dir:
+            try:
+                os.remove(self._path(conversation_id))
+                removed = True
+            except OSError:
+                pass
+        return removed
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._conversations)
+    
+    def _remember(self, conversation: Conversation) -> Conversation:
+        with self._lock:
+            # Another request may have loaded or created it meanwhile
+            existing = self._conversations.get(conversation.id)
+            if existing is not None:
+                return existing
+            self._conversations[conversation.id] = conversation
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation
+    
+    def _is_stale(self, conversation: Conversation) -> bool:
+        if not self.persist_dir:
+            return False
+        try:
+            return os.path.getsize(self._path(conversation.id)) != conversation.persisted_size
+        except OSError:
+            return False
+    
+    def _path(self, conversation_id: str) -> str:
+        safe_id = uuid.uuid5(uuid.NAMESPACE_URL, conversation_id).hex
+        return os.path.join(self.persist_dir, f'{safe_id}.jsonl')
+    
+    def _append(self, conversation: Conversation, messages: List[Dict], context: Optional[List[int]]):
+        if not self.persist_dir:
+            return
+        os.makedirs(self.persist_dir, exist_ok=True)
+        record = {
+            'conversation_id': conversation.id,
+            'model': conversation.model,
+            'messages': messages,
+            'context': context
+        }
+        with open(self._path(conversation.id), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            conversation.persisted_size = os.fstat(f.fileno()).st_size
+    
+    def _load(self, conversation_id: str) -> Optional[Conversation]:
+        if not self.persist_dir:
+            return None
+        try:
+            with open(self._path(conversation_id)) as f:
+                lines = f.readlines()
+                persisted_size = os.fstat(f.fileno()).st_size
+        except OSError:
+            return None
+        conversation = Conversation(conversation_id)
+        conversation.persisted_size = persisted_size
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Partially written last line
+            conversation.messages.extend(record.get('messages', []))
+            conversation.model = record.get('model') or conversation.model
+            conversation.context = record.get('context')
+        return conversation
+
+
+def normalize_model_name(model_name: str) -> str:
+    """Add Ollama's implicit ':latest' tag to an untagged model name"""
+    if ':' in model_name.rsplit('/', 1)[-1]:
+        return model_name
+    return f"{model_name}:latest"
+
+
+def format_size(size_bytes: int) -> str:
+    """Format size in bytes to human readable format"""
+    if size_bytes == 0:
+        return "0 B"
+    
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+
+def format_datetime(dt_str: str) -> str:
+    """Format datetime string to readable format"""
+    try:
+        # Parse ISO format datetime
+        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+        return dt.strftime("%Y-%m-%d %H:%M")
+    except:
+        return dt_str
+
+
+def format_history(history: List[Dict]) -> str:
+    """Format conversation turns as 'Role: content' lines"""
+    text = ''
+    for turn in history:
+        role = turn.get('role', 'user')
+        content = turn.get('content', '')
+        if role == 'user':
+            text += f"User: {content}\n"
+        elif role == 'assistant':
+            text += f"Assistant: {content}\n"
+        else:
+            text += f"{role.capitalize()}: {content}\n"
+    return text
+
+
+def build_prompt(history: List[Dict], prompt: str) -> str:
+    """Build the full prompt from the conversation history"""
+    return format_history(history) + f"User: {prompt}\nAssistant: "
+
+
+def format_model(model: Dict) -> Dict:
+    """Format a model entry from /api/tags for display"""
+    return {
+        'name': model.get('name', 'Unknown'),
+        'size': format_size(model.get('size', 0)),
+        'modified_at': format_datetime(model.get('modified_at', '')),
+        'family': model.get('details', {}).get('family', 'Unknown'),
+        'raw_size': model.get('size', 0)
+    }
+
+
+def models_etag(models: List[Dict], *extra) -> str:
+    """Weak ETag for a model listing, built from each model's host, name, digest and modified_at.
+    
+    ``extra`` values (per-host errors, the requested model, ...) are mixed
+    in so that anything else that changes the response body changes the tag.
+    """
+    digest = hashlib.sha1()
+    for model in models:
+        digest.update('\0'.join(str(model.get(field, '')) for field in
+                                ('host', 'name', 'digest', 'modified_at')).encode())
+        digest.update(b'\n')
+    for value in extra:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return f'W/"{digest.hexdigest()[:24]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ModelRecord:
+    """A model entry formatted once for display, with its JSON encoding.
+    
+    Records are reused for as long as the model's host, name, digest and
+    modified_at stay the same, so formatting and serialising happen once
+    per model rather than once per request.
+    """
+    
+    __slots__ = ('name', 'size', 'modified_at', 'family', 'raw_size', 'host',
+                 'digest', 'modified_iso', 'json')
+    
+    def __init__(self, model: Dict):
+        formatted = format_model(model)
+        self.name = formatted['name']
+        self.size = formatted['size']
+        self.modified_at = formatted['modified_at']
+        self.family = formatted['family']
+        self.raw_size = formatted['raw_size']
+        self.host = model.get('host')
+        self.digest = model.get('digest')
+        self.modified_iso = str(model.get('modified_at', ''))
+        self.json = json.dumps(self.to_dict(), separators=(',', ':')).encode()
+    
+    @staticmethod
+    def key(model: Dict) -> tuple:
+        return (model.get('host'), model.get('name'), model.get('digest'), model.get('modified_at'))
+    
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'size': self.size,
+            'modified_at': self.modified_at,
+            'family': self.family,
+            'raw_size': self.raw_size,
+            'host': self.host
+        }
+
+
+def models_json(models_bytes: bytes, **fields) -> bytes:
+    """``{"success": true, "models": ..., **fields}`` around already serialised models"""
+    extra = json.dumps(fields, separators=(',', ':'))[1:-1].encode()
+    return b'{"success":true,"models":' + models_bytes + (b',' + extra if extra else b'') + b'}'
+
+
+class ModelIndex:
+    """Model records with precomputed sort orders, for full and paged listings.
+    
+    The index is only rebuilt when the listing's ETag changes, and even
+    then unchanged models keep their existing ``ModelRecord``. Pages are
+    addressed by opaque keyset cursors (the sort key of the last row sent),
+    so paging stays consistent while models are pulled or deleted between
+    requests.
+    """
+    
+    SORT_FIELDS = ('name', 'size', 'modified_at', 'family')
+    ORDERS = ('asc', 'desc')
+    # Types of the sort key behind each field's (name, host) tiebreak
+    KEY_TYPES = {
+        'name': (),
+        'size': ((int, float),),
+        'modified_at': (str,),
+        'family': (str,)
+    }
+    MAX_LIMIT = 500
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etag: Optional[str] = None
+        self._by_key: Dict[tuple, ModelRecord] = {}
+        self._records: List[ModelRecord] = []
+        self._listing = b'[]'
+        self._names: List[str] = []
+        self._families: List[str] = []
+        self._orders: Dict[str, tuple] = {}
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def update(self, models: List[Dict], etag: str):
+        """Rebuild the index from raw /api/tags entries unless ``etag`` is unchanged"""
+        with self._lock:
+            if etag == self.etag:
+                return
+            previous = self._by_key
+        by_key = {}
+        records = []
+        for model in models:
+            key = ModelRecord.key(model)
+            record = by_key.get(key) or previous.get(key) or ModelRecord(model)
+            by_key[key] = record
+            records.append(record)
+        names = [record.name.lower() for record in records]
+        families = [record.family.lower() for record in records]
+        tiebreak = [(names[i], records[i].host or '') for i in range(len(records))]
+        fields = {
+            'name': lambda i: tiebreak[i],
+            'size': lambda i: (records[i].raw_size,) + tiebreak[i],
+            'modified_at': lambda i: (records[i].modified_iso,) + tiebreak[i],
+            'family': lambda i: (families[i],) + tiebreak[i]
+        }
+        orders = {}
+        for field, key in fields.items():
+            keyed = sorted((key(i), i) for i in range(len(records)))
+            orders[field] = ([k for k, _ in keyed], [i for _, i in keyed])
+        listing = b'[' + b','.join(record.json for record in records) + b']'
+        with self._lock:
+            self._by_key, self._records, self._listing = by_key, records, listing
+            self._names, self._families = names, families
+            self._orders = orders
+            self.etag = etag
+    
+    def listing(self) -> bytes:
+        """JSON array of every record, in listing order"""
+        with self._lock:
+            return self._listing
+    
+    @staticmethod
+    def _encode_cursor(sort: str, order: str, key: tuple) -> str:
+        raw = json.dumps([sort, order, list(key)], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_sort, cursor_order, key = json.loads(raw)
+            types = ModelIndex.KEY_TYPES.get(cursor_sort, ()) + (str, str)
+            if (not isinstance(key, list) or len(key) != len(types)
+                    or any(isinstance(k, bool) or not isinstance(k, t) for k, t in zip(key, types))):
+                raise TypeError(key)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise ValueError('Cursor was issued for a different sort order')
+        return tuple(key)
+    
+    def page(self, sort: str = 'name', order: str = 'asc', limit: int = 50,
+             cursor: Optional[str] = None, query: Optional[str] = None,
+             family: Optional[str] = None) -> Dict:
+        """One page of records plus the cursor of the next page"""
+        if sort not in self.SORT_FIELDS:
+            raise ValueError(f'sort must be one of {", ".join(self.SORT_FIELDS)}')
+        if order not in self.ORDERS:
+            raise ValueError('order must be asc or desc')
+        limit = max(1, min(limit, self.MAX_LIMIT))
+        with self._lock:
+            records, names, families = self._records, self._names, self._families
+            keys, positions = self._orders.get(sort, ([], []))
+        
+        if order == 'asc':
+            start = bisect.bisect_right(keys, self._decode_cursor(cursor, sort, order)) if cursor else 0
+            walk = range(start, len(keys))
+        else:
+            stop = bisect.bisect_left(keys, self._decode_cursor(cursor, sort, order)) if cursor else len(keys)
+            walk = range(stop - 1, -1, -1)
+        
+        needle = query.lower() if query else None
+        wanted_family = family.lower() if family else None
+    
+        def matches(i):
+            return ((needle is None or needle in names[i]) and
+                    (wanted_family is None or families[i] == wanted_family))
+        
+        page = []
+        next_cursor = None
+        for j in walk:
+            i = positions[j]
+            if not matches(i):
+                continue
+            if len(page) == limit:
+                next_cursor = self._encode_cursor(sort, order, keys[last])
+                break
+            page.append(records[i])
+            last = j
+        
+        if needle is None and wanted_family is None:
+            total = len(records)
+        else:
+            total = sum(1 for i in range(len(records)) if matches(i))
+        return {'models': page, 'next_cursor': next_cursor, 'total': total}
+
+
+def status_summary(status: Dict) -> Dict:
+    """Build the /api/server/status response body from a probe result"""
+    if status['status'] == 'running':
+        return {
+            'success': True,
+            'status': 'running',
+            'models_count': len(status['models']),
+            'response_time': status['response_time']
+        }
+    return {
+        'success': True,
+        'status': status['status'],
+        'error': status.get('error', 'Unknown error')
+    }
+
+
+def build_server_logs(status: Dict, base_url: str) -> List[Dict]:
+    """Describe the server state from a probe result as log entries"""
+    logs = []
+    current_time = datetime.now().isoformat()
+    
+    if status['status'] == 'running':
+        # Server is running - generate realistic logs based on current state
+        models = status['models']
+        logs.extend([
+            {
+                'timestamp': current_time,
+                'level': 'INFO',
+                'message': f'Ollama server is running on {base_url}'
+            },
+            {
+                'timestamp': current_time,
+                'level': 'INFO',
+                'message': f'Loaded {len(models)} models'
+            }
+        ])
+        
+        # Add logs for each model
+        for model in models[:3]:  # Limit to 3 most recent
+            logs.append({
+                'timestamp': current_time,
+                'level': 'SUCCESS',
+                'message': f'Model {model.get("name", "unknown")} is available'
+            })
+            
+        # Add API endpoint status
+        logs.append({
+            'timestamp': current_time,
+            'level': 'INFO',
+            'message': 'API endpoints responding normally'
+        })
+    else:
+        # Server is not running
+        logs.append({
+            'timestamp': current_time,
+            'level': 'ERROR',
+            'message': f'Ollama server is not responding: {status.get("error", "Unknown error")}'
+        })
+    return logs
+
+
+# Slow-response threshold used until enough samples have been seen to learn one
+SLOW_RESPONSE_DEFAULT = 2.0
+
+
+def build_server_errors(status: Dict, base_url: str) -> List[Dict]:
+    """Describe error conditions found in a probe result"""
+    errors = []
+    current_time = datetime.now().isoformat()
+    
+    # Check for various error conditions
+    if status['status'] == 'stopped':
+        errors.append({
+            'timestamp': current_time,
+            'level': 'critical',
+            'title': 'Server Not Running',
+            'error': 'Ollama server is not responding',
+            'stack': 'Connection refused to ' + base_url,
+            'suggestion': 'Start the Ollama server using "ollama serve" command'
+        })
+    elif status['status'] == 'timeout':
+        errors.append({
+            'timestamp': current_time,
+            'level': 'error',
+            'title': 'Server Timeout',
+            'error': 'Server request timed out',
+            'stack': 'Request to ' + base_url + '/api/tags timed out',
+            'suggestion': 'Check server load and network connectivity'
+        })
+    elif status['status'] == 'error':
+        errors.append({
+            'timestamp': current_time,
+            'level': 'error', 
+            'title': 'Server Error',
+            'error': status.get('error', 'Unknown server error'),
+            'stack': 'HTTP response from ' + base_url,
+            'suggestion': 'Check Ollama server logs for more details'
+        })
+    else:
+        # Server is running; compare against the learned /api/tags baseline
+        response_time = status.get('response_time', 0)
+        threshold = latency.threshold('endpoint', '/api/tags') or SLOW_RESPONSE_DEFAULT
+        if response_time > threshold:
+            errors.append({
+                'timestamp': current_time,
+                'level': 'warning',
+                'title': 'Slow Response Time',
+                'error': f'API response time: {response_time:.2f}s (threshold: {threshold:.2f}s)',
+                'stack': 'API response measurement',
+                'suggestion': 'Consider checking server load or using a smaller model'
+            })
+        elif latency.regressed('endpoint', '/api/tags'):
+            errors.append({
+                'timestamp': current_time,
+                'level': 'warning',
+                'title': 'Response Time Regression',
+                'error': 'Average API response time is well above its usual level',
+                'stack': 'API response measurement',
+                'suggestion': 'Check for new load on the server or a recently changed model'
+            })
+    return errors
+
+
+def summarize_with_ollama(model: str, previous_summary: Optional[str], messages: List[Dict]) -> str:
+    """Summarise chat turns with the chat's own model (ContextBudget summarizer)"""
+    text = format_history(messages)
+    if previous_summary:
+        text = f"Earlier summary: {previous_summary}\n{text}"
+    response = api.request('POST', '/api/generate', json={
+        "model": model,
+        "prompt": f"Summarize this conversation in a few sentences, keeping names, facts and decisions:\n\n{text}",
+        "stream": False
+    })
+    response.raise_for_status()
+    return response.json().get('response', '').strip()
+
+
+# Flask app setup
+app = Flask(__name__)
+app.secret_key = 'ollama-manager-secret-key'
+CORS(app)  # Enable CORS for all domains on all routes
+api = OllamaAPI()
+fleet = OllamaFleet(api)
+router = GenerationRouter(fleet)
+admission = AdmissionController()
+embeddings = EmbeddingBatcher(api)
+model_index = ModelIndex()
+# Opt-in (--response-cache); None disables it
+response_cache: Optional[ResponseCache] = None
+compression = ResponseCompressor()
+metrics.gauge_callback('ollama_manager_admission_queued', admission.queued)
+pull_jobs = PullJobManager(api)
+metrics.gauge_callback('ollama_manager_pull_jobs_active', pull_jobs.active_count)
+health = HealthSampler(api)
+server_logs = LogStore()
+log_tailer = LogTailer(server_logs, default_ollama_log_path())
+monitoring_events = EventBroadcaster()
+
+
+error_tracker = ErrorTracker()
+
+
+def record_errors(errors: List[Dict]):
+    """Count ``errors`` and push just the aggregated entries they changed"""
+    changed = set()
+    for error in errors:
+        error_tracker.record(error)
+        changed.add(error_fingerprint(error.get('title', ''), error.get('error', '')))
+    if changed:
+        monitoring_events.publish('errors', error_tracker.summary(fingerprints=changed))
+
+
+def on_health_sample(sample: Dict, previous: Optional[Dict]):
+    """Count the sample's errors and broadcast status and error deltas"""
+    record_errors(build_server_errors(sample, api.base_url))
     
-    def pull_model(self, model_name: str) -> bool:
-        """Download/pull a model"""
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/pull",
-                json={"name": model_name},
-                timeout=300  # 5 minutes timeout for downloads
-            )
-            response.raise_for_status()
-            return True
-        except requests.RequestException as e:
-            raise Exception(f"Failed to pull model: {e}")
+    # Response times move every sample; only state changes are pushed
+    summary = status_summary(sample)
+    changed = previous is None or dict(status_summary(previous), response_time=None) != dict(summary, response_time=None)
+    if changed:
+        monitoring_events.publish('status', summary)
+
+
+def on_log_records(records: List[Dict], cursor: str):
+    """Broadcast new log lines and count the error-level ones"""
+    monitoring_events.publish('logs', {'logs': records, 'cursor': cursor})
+    record_errors([
+        {
+            'level': 'error',
+            'title': 'Ollama Log Error',
+            'error': record['message'],
+            'stack': record.get('source') or 'ollama serve',
+            'suggestion': 'Check the Ollama server log around this time'
+        }
+        for record in records if record.get('level') == 'ERROR'
+    ])
+
+
+health.listeners.append(on_health_sample)
+server_logs.listeners.append(on_log_records)
+conversations = ConversationStore()
+context_budget = ContextBudget()
+
+
+# === Metrics ===
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.inc('ollama_manager_http_requests_in_flight')
+
+
+def finish_request_metrics(started: float, route: str, method: str):
+    metrics.inc('ollama_manager_http_requests_in_flight', -1)
+    metrics.observe('ollama_manager_http_request_duration_seconds',
+                    time.perf_counter() - started, route=route, method=method)
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Teardown runs as soon as the view returns, before a streamed body is
+    # sent; the server closes the response only once the body is done
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        response.call_on_close(lambda: finish_request_metrics(started, route, method))
+    return response
+
+
+@app.teardown_request
+def discard_request_metrics(exc=None):
+    # Requests that failed before a response was made
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        finish_request_metrics(started, route, request.method)
+
+
+@app.teardown_request
+def release_admission(exc=None):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+
+@app.after_request
+def compress_response(response):
+    return compression.apply(response, request.headers.get('Accept-Encoding'))
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# === Chat Generation Endpoint ===
+def flag_slow_model(kind: str, model: str, seconds: float, error: str, stack: str):
+    """Add ``seconds`` to the model's ``kind`` baseline; record an error if it was slow"""
+    threshold = latency.threshold(kind, model)
+    latency.observe(kind, model, seconds)
+    if threshold is not None and seconds > threshold:
+        error_tracker.record({
+            'timestamp': datetime.now().isoformat(),
+            'level': 'warning',
+            'title': f'Slow Response from {model}',
+            'error': f'{error} after {seconds:.2f}s (threshold: {threshold:.2f}s)',
+            'stack': stack,
+            'suggestion': 'The model may have been unloaded, or the server is busy with other requests'
+        })
+
+
+def record_first_token(model: str, seconds: float):
+    """Record time to first token of a stream and flag it if slow for this model"""
+    metrics.observe('ollama_manager_generate_time_to_first_token_seconds', seconds, model=model)
+    flag_slow_model('model', model, seconds, 'First token', 'Time to first token on /api/generate')
+
+
+def record_generation_time(model: str, seconds: float):
+    """Record a non-streamed generation's total time and flag it if slow for this model.
     
-    def delete_model(self, model_name: str) -> bool:
-        """Delete a model"""
-        try:
-            response = requests.delete(
-                f"{self.base_url}/api/delete",
-                json={"name": model_name},
-                timeout=30
-            )
-            response.raise_for_status()
-            return True
-        except requests.RequestException as e:
-            raise Exception(f"Failed to delete model: {e}")
+    Kept apart from time to first token: a whole reply takes far longer
+    than its first token and would skew that baseline.
+    """
+    metrics.observe('ollama_manager_generate_duration_seconds', seconds, model=model)
+    flag_slow_model('generation', model, seconds, 'Reply', 'Non-streamed generation on /api/generate')
+
+
+def record_generation(model: str, data: Dict):
+    """Record generation speed from a final Ollama chunk"""
+    eval_count = data.get('eval_count')
+    eval_duration = data.get('eval_duration')
+    if eval_count:
+        metrics.inc('ollama_manager_generated_tokens_total', eval_count, model=model)
+        if eval_duration:
+            metrics.observe('ollama_manager_generate_tokens_per_second',
+                            eval_count / (eval_duration / 1e9), model=model)
+
+
+def stream_generation(response: requests.Response, model: str, on_complete=None, on_close=None) -> Response:
+    """Relay Ollama's NDJSON generation chunks to the client as they arrive.
+
+    Each upstream line is forwarded and flushed immediately. If the client
+    disconnects, the generator is closed and the upstream connection is
+    released so Ollama stops generating for nobody. ``on_complete`` is
+    called with the full reply text and the final chunk once the stream
+    finishes; ``on_close`` is called once with the final chunk (or None)
+    however the stream ends, including when it is never read.
+    """
+    started = g.get('request_started', time.perf_counter())
+    closed = False
     
-    def show_model_info(self, model_name: str) -> Dict:
-        """Get detailed information about a model"""
+    def close(final=None):
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        response.close()
+        if on_close is not None:
+            on_close(final)
+
+    def relay():
+        parts = []
+        final = None
         try:
-            response = requests.post(
-                f"{self.base_url}/api/show",
-                json={"name": model_name},
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if not parts:
+                    record_first_token(model, time.perf_counter() - started)
+                parts.append(chunk.get('response', ''))
+                if chunk.get('done'):
+                    final = chunk
+                    record_generation(model, chunk)
+                    if on_complete is not None:
+                        on_complete(''.join(parts), chunk)
+                yield line + b'\n'
         except requests.RequestException as e:
-            raise Exception(f"Failed to get model info: {e}")
+            yield json.dumps({'error': f'Failed to generate response: {e}', 'done': True}).encode() + b'\n'
+        finally:
+            close(final)
 
+    result = Response(
+        stream_with_context(relay()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # HEAD requests and clients that leave before the first byte never
+    # start the generator
+    result.call_on_close(close)
+    return result
 
-def format_size(size_bytes: int) -> str:
-    """Format size in bytes to human readable format"""
-    if size_bytes == 0:
-        return "0 B"
-    
-    size_names = ["B", "KB", "MB", "GB", "TB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
-    
-    return f"{size_bytes:.1f} {size_names[i]}"
 
+def is_deterministic(options: Optional[Dict]) -> bool:
+    """Whether Ollama will give the same reply again for these options"""
+    return bool(options) and options.get('temperature') == 0 and options.get('seed') is not None
 
-def format_datetime(dt_str: str) -> str:
-    """Format datetime string to readable format"""
+
+def model_digest(model: str) -> Optional[str]:
+    """Digest of a local model from the cached model list, or None"""
+    name = normalize_model_name(model)
     try:
-        # Parse ISO format datetime
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime("%Y-%m-%d %H:%M")
-    except:
-        return dt_str
+        for entry in api.list_models():
+            if entry.get('name') == name:
+                return entry.get('digest')
+    except Exception:
+        pass
+    return None
 
 
-# Flask app setup
-app = Flask(__name__)
-app.secret_key = 'ollama-manager-secret-key'
-CORS(app)  # Enable CORS for all domains on all routes
-api = OllamaAPI()
+def replay_generation(cached: Dict) -> Response:
+    """Stream a cached generation as NDJSON chunks, like a live one"""
+    final = dict(cached['final'], response='', done=True)
+    
+    def chunks():
+        for piece in re.findall(r'\S+\s*|\s+', cached['response']):
+            yield json.dumps({'model': final.get('model'), 'response': piece, 'done': False}) + '\n'
+        yield json.dumps(final) + '\n'
+    
+    return Response(
+        chunks(),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Cache': 'HIT'}
+    )
 
 
-# === Chat Generation Endpoint ===
 @app.route('/api/generate', methods=['POST'])
 def api_generate():
     """API endpoint to generate a chat response using conversation history"""
@@ -121,79 +3117,249 @@ def api_generate():
         history = data.get('history', [])
         if not model or not prompt:
             return jsonify({'success': False, 'error': 'Model and prompt are required'}), 400
+        options = data.get('options')
+        priority = data.get('priority') or request.headers.get('X-Priority', 'normal')
+        if priority not in AdmissionController.PRIORITIES:
+            return jsonify({
+                'success': False,
+                'error': f'priority must be one of {", ".join(AdmissionController.PRIORITIES)}'
+            }), 400
 
-        # Build the full prompt from history
-        full_prompt = ''
-        for turn in history:
-            role = turn.get('role', 'user')
-            content = turn.get('content', '')
-            if role == 'user':
-                full_prompt += f"User: {content}\n"
-            elif role == 'assistant':
-                full_prompt += f"Assistant: {content}\n"
-            else:
-                full_prompt += f"{role.capitalize()}: {content}\n"
-        full_prompt += f"User: {prompt}\nAssistant: "
+        # With a conversation id only the new turn is sent, plus the context
+        # tokens Ollama returned for the previous one
+        conversation_id = data.get('conversation_id')
+        conversation = None
+        context = None
+        if conversation_id:
+            conversation = conversations.get_or_create(str(conversation_id), history)
+            full_prompt, context = conversation.next_prompt(model, prompt, context_budget)
+        else:
+            full_prompt = build_prompt(context_budget.window(model, history, prompt), prompt)
+        
+        payload = {
+            "model": model,
+            "prompt": full_prompt,
+            "stream": stream
+        }
+        if context:
+            payload['context'] = context
+        if options:
+            payload['options'] = options
+        
+        # Deterministic requests (temperature 0 with a seed, or cache: true)
+        # can be answered from the response cache without touching a GPU
+        cache_key = None
+        if response_cache is not None and (data.get('cache') or is_deterministic(options)):
+            digest = model_digest(model)
+            if digest:
+                cache_key = ResponseCache.key(digest, full_prompt, context, options)
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    if conversation is not None:
+                        conversations.record_turn(conversation, model, prompt, cached['response'],
+                                                  cached['final'].get('context'))
+                    if stream:
+                        return replay_generation(cached)
+                    result = {'success': True, 'response': cached['response'], 'cached': True}
+                    if conversation is not None:
+                        result['conversation_id'] = conversation.id
+                    return jsonify(result)
+        
+        # Wait for a generation slot. Successful replies hold it until the
+        # response is closed; release_admission() frees it on early errors
+        try:
+            g.admission_ticket = admission.admit(model, priority)
+        except AdmissionRejected as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+        
+        def record_turn(reply: str, final: Dict):
+            if conversation is not None:
+                conversations.record_turn(conversation, model, prompt, reply, final.get('context'))
+            if cache_key is not None and not final.get('error'):
+                response_cache.put(cache_key, reply, final)
 
-        # Call Ollama API to generate a response
+        # Send the request to the best host, failing over to the next one
+        # if a host cannot be reached or rejects it
+        response = None
+        error = None
+        for host in router.candidates(model):
+            client = api if len(fleet) == 1 else fleet.client(host)
+            router.acquire(host, model)
+            try:
+                response = client.request('POST', '/api/generate', json=payload, stream=stream)
+                response.raise_for_status()
+                break
+            except requests.RequestException as e:
+                # A 4xx (e.g. model missing on that host) says nothing about the host's health
+                rejected = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code < 500
+                router.release(host, failed=not rejected)
+                if response is not None:
+                    response.close()
+                response, error = None, e
+                metrics.inc('ollama_manager_generate_failovers_total', host=host)
+        if response is None:
+            return jsonify({'success': False, 'error': f'Failed to generate response: {error}'}), 500
+        
         try:
-            response = requests.post(
-                f"{api.base_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": full_prompt,
-                    "stream": stream
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            data = response.json()
-            return jsonify({
+            if stream:
+                ticket = g.pop('admission_ticket')
+                
+                def release(final):
+                    router.release(host, final)
+                    ticket.release()
+                
+                return stream_generation(response, model, record_turn, on_close=release)
+            try:
+                data = response.json()
+            except ValueError:
+                router.release(host, failed=True)
+                raise
+            router.release(host, data)
+            # Without streaming the first token arrives with the last one
+            record_generation_time(model, time.perf_counter() - g.request_started)
+            record_generation(model, data)
+            record_turn(data.get('response', ''), data)
+            result = {
                 'success': True,
                 'response': data.get('response', '')
-            })
+            }
+            if conversation is not None:
+                result['conversation_id'] = conversation.id
+            result = jsonify(result)
+            result.call_on_close(g.pop('admission_ticket').release)
+            return result
         except requests.RequestException as e:
             return jsonify({'success': False, 'error': f'Failed to generate response: {e}'}), 500
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/embed', methods=['POST'])
+def api_embed():
+    """API endpoint to embed one text or a list of texts, batched with concurrent requests"""
+    try:
+        data = request.get_json(force=True)
+        model = data.get('model')
+        inputs = data.get('input')
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not model or not inputs or not all(isinstance(text, str) for text in inputs):
+            return jsonify({'success': False, 'error': 'Model and input (a string or list of strings) are required'}), 400
+        return jsonify({'success': True, 'model': model, 'embeddings': embeddings.embed(model, inputs)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/conversations/<path:conversation_id>', methods=['GET', 'DELETE'])
+def api_conversation(conversation_id):
+    """API endpoint to read or delete a server-side conversation"""
+    if request.method == 'DELETE':
+        if not conversations.delete(conversation_id):
+            return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+        return jsonify({'success': True, 'message': 'Conversation deleted'})
+    conversation = conversations.get(conversation_id)
+    if conversation is None:
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+    return jsonify({'success': True, 'conversation': conversation.to_dict()})
+
+
+INDEX_PAGE_SIZE = 100
+LISTING_PARAMS = ('limit', 'cursor', 'sort', 'order', 'q', 'family')
+
+
+def listed_models():
+    """Raw models of every host, tagged with ``host``, plus per-host errors (None with one host)"""
+    if len(fleet) == 1:
+        return [dict(model, host=fleet.primary_name) for model in api.list_models()], None
+    return fleet.list_models()
+
+
+def model_page(models: List[Dict], args, default_limit: int = 50) -> Dict:
+    """Page of the model index for the listing query in ``args``"""
+    model_index.update(models, models_etag(models))
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return model_index.page(
+        sort=args.get('sort', 'name'),
+        order=args.get('order', 'asc'),
+        limit=limit,
+        cursor=args.get('cursor') or None,
+        query=args.get('q') or None,
+        family=args.get('family') or None
+    )
+
+
 @app.route('/')
 def index():
-    """Main page showing model list"""
+    """Main page showing one page of the model list"""
+    listing = {
+        'sort': request.args.get('sort', 'name'),
+        'order': request.args.get('order', 'asc'),
+        'q': request.args.get('q', ''),
+        'family': request.args.get('family', ''),
+        'total': 0,
+        'next_cursor': None
+    }
     try:
-        models = api.list_models()
-        # Format models for display
-        formatted_models = []
-        for model in models:
-            formatted_models.append({
-                'name': model.get('name', 'Unknown'),
-                'size': format_size(model.get('size', 0)),
-                'modified_at': format_datetime(model.get('modified_at', '')),
-                'family': model.get('details', {}).get('family', 'Unknown'),
-                'raw_size': model.get('size', 0)
-            })
-        
-        return render_template('index.html', models=formatted_models, error=None)
+        models, errors = listed_models()
+        if errors and len(errors) == len(fleet.hosts()):
+            raise Exception('; '.join(f'{host}: {error}' for host, error in errors.items()))
+        page = model_page(models, request.args, INDEX_PAGE_SIZE)
+        listing.update(total=page['total'], next_cursor=page['next_cursor'])
+        return render_template('index.html', models=page['models'], error=None, listing=listing)
     except Exception as e:
-        return render_template('index.html', models=[], error=str(e))
+        return render_template('index.html', models=[], error=str(e), listing=listing)
+
+
+def conditional_json(etag: str, build_body) -> Response:
+    """JSON response validated by ``etag``: 304 when the client already has it.
+    
+    ``build_body`` is only called when the body is actually sent, so
+    unchanged polls also skip formatting it. It may return a dict or
+    already serialised JSON bytes.
+    """
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = Response(status=304)
+    else:
+        body = build_body()
+        response = Response(body, mimetype='application/json') if isinstance(body, bytes) else jsonify(body)
+    response.headers['ETag'] = etag
+    # Cacheable, but revalidate every time: downloads and deletes change it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @app.route('/api/models')
 def api_models():
-    """API endpoint to get models as JSON"""
+    """API endpoint to get the models of every Ollama host as JSON"""
     try:
-        models = api.list_models()
-        formatted_models = []
-        for model in models:
-            formatted_models.append({
-                'name': model.get('name', 'Unknown'),
-                'size': format_size(model.get('size', 0)),
-                'modified_at': format_datetime(model.get('modified_at', '')),
-                'family': model.get('details', {}).get('family', 'Unknown'),
-                'raw_size': model.get('size', 0)
-            })
-        return jsonify({'success': True, 'models': formatted_models})
+        models, errors = listed_models()
+        if errors and len(errors) == len(fleet.hosts()):
+            message = next(iter(errors.values())) if len(errors) == 1 else '; '.join(
+                f'{host}: {error}' for host, error in errors.items()
+            )
+            return jsonify({'success': False, 'error': message, 'host_errors': errors})
+        # Per-host errors change the body, not the model index
+        extra = () if errors is None else (errors,)
+        
+        query = {name: request.args[name] for name in LISTING_PARAMS if name in request.args}
+        host_errors = {} if errors is None else {'host_errors': errors}
+        if query:
+            def listing_page():
+                page = model_page(models, query)
+                return models_json(b'[' + b','.join(record.json for record in page['models']) + b']',
+                                   total=page['total'], next_cursor=page['next_cursor'], **host_errors)
+            try:
+                return conditional_json(models_etag(models, *extra, query), listing_page)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def full_listing():
+            model_index.update(models, models_etag(models))
+            return models_json(model_index.listing(), **host_errors)
+        return conditional_json(models_etag(models, *extra), full_listing)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -206,22 +3372,69 @@ def api_download():
         if not model_name:
             return jsonify({'success': False, 'error': 'Model name is required'})
         
-        # Start download in background thread
-        def download_model():
-            try:
-                api.pull_model(model_name)
-            except Exception as e:
-                print(f"Download error: {e}")
-        
-        thread = threading.Thread(target=download_model)
-        thread.daemon = True
-        thread.start()
+        # Start (or join) a background pull job
+        job = pull_jobs.submit(model_name)
         
-        return jsonify({'success': True, 'message': f'Download started for {model_name}'})
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'message': f'Download started for {model_name}'
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
+@app.route('/api/downloads')
+def api_downloads():
+    """API endpoint to list recent download jobs"""
+    return jsonify({'success': True, 'jobs': pull_jobs.list_jobs()})
+
+
+@app.route('/api/download/<job_id>')
+def api_download_status(job_id):
+    """API endpoint to get the progress of a download job"""
+    job = pull_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Download job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@app.route('/api/download/<job_id>/events')
+def api_download_events(job_id):
+    """Server-Sent Events feed of a download job's progress"""
+    job = pull_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Download job not found'}), 404
+    
+    def events():
+        version = -1
+        while True:
+            latest = pull_jobs.wait_for_update(job_id, version)
+            if latest is None:
+                return
+            if latest.version == version and not latest.done:
+                yield ': keep-alive\n\n'
+                continue
+            version = latest.version
+            yield f"data: {json.dumps(latest.to_dict())}\n\n"
+            if latest.done:
+                return
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/download/<job_id>/cancel', methods=['POST'])
+def api_download_cancel(job_id):
+    """API endpoint to cancel a download job"""
+    if not pull_jobs.cancel(job_id):
+        return jsonify({'success': False, 'error': 'Download job not found or already finished'})
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
+
 @app.route('/api/delete', methods=['POST'])
 def api_delete():
     """API endpoint to delete a model"""
@@ -236,47 +3449,100 @@ def api_delete():
         return jsonify({'success': False, 'error': str(e)})
 
 
+def info_etag(client: OllamaAPI, host: str, model_name: str) -> Optional[str]:
+    """ETag for a model's /api/info response, or None if the model isn't listed"""
+    name = normalize_model_name(model_name)
+    try:
+        for model in client.list_models():
+            if model.get('name') == name:
+                return models_etag([dict(model, host=host)], model_name)
+    except Exception:
+        pass
+    return None
+
+
 @app.route('/api/info/<model_name>')
 def api_info(model_name):
-    """API endpoint to get model information"""
+    """API endpoint to get model information (from ?host=, or the first host that has it)"""
     try:
-        info = api.show_model_info(model_name)
-        return jsonify({'success': True, 'info': info})
+        host = request.args.get('host')
+        info = None
+        if host is None and len(fleet) == 1:
+            host, client = fleet.primary_name, api
+        elif host is None:
+            host, info = fleet.show_model_info(model_name)
+            client = fleet.client(host)
+        else:
+            try:
+                client = fleet.client(host)
+            except KeyError:
+                return jsonify({'success': False, 'error': f'Unknown host: {host}'}), 404
+        # The tag comes from the (cached) model list, so a matching
+        # revalidation never needs /api/show
+        etag = info_etag(client, host, model_name)
+        if etag is not None and etag_matches(request.headers.get('If-None-Match'), etag):
+            return conditional_json(etag, None)
+        if info is None:
+            info = client.show_model_info(model_name)
+        body = {'success': True, 'info': info, 'host': host}
+        return jsonify(body) if etag is None else conditional_json(etag, lambda: body)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
+@app.route('/api/fleet/hosts', methods=['GET', 'POST'])
+def api_fleet_hosts():
+    """API endpoint to list or register Ollama hosts"""
+    if request.method == 'GET':
+        return jsonify({'success': True, 'hosts': fleet.hosts()})
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    base_url = data.get('base_url')
+    if not name or not base_url:
+        return jsonify({'success': False, 'error': 'name and base_url are required'}), 400
+    fleet.add_host(name, base_url, timeout=data.get('timeout'))
+    return jsonify({'success': True, 'hosts': fleet.hosts()})
+
+
+@app.route('/api/fleet/hosts/<name>', methods=['DELETE'])
+def api_fleet_remove_host(name):
+    """API endpoint to unregister an Ollama host"""
+    try:
+        removed = fleet.remove_host(name)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not removed:
+        return jsonify({'success': False, 'error': f'Unknown host: {name}'}), 404
+    return jsonify({'success': True, 'hosts': fleet.hosts()})
+
+
+@app.route('/api/fleet/status')
+def api_fleet_status():
+    """API endpoint to get the status of every Ollama host, probed concurrently"""
+    statuses = fleet.server_status()
+    return jsonify({
+        'success': True,
+        'hosts': {host: status_summary(status) for host, status in statuses.items()}
+    })
+
+
+@app.route('/api/fleet/routing')
+def api_fleet_routing():
+    """API endpoint to get per-host generation load used for routing"""
+    return jsonify({'success': True, 'strategy': router.strategy, 'hosts': router.snapshot()})
+
+
+@app.route('/api/server/admission')
+def api_server_admission():
+    """API endpoint to get generation slots in use and queued requests"""
+    return jsonify({'success': True, 'admission': admission.snapshot()})
+
+
 @app.route('/api/server/status')
 def api_server_status():
     """API endpoint to get Ollama server status"""
     try:
-        response = requests.get(f"{api.base_url}/api/tags", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return jsonify({
-                'success': True,
-                'status': 'running',
-                'models_count': len(data.get('models', [])),
-                'response_time': response.elapsed.total_seconds()
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'status': 'error',
-                'error': f'HTTP {response.status_code}'
-            })
-    except requests.exceptions.ConnectionError:
-        return jsonify({
-            'success': True,
-            'status': 'stopped',
-            'error': 'Connection refused'
-        })
-    except requests.exceptions.Timeout:
-        return jsonify({
-            'success': True,
-            'status': 'timeout',
-            'error': 'Request timed out'
-        })
+        return jsonify(status_summary(health.latest()))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -286,70 +3552,35 @@ def api_server_status():
 
 @app.route('/api/server/logs')
 def api_server_logs():
-    """API endpoint to get recent server logs"""
+    """API endpoint to get recent server logs.
+    
+    With a real Ollama log available, returns the entries after the
+    ``after`` cursor, optionally filtered by ``level`` (comma separated),
+    along with the cursor to pass next time. Otherwise describes the
+    current server state.
+    """
     try:
-        # Get server status first
-        status_response = api_server_status()
-        status_data = status_response.get_json()
-        
-        logs = []
-        current_time = datetime.now().isoformat()
-        
-        if status_data.get('status') == 'running':
-            # Server is running - generate realistic logs based on current state
-            try:
-                models_response = requests.get(f"{api.base_url}/api/tags", timeout=5)
-                if models_response.status_code == 200:
-                    models_data = models_response.json()
-                    models = models_data.get('models', [])
-                    
-                    logs.extend([
-                        {
-                            'timestamp': current_time,
-                            'level': 'INFO',
-                            'message': f'Ollama server is running on {api.base_url}'
-                        },
-                        {
-                            'timestamp': current_time,
-                            'level': 'INFO',
-                            'message': f'Loaded {len(models)} models'
-                        }
-                    ])
-                    
-                    # Add logs for each model
-                    for model in models[:3]:  # Limit to 3 most recent
-                        logs.append({
-                            'timestamp': current_time,
-                            'level': 'SUCCESS',
-                            'message': f'Model {model.get("name", "unknown")} is available'
-                        })
-                        
-                    # Add API endpoint status
-                    logs.append({
-                        'timestamp': current_time,
-                        'level': 'INFO',
-                        'message': 'API endpoints responding normally'
-                    })
-                        
-            except Exception as e:
-                logs.append({
-                    'timestamp': current_time,
-                    'level': 'WARNING',
-                    'message': f'Error checking models: {str(e)}'
-                })
-        else:
-            # Server is not running
-            logs.append({
-                'timestamp': current_time,
-                'level': 'ERROR',
-                'message': f'Ollama server is not responding: {status_data.get("error", "Unknown error")}'
+        if not log_tailer.available:
+            return jsonify({
+                'success': True,
+                'logs': build_server_logs(health.latest(), api.base_url),
+                'cursor': None,
+                'source': None
             })
-            
+        log_tailer.start()
+        levels = request.args.get('level')
+        result = server_logs.after(
+            request.args.get('after'),
+            levels={level.strip().upper() for level in levels.split(',')} if levels else None,
+            limit=min(request.args.get('limit', 500, type=int), 5000)
+        )
         return jsonify({
             'success': True,
-            'logs': logs
+            'logs': result['logs'],
+            'cursor': result['cursor'],
+            'reset': result['reset'],
+            'source': log_tailer.path
         })
-        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -359,61 +3590,20 @@ def api_server_logs():
 
 @app.route('/api/server/errors')
 def api_server_errors():
-    """API endpoint to get recent server errors"""
+    """API endpoint to get aggregated server errors (optionally ?window=1m|5m|1h)"""
     try:
-        # Get server status first
-        status_response = api_server_status()
-        status_data = status_response.get_json()
-        
-        errors = []
-        current_time = datetime.now().isoformat()
-        
-        # Check for various error conditions
-        if status_data.get('status') == 'stopped':
-            errors.append({
-                'timestamp': current_time,
-                'level': 'critical',
-                'title': 'Server Not Running',
-                'error': 'Ollama server is not responding',
-                'stack': 'Connection refused to ' + api.base_url,
-                'suggestion': 'Start the Ollama server using "ollama serve" command'
-            })
-        elif status_data.get('status') == 'timeout':
-            errors.append({
-                'timestamp': current_time,
-                'level': 'error',
-                'title': 'Server Timeout',
-                'error': 'Server request timed out',
-                'stack': 'Request to ' + api.base_url + '/api/tags timed out',
-                'suggestion': 'Check server load and network connectivity'
-            })
-        elif status_data.get('status') == 'error':
-            errors.append({
-                'timestamp': current_time,
-                'level': 'error', 
-                'title': 'Server Error',
-                'error': status_data.get('error', 'Unknown server error'),
-                'stack': 'HTTP response from ' + api.base_url,
-                'suggestion': 'Check Ollama server logs for more details'
-            })
-        else:
-            # Server is running, check for other potential issues
-            response_time = status_data.get('response_time', 0)
-            if response_time > 2.0:
-                errors.append({
-                    'timestamp': current_time,
-                    'level': 'warning',
-                    'title': 'Slow Response Time',
-                    'error': f'API response time: {response_time:.2f}s (threshold: 2.0s)',
-                    'stack': 'API response measurement',
-                    'suggestion': 'Consider checking server load or using a smaller model'
-                })
-                
+        window = request.args.get('window')
+        if window is not None and window not in ErrorTracker.WINDOWS:
+            return jsonify({
+                'success': False,
+                'error': f'window must be one of {", ".join(ErrorTracker.WINDOWS)}'
+            }), 400
+        health.latest()  # Make sure at least one sample has been counted
+        log_tailer.start()
         return jsonify({
             'success': True,
-            'errors': errors
+            'errors': error_tracker.summary(window)
         })
-        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -421,6 +3611,62 @@ def api_server_errors():
         })
 
 
+@app.route('/api/server/latency')
+def api_server_latency():
+    """API endpoint to get learned latency baselines per endpoint and model"""
+    return jsonify({'success': True, 'latency': latency.snapshot()})
+
+
+@app.route('/api/server/health')
+def api_server_health():
+    """API endpoint to get recent health samples"""
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'success': True,
+        'interval': health.interval,
+        'samples': [
+            {key: value for key, value in sample.items() if key != 'models'}
+            for sample in health.recent(limit)
+        ]
+    })
+
+
+@app.route('/api/server/events')
+def api_server_events():
+    """Server-Sent Events feed of status changes, new log lines and errors.
+    
+    Sends a ``status`` snapshot on connect, then only deltas: ``errors``
+    events carry just the aggregated errors whose counts changed. A
+    ``resync`` event means the client missed events and should refetch.
+    Each subscriber holds a server thread while connected, so their number
+    is capped (see ``serve``); over the cap, clients get a 503 and poll.
+    """
+    subscriber = monitoring_events.subscribe()
+    if subscriber is None:
+        return jsonify({'success': False, 'error': 'Too many subscribers'}), 503, {'Retry-After': '30'}
+    log_tailer.start()
+    latest = health.latest()
+    
+    def events():
+        yield f"event: status\ndata: {json.dumps(status_summary(latest))}\n\n"
+        while True:
+            pending = monitoring_events.next_events(subscriber)
+            if not pending:
+                yield ': keep-alive\n\n'
+            for event, data in pending:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also runs for HEAD requests and clients that leave before the first
+    # byte, where the generator is never started
+    response.call_on_close(lambda: monitoring_events.unsubscribe(subscriber))
+    return response
+
+
 # Test endpoint to simulate a running server (for demonstration)
 @app.route('/api/server/test-running')
 def api_server_test_running():
@@ -569,6 +3815,28 @@ def create_templates():
         tr:hover {
             background-color: #f5f5f5;
         }
+        th a {
+            color: inherit;
+            text-decoration: none;
+        }
+        .filters {
+            display: flex;
+            gap: 10px;
+            flex-wrap: wrap;
+            align-items: center;
+        }
+        .filters input {
+            padding: 9px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+        }
+        .pagination {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-top: 15px;
+            color: #666;
+        }
         .error {
             color: #dc3545;
             background-color: #f8d7da;
@@ -657,14 +3925,28 @@ def create_templates():
             <button class="btn btn-info" onclick="showSelectedModelInfo()">Model Info</button>
         </div>
 
+        <form class="filters" method="get" action="/">
+            <input type="search" name="q" value="{{ listing.q }}" placeholder="Filter by name">
+            <input type="text" name="family" value="{{ listing.family }}" placeholder="Family">
+            <input type="hidden" name="sort" value="{{ listing.sort }}">
+            <input type="hidden" name="order" value="{{ listing.order }}">
+            <button class="btn btn-primary" type="submit">Filter</button>
+        </form>
+
+        {% macro sort_link(field, label) -%}
+            {%- set order = 'desc' if listing.sort == field and listing.order == 'asc' else 'asc' -%}
+            <a href="{{ url_for('index', sort=field, order=order, q=listing.q or None, family=listing.family or None) }}">
+                {{- label }}{% if listing.sort == field %}{% if listing.order == 'asc' %} &#9650;{% else %} &#9660;{% endif %}{% endif -%}
+            </a>
+        {%- endmacro %}
         <table id="modelsTable">
             <thead>
                 <tr>
                     <th>Select</th>
-                    <th>Model Name</th>
-                    <th>Size</th>
-                    <th>Modified</th>
-                    <th>Family</th>
+                    <th>{{ sort_link('name', 'Model Name') }}</th>
+                    <th>{{ sort_link('size', 'Size') }}</th>
+                    <th>{{ sort_link('modified_at', 'Modified') }}</th>
+                    <th>{{ sort_link('family', 'Family') }}</th>
                 </tr>
             </thead>
             <tbody>
@@ -683,6 +3965,13 @@ def create_templates():
                 {% endfor %}
             </tbody>
         </table>
+
+        <div class="pagination">
+            <span>{{ listing.total }} model{{ '' if listing.total == 1 else 's' }}</span>
+            {% if listing.next_cursor %}
+            <a class="btn btn-primary" href="{{ url_for('index', cursor=listing.next_cursor, sort=listing.sort, order=listing.order, q=listing.q or None, family=listing.family or None) }}">Next page</a>
+            {% endif %}
+        </div>
     </div>
 
     <!-- Status notification -->
@@ -739,7 +4028,7 @@ def create_templates():
             .then(data => {
                 if (data.success) {
                     showStatus(data.message, 'success');
-                    setTimeout(refreshModels, 2000);
+                    watchDownload(data.job_id);
                 } else {
                     showStatus('Error: ' + data.error, 'error');
                 }
@@ -749,6 +4038,26 @@ def create_templates():
             });
         }
 
+        function watchDownload(jobId) {
+            const events = new EventSource(`/api/download/${jobId}/events`);
+            events.onmessage = function(event) {
+                const job = JSON.parse(event.data);
+                if (job.status === 'completed') {
+                    events.close();
+                    showStatus(`Downloaded ${job.model_name}`, 'success');
+                    setTimeout(refreshModels, 1000);
+                } else if (job.status === 'failed' || job.status === 'cancelled') {
+                    events.close();
+                    showStatus(`Download ${job.status}: ${job.error || job.model_name}`, 'error');
+                } else if (job.total) {
+                    showStatus(`Downloading ${job.model_name}: ${job.percent}%`, 'success');
+                }
+            };
+            events.onerror = function() {
+                events.close();
+            };
+        }
+
         function importModel() {
             alert('Model import functionality would be implemented here.\\nThis could involve importing from a file or another source.');
         }
@@ -863,16 +4172,161 @@ def create_templates():
         f.write(index_html)
 
 
-def main():
+def configure_shared_state(state_dir: str):
+    """Share pull jobs and cache invalidation between worker processes"""
+    os.makedirs(state_dir, exist_ok=True)
+    pull_jobs.state_dir = state_dir
+    api.invalidation_path = os.path.join(state_dir, 'models.stamp')
+    fleet.hosts_path = os.path.join(state_dir, 'hosts.json')
+    fleet._save()
+    if not conversations.persist_dir:
+        conversations.persist_dir = os.path.join(state_dir, 'conversations')
+
+
+def configure_hosts(specs: List[str]):
+    """Register Ollama hosts given as ``URL`` or ``NAME=URL``; the first is the primary"""
+    global fleet
+    for index, spec in enumerate(specs):
+        name, _, url = spec.partition('=') if '=' in spec.split('://')[0] else ('', '', spec)
+        if index == 0:
+            api.base_url = url.rstrip('/')
+            fleet = OllamaFleet(api, primary_name=name or 'local')
+            router.fleet = fleet
+        else:
+            fleet.add_host(name or url.split('://')[-1].rstrip('/'), url)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Command-line options shared by main() and demo.py"""
+    parser = argparse.ArgumentParser(description="Ollama Model Manager")
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind to')
+    parser.add_argument('--port', type=int, default=5000, help='Port to listen on')
+    parser.add_argument('--production', action='store_true',
+                        help='Serve with Gunicorn worker processes instead of the Flask dev server')
+    parser.add_argument('--workers', type=int, default=(os.cpu_count() or 1) * 2 + 1,
+                        help='Number of worker processes (production mode)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Threads per worker process (production mode)')
+    parser.add_argument('--timeout', type=int, default=120,
+                        help='Seconds before a silent worker is killed and restarted (production mode)')
+    parser.add_argument('--keepalive', type=int, default=5,
+                        help='Seconds to hold idle keep-alive connections open (production mode)')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='Seconds workers get to finish requests on reload or shutdown (production mode)')
+    parser.add_argument('--pidfile', default=None,
+                        help='Write the master PID here; send it SIGHUP for a graceful reload')
+    parser.add_argument('--ollama', action='append', default=[], metavar='[NAME=]URL',
+                        help='Ollama host to manage; repeat for several hosts (default: http://localhost:11434)')
+    parser.add_argument('--routing', choices=GenerationRouter.STRATEGIES, default='affinity',
+                        help='How generations are spread over several Ollama hosts')
+    parser.add_argument('--max-generations', type=int, default=8,
+                        help='Generations sent to Ollama at once (per worker process)')
+    parser.add_argument('--max-per-model', type=int, default=4,
+                        help='Generations sent to Ollama at once for any one model (per worker process)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='Generation requests allowed to wait for a slot before 429s are returned')
+    parser.add_argument('--queue-timeout', type=float, default=30.0,
+                        help='Seconds a generation request may wait for a slot before a 503 is returned')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='Cache replies to deterministic generations (temperature 0 with a seed)')
+    parser.add_argument('--response-cache-mb', type=int, default=64,
+                        help='Memory for cached replies, in MB (per worker process)')
+    parser.add_argument('--response-cache-ttl', type=float, default=3600.0,
+                        help='Seconds a cached reply stays valid')
+    parser.add_argument('--response-cache-dir', default=None,
+                        help='Also keep cached replies on disk in this directory (shared between workers)')
+    parser.add_argument('--compress-min-size', type=int, default=1024,
+                        help='Smallest response body, in bytes, sent gzip/brotli-compressed')
+    parser.add_argument('--no-compression', action='store_true',
+                        help='Never compress responses (e.g. behind a proxy that already does)')
+    parser.add_argument('--health-interval', type=float, default=5.0,
+                        help='Seconds between background Ollama health probes')
+    parser.add_argument('--ollama-log', default=None,
+                        help='Ollama server log file to tail (default: auto-detect)')
+    parser.add_argument('--context-tokens', type=int, default=4096,
+                        help='Approximate token budget for the chat history sent with each prompt')
+    parser.add_argument('--summarize-history', action='store_true',
+                        help='Summarise chat turns that fall out of the token budget')
+    parser.add_argument('--conversation-dir', default=None,
+                        help='Persist server-side conversations in this directory')
+    parser.add_argument('--state-dir', default=os.path.join(tempfile.gettempdir(), 'ollama-manager'),
+                        help='Directory for state shared between worker processes')
+    return parser
+
+
+def serve(args: argparse.Namespace):
+    """Run the Flask app with the dev server, or under Gunicorn in production mode"""
+    global response_cache
+    conversations.persist_dir = args.conversation_dir
+    configure_hosts(args.ollama)
+    router.strategy = args.routing
+    admission.max_concurrent = args.max_generations
+    admission.max_per_model = args.max_per_model
+    admission.max_queue = args.queue_size
+    admission.max_wait = args.queue_timeout
+    if args.response_cache:
+        response_cache = ResponseCache(args.response_cache_mb * 1024 * 1024, args.response_cache_ttl,
+                                       args.response_cache_dir)
+    compression.enabled = not args.no_compression
+    compression.min_size = args.compress_min_size
+    if args.production:
+        # Every feed subscriber holds one of a worker's --threads for as long as
+        # its tab is open; keep at least half of them for other requests
+        monitoring_events.max_subscribers = max(1, args.threads // 2)
+    health.interval = args.health_interval
+    if args.ollama_log:
+        log_tailer.path = args.ollama_log
+    context_budget.max_tokens = args.context_tokens
+    if args.summarize_history:
+        context_budget.summarizer = summarize_with_ollama
+    if not args.production:
+        app.run(host=args.host, port=args.port, debug=False)
+        return
+    
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("Production mode requires Gunicorn: pip install gunicorn")
+    
+    configure_shared_state(args.state_dir)
+    options = {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'keepalive': args.keepalive,
+        'graceful_timeout': args.graceful_timeout,
+        'pidfile': args.pidfile
+    }
+    
+    class ManagerApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    ManagerApplication().run()
+
+
+def main(argv: Optional[List[str]] = None):
     """Main entry point"""
+    args = build_arg_parser().parse_args(argv)
+    
     # Create templates directory and files
     create_templates()
     
     # Run the Flask app
     print("Starting Ollama Model Manager...")
-    print("Open your browser and go to: http://localhost:5000")
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    print(f"Open your browser and go to: http://localhost:{args.port}")
+    if args.production:
+        print(f"Production mode: {args.workers} workers x {args.threads} threads "
+              "(send SIGHUP to the master process for a graceful reload)")
+    serve(args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
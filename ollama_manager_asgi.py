@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) serving mode for the Ollama Model Manager
+
+Serves the same JSON API as ollama_manager.py (/api/generate, /api/models,
+/api/info/<name> and /api/server/*) on Starlette, talking to Ollama through
+an httpx.AsyncClient. Long-lived generation streams are coroutines rather
+than threads, so one process can hold hundreds of them open.
+
+Run with:
+    python ollama_manager_asgi.py
+or:
+    uvicorn ollama_manager_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from ollama_manager import (
+    OllamaAPI, ErrorTracker, ResponseCompressor, latency, metrics, build_prompt, format_model, models_etag, etag_matches,
+    status_summary, build_server_logs, build_server_errors, normalize_model_name, context_budget
+)
+
+
+class AsyncOllamaAPI:
+    """Async client for the Ollama API with the same caching as OllamaAPI"""
+
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 pool_size: int = 100, timeouts: Optional[Dict[str, float]] = None,
+                 models_ttl: float = 5.0, info_cache_size: int = 64,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = dict(OllamaAPI.DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.models_ttl = models_ttl
+        self.info_cache_size = info_cache_size
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            transport=transport
+        )
+
+        self._status: Optional[Dict] = None
+        self._status_expires = 0.0
+        self._status_task: Optional[asyncio.Task] = None
+        self._info: OrderedDict = OrderedDict()
+        self._info_tasks: Dict[tuple, asyncio.Task] = {}
+
+    def _timeout(self, path: str) -> float:
+        return self.timeouts.get(path, 30)
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request to Ollama using the configured timeout for ``path``"""
+        kwargs.setdefault('timeout', self._timeout(path))
+        response = await self.client.request(method, path, **kwargs)
+        latency.observe('endpoint', path, response.elapsed.total_seconds())
+        return response
+
+    def stream(self, method: str, path: str, **kwargs):
+        """Open a streamed request to Ollama (use with ``async with``)"""
+        kwargs.setdefault('timeout', self._timeout(path))
+        return self.client.stream(method, path, **kwargs)
+
+    async def _probe_tags(self) -> Dict:
+        """Fetch /api/tags once and describe the outcome as a status dict"""
+        checked_at = datetime.now().isoformat()
+        try:
+            response = await self.request('GET', '/api/tags')
+        except httpx.ConnectError:
+            return {'status': 'stopped', 'error': 'Connection refused', 'checked_at': checked_at}
+        except httpx.TimeoutException:
+            return {'status': 'timeout', 'error': 'Request timed out', 'checked_at': checked_at}
+        except httpx.HTTPError as e:
+            return {'status': 'error', 'error': str(e), 'checked_at': checked_at}
+
+        if response.status_code != 200:
+            return {
+                'status': 'error',
+                'error': f'HTTP {response.status_code}',
+                'response_time': response.elapsed.total_seconds(),
+                'checked_at': checked_at
+            }
+        try:
+            models = response.json().get('models', [])
+        except ValueError as e:
+            return {'status': 'error', 'error': f'Invalid response: {e}', 'checked_at': checked_at}
+        return {
+            'status': 'running',
+            'models': models,
+            'response_time': response.elapsed.total_seconds(),
+            'checked_at': checked_at
+        }
+
+    async def server_status(self) -> Dict:
+        """Get the (cached) result of the latest /api/tags probe"""
+        loop = asyncio.get_running_loop()
+        if self._status is not None and loop.time() < self._status_expires:
+            return self._status
+        # Concurrent misses all await the same probe
+        task = self._status_task
+        if task is None or task.done():
+            task = self._status_task = asyncio.ensure_future(self._probe_tags())
+        status = await asyncio.shield(task)
+        if task is self._status_task:
+            self._status = status
+            self._status_expires = loop.time() + self.models_ttl
+            self._status_task = None
+        return status
+
+    def invalidate_models(self):
+        """Force the next model list or status lookup to hit Ollama"""
+        self._status = None
+        self._status_task = None
+
+    async def list_models(self) -> List[Dict]:
+        """List all local models"""
+        status = await self.server_status()
+        if status['status'] != 'running':
+            raise Exception(f"Failed to connect to Ollama: {status.get('error', 'Unknown error')}")
+        return status['models']
+
+    async def show_model_info(self, model_name: str) -> Dict:
+        """Get detailed information about a model"""
+        name = normalize_model_name(model_name)
+        digest = modified_at = None
+        try:
+            for model in await self.list_models():
+                if model.get('name') == name:
+                    digest = model.get('digest')
+                    modified_at = model.get('modified_at')
+                    break
+        except Exception:
+            pass  # Fall back to a name-only key; the fetch reports the error
+        key = (name, digest, modified_at)
+
+        if key in self._info:
+            self._info.move_to_end(key)
+            return self._info[key]
+        task = self._info_tasks.get(key)
+        if task is None:
+            task = self._info_tasks[key] = asyncio.ensure_future(self._fetch_model_info(model_name))
+        try:
+            info = await asyncio.shield(task)
+        finally:
+            if task.done() and self._info_tasks.get(key) is task:
+                del self._info_tasks[key]
+        self._info[key] = info
+        while len(self._info) > self.info_cache_size:
+            self._info.popitem(last=False)
+        return info
+
+    async def _fetch_model_info(self, model_name: str) -> Dict:
+        """Fetch /api/show for a model without caching"""
+        try:
+            response = await self.request('POST', '/api/show', json={"name": model_name})
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"Failed to get model info: {e}")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression, the ASGI side of ResponseCompressor.
+    
+    A body sent in one message is compressed once it reaches the
+    compressor's ``min_size``. A streamed body (generation NDJSON) is
+    compressed message by message with a sync flush after each, so every
+    token reaches the client as soon as Ollama produces it. Event streams
+    and other types outside ``ResponseCompressor.MIMETYPES`` pass through.
+    """
+
+    def __init__(self, app, compressor: Optional[ResponseCompressor] = None):
+        self.app = app
+        self.compressor = compressor or ResponseCompressor()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.compressor.enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compressor.negotiate(Headers(scope=scope).get('accept-encoding'))
+        state = {'start': None, 'passthrough': False, 'step': None}
+
+        async def send_compressed(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                mimetype = headers.get('content-type', '').partition(';')[0].strip().lower()
+                if mimetype in self.compressor.MIMETYPES:
+                    headers.add_vary_header('Accept-Encoding')
+                status = message['status']
+                if (mimetype not in self.compressor.MIMETYPES or encoding is None
+                        or 'content-encoding' in headers or status < 200 or status in (204, 206, 304)):
+                    state['passthrough'] = True
+                    await send(message)
+                else:
+                    state['start'] = message  # Held until the first body message decides
+                return
+            if message['type'] != 'http.response.body' or state['passthrough']:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            start = state['start']
+            if start is not None:
+                state['start'] = None
+                headers = MutableHeaders(scope=start)
+                if not more_body:
+                    if len(body) >= self.compressor.min_size:
+                        compressed = (self.compressor.cached(body, encoding) if 'etag' in headers
+                                      else self.compressor.compress(body, encoding))
+                        if len(compressed) < len(body):
+                            headers['Content-Encoding'] = encoding
+                            headers['Content-Length'] = str(len(compressed))
+                            self._weaken_etag(headers)
+                            metrics.inc('ollama_manager_compressed_responses_total',
+                                        encoding=encoding, mode='buffered')
+                            body = compressed
+                    state['passthrough'] = True
+                    await send(start)
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+                headers['Content-Encoding'] = encoding
+                if 'content-length' in headers:
+                    del headers['Content-Length']
+                self._weaken_etag(headers)
+                metrics.inc('ollama_manager_compressed_responses_total', encoding=encoding, mode='streamed')
+                state['step'], state['finish'] = self.compressor.stream_compressor(encoding)
+                await send(start)
+
+            data = state['step'](body) if body else b''
+            if not more_body:
+                data += state['finish']()
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _weaken_etag(headers: MutableHeaders):
+        etag = headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = f'W/{etag}'
+
+
+def create_app(client: Optional[AsyncOllamaAPI] = None) -> Starlette:
+    """Create the ASGI application around an async Ollama client"""
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await app.state.api.aclose()
+
+    async def api_generate(request: Request):
+        """API endpoint to generate a chat response using conversation history"""
+        api = request.app.state.api
+        try:
+            data = await request.json()
+            model = data.get('model')
+            prompt = data.get('prompt')
+            stream = data.get('stream', False)
+            history = data.get('history', [])
+            if not model or not prompt:
+                return JSONResponse({'success': False, 'error': 'Model and prompt are required'}, 400)
+
+            if context_budget.summarizer is None:
+                history = context_budget.window(model, history, prompt)
+            else:
+                # Summarising calls Ollama synchronously; keep it off the event loop
+                # (run_in_executor rather than asyncio.to_thread, which needs 3.9)
+                history = await asyncio.get_running_loop().run_in_executor(
+                    None, context_budget.window, model, history, prompt
+                )
+            payload = {
+                "model": model,
+                "prompt": build_prompt(history, prompt),
+                "stream": stream
+            }
+            if not stream:
+                try:
+                    response = await api.request('POST', '/api/generate', json=payload)
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    return JSONResponse({'success': False, 'error': f'Failed to generate response: {e}'}, 500)
+                return JSONResponse({'success': True, 'response': response.json().get('response', '')})
+
+            # Open the upstream stream before answering so connection
+            # errors still produce a JSON error response
+            upstream = api.stream('POST', '/api/generate', json=payload)
+            try:
+                response = await upstream.__aenter__()
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                await upstream.__aexit__(None, None, None)
+                return JSONResponse({'success': False, 'error': f'Failed to generate response: {e}'}, 500)
+
+            async def relay():
+                try:
+                    async for line in response.aiter_lines():
+                        if line:
+                            yield line + '\n'
+                except httpx.HTTPError as e:
+                    yield json.dumps({'error': f'Failed to generate response: {e}', 'done': True}) + '\n'
+                finally:
+                    # Also runs when the client disconnects and the
+                    # generator is cancelled
+                    await upstream.__aexit__(None, None, None)
+
+            return StreamingResponse(
+                relay(),
+                media_type='application/x-ndjson',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+    def conditional_json(request: Request, etag: str, build_body) -> Response:
+        """JSON response validated by ``etag``: 304 when the client already has it"""
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(build_body(), headers=headers)
+
+    async def api_models(request: Request):
+        """API endpoint to get models as JSON"""
+        try:
+            models = await request.app.state.api.list_models()
+            return conditional_json(request, models_etag(models), lambda: {
+                'success': True,
+                'models': [format_model(model) for model in models]
+            })
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)})
+
+    async def api_info(request: Request):
+        """API endpoint to get model information"""
+        api = request.app.state.api
+        model_name = request.path_params['model_name']
+        try:
+            name = normalize_model_name(model_name)
+            etag = None
+            try:
+                for model in await api.list_models():
+                    if model.get('name') == name:
+                        etag = models_etag([model], model_name)
+                        break
+            except Exception:
+                pass
+            if etag is not None and etag_matches(request.headers.get('if-none-match'), etag):
+                return conditional_json(request, etag, None)
+            info = await api.show_model_info(model_name)
+            body = {'success': True, 'info': info}
+            return JSONResponse(body) if etag is None else conditional_json(request, etag, lambda: body)
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)})
+
+    async def api_server_status(request: Request):
+        """API endpoint to get Ollama server status"""
+        try:
+            return JSONResponse(status_summary(await request.app.state.api.server_status()))
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)})
+
+    async def api_server_logs(request: Request):
+        """API endpoint to get recent server logs"""
+        api = request.app.state.api
+        try:
+            logs = build_server_logs(await api.server_status(), api.base_url)
+            return JSONResponse({'success': True, 'logs': logs})
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)})
+
+    async def api_server_errors(request: Request):
+        """API endpoint to get aggregated server errors (optionally ?window=1m|5m|1h)"""
+        api = request.app.state.api
+        tracker = request.app.state.errors
+        try:
+            window = request.query_params.get('window')
+            if window is not None and window not in ErrorTracker.WINDOWS:
+                return JSONResponse({
+                    'success': False,
+                    'error': f'window must be one of {", ".join(ErrorTracker.WINDOWS)}'
+                }, 400)
+            status = await api.server_status()
+            # The status is cached; count each probe once, however often it is read
+            if status.get('checked_at') != request.app.state.errors_checked_at:
+                request.app.state.errors_checked_at = status.get('checked_at')
+                for error in build_server_errors(status, api.base_url):
+                    tracker.record(error)
+            return JSONResponse({'success': True, 'errors': tracker.summary(window)})
+        except Exception as e:
+            return JSONResponse({'success': False, 'error': str(e)})
+
+    app = Starlette(
+        routes=[
+            Route('/api/generate', api_generate, methods=['POST']),
+            Route('/api/models', api_models),
+            Route('/api/info/{model_name:path}', api_info),
+            Route('/api/server/status', api_server_status),
+            Route('/api/server/logs', api_server_logs),
+            Route('/api/server/errors', api_server_errors),
+        ],
+        middleware=[
+            Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+            Middleware(CompressionMiddleware)
+        ],
+        lifespan=lifespan
+    )
+    app.state.api = client or AsyncOllamaAPI()
+    app.state.errors = ErrorTracker()
+    app.state.errors_checked_at = None
+    return app
+
+
+app = create_app()
+
+
+def main():
+    """Async entry point, the counterpart of ollama_manager.main()"""
+    import uvicorn
+
+    print("Starting Ollama Model Manager (async mode)...")
+    print("Open your browser and go to: http://localhost:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
@@ -235,9 +235,12 @@ class OllamaWrapperApp {
                 autoRefreshInterval: null,
                 errorFilter: 'all',
                 logs: [],
+                logCursor: null,
                 errors: [],
                 lastLogUpdate: null,
-                lastErrorUpdate: null
+                lastErrorUpdate: null,
+                feed: null,
+                feedConnected: false
             };
         }
     }
@@ -254,7 +257,9 @@ class OllamaWrapperApp {
     async fetchServerLogs() {
         try {
             const backendUrl = 'http://localhost:5000'; // Use Flask server
-            const response = await fetch(`${backendUrl}/api/server/logs`);
+            const cursor = window.monitoringState.logCursor;
+            const query = cursor ? `?after=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`${backendUrl}/api/server/logs${query}`);
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -262,7 +267,14 @@ class OllamaWrapperApp {
             
             const data = await response.json();
             if (data.success) {
-                window.monitoringState.logs = data.logs || [];
+                if (data.cursor && cursor && !data.reset) {
+                    // Only new lines were sent; append them, newest first
+                    const logs = (data.logs || []).slice().reverse().concat(window.monitoringState.logs);
+                    window.monitoringState.logs = logs.slice(0, 1000);
+                } else {
+                    window.monitoringState.logs = data.cursor ? (data.logs || []).slice().reverse() : (data.logs || []);
+                }
+                window.monitoringState.logCursor = data.cursor || null;
                 window.monitoringState.lastLogUpdate = new Date().toISOString();
                 this.displayLogs();
             } else {
@@ -406,6 +418,7 @@ class OllamaWrapperApp {
                 <span class="timestamp">[${formattedTime}]</span>
                 <span class="level ${error.level}">${error.level.toUpperCase()}</span>
                 <span class="error-title">${error.title}</span>
+                ${error.count > 1 ? `<span class="error-count" title="First seen ${error.first_seen}">×${error.count}</span>` : ''}
             </div>
             <div class="error-details">
                 <p><strong>Error:</strong> ${error.error}</p>
@@ -419,23 +432,75 @@ class OllamaWrapperApp {
 
     // Set up real-time updates
     setupRealTimeUpdates() {
-        // Refresh data every 30 seconds
+        // Prefer the server's push feed; poll only while it is unavailable
+        this.connectMonitoringFeed();
+        
+        // Fallback: refresh every 30 seconds on the server tab with auto-refresh enabled
         setInterval(async () => {
+            if (window.monitoringState.feedConnected) return;
             const serverView = document.getElementById('server-view');
             const autoRefreshEnabled = document.getElementById('autoRefresh')?.checked;
             
-            // Only refresh automatically if we're on the server tab and auto-refresh is enabled
             if (serverView?.classList.contains('active') && autoRefreshEnabled) {
                 await this.loadRealTimeData();
             }
         }, 30000);
         
-        // Also check for updates every 5 minutes regardless of view
+        // Fallback: also check for updates every 5 minutes regardless of view
         setInterval(async () => {
+            if (window.monitoringState.feedConnected) return;
             await this.loadRealTimeData();
         }, 300000);
     }
 
+    // Subscribe to status, log and error deltas pushed by the server
+    connectMonitoringFeed() {
+        if (typeof EventSource === 'undefined' || window.monitoringState.feed) return;
+        
+        const backendUrl = 'http://localhost:5000'; // Use Flask server
+        const feed = new EventSource(`${backendUrl}/api/server/events`);
+        window.monitoringState.feed = feed;
+        
+        feed.onopen = () => {
+            window.monitoringState.feedConnected = true;
+        };
+        feed.onerror = () => {
+            // EventSource reconnects by itself; poll until it does
+            window.monitoringState.feedConnected = false;
+        };
+        
+        feed.addEventListener('logs', (event) => {
+            const data = JSON.parse(event.data);
+            const logs = (data.logs || []).slice().reverse().concat(window.monitoringState.logs);
+            window.monitoringState.logs = logs.slice(0, 1000);
+            window.monitoringState.logCursor = data.cursor || null;
+            window.monitoringState.lastLogUpdate = new Date().toISOString();
+            this.displayLogs();
+        });
+        feed.addEventListener('errors', (event) => {
+            // Only the errors whose counts changed are sent; merge them in by fingerprint
+            const changed = JSON.parse(event.data) || [];
+            const fingerprints = new Set(changed.map(error => error.fingerprint));
+            const unchanged = window.monitoringState.errors.filter(error => !fingerprints.has(error.fingerprint));
+            window.monitoringState.errors = changed.concat(unchanged).slice(0, 500);
+            window.monitoringState.lastErrorUpdate = new Date().toISOString();
+            this.displayErrors();
+        });
+        feed.addEventListener('resync', () => {
+            // We fell behind and missed events; reload from the last cursor
+            this.loadRealTimeData();
+        });
+    }
+
+    // Stop listening to the push feed
+    disconnectMonitoringFeed() {
+        if (window.monitoringState.feed) {
+            window.monitoringState.feed.close();
+            window.monitoringState.feed = null;
+        }
+        window.monitoringState.feedConnected = false;
+    }
+
     // Model Management Methods
     setupModelsManagement() {
         // Set up event listeners for model management
@@ -847,7 +912,7 @@ class OllamaWrapperApp {
         const serverUrl = window.settingsManager ? window.settingsManager.getSetting('serverUrl') : 'http://localhost:11434';
 
         try {
-            // Send the full chat history to the backend
+            // Send the full chat history to the backend and stream the reply
             const response = await fetch(`${serverUrl}/api/generate`, {
                 method: 'POST',
                 headers: {
@@ -856,7 +921,7 @@ class OllamaWrapperApp {
                 body: JSON.stringify({
                     model: this.selectedChatModel,
                     prompt: prompt,
-                    stream: false,
+                    stream: true,
                     history: this.chatHistory // send the full conversation history
                 })
             });
@@ -865,13 +930,46 @@ class OllamaWrapperApp {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.body || !contentType.includes('ndjson')) {
+                // Not a stream (e.g. an error or an older backend); render it at once
+                const data = await response.json();
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                this.removeTypingIndicator(typingId);
+                this.addChatMessage('assistant', data.response || 'No response received');
+                return;
+            }
 
-            // Remove typing indicator
-            this.removeTypingIndicator(typingId);
+            let renderer = null;
+            let contentElement = null;
+            await window.MarkdownUtils.readNdjson(response, (chunk) => {
+                if (chunk.error) {
+                    throw new Error(chunk.error);
+                }
+                if (!renderer) {
+                    // Swap the typing indicator for the reply on the first token
+                    this.removeTypingIndicator(typingId);
+                    contentElement = this.createChatMessageElement('assistant');
+                    renderer = window.MarkdownUtils
+                        ? window.MarkdownUtils.createStreamingRenderer(contentElement, () => this.scrollChatToBottom())
+                        : null;
+                }
+                if (renderer) {
+                    renderer.append(chunk.response || '');
+                } else {
+                    contentElement.textContent += chunk.response || '';
+                }
+            });
 
-            // Add assistant response
-            this.addChatMessage('assistant', data.response || 'No response received');
+            if (!contentElement) {
+                this.removeTypingIndicator(typingId);
+                this.addChatMessage('assistant', 'No response received');
+                return;
+            }
+            const reply = renderer ? renderer.finish() : contentElement.textContent;
+            this.chatHistory.push({ role: 'assistant', content: reply || 'No response received' });
 
         } catch (error) {
             console.error('Error sending chat message:', error);
@@ -884,9 +982,9 @@ class OllamaWrapperApp {
         }
     }
 
-    addChatMessage(role, content) {
+    // Create an empty chat message and return its content element
+    createChatMessageElement(role) {
         const messagesContainer = document.getElementById('chat-messages');
-        if (!messagesContainer) return;
 
         // Remove welcome message if it exists
         const welcomeMessage = messagesContainer.querySelector('.welcome-message');
@@ -900,6 +998,24 @@ class OllamaWrapperApp {
         const contentElement = document.createElement('div');
         contentElement.className = 'message-content';
         
+        messageElement.appendChild(contentElement);
+        messagesContainer.appendChild(messageElement);
+        return contentElement;
+    }
+
+    scrollChatToBottom() {
+        const messagesContainer = document.getElementById('chat-messages');
+        if (messagesContainer) {
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    }
+
+    addChatMessage(role, content) {
+        const messagesContainer = document.getElementById('chat-messages');
+        if (!messagesContainer) return;
+
+        const contentElement = this.createChatMessageElement(role);
+        
         // Use markdown rendering for assistant responses, plain text for user messages
         if (role === 'assistant' && window.MarkdownUtils) {
             contentElement.innerHTML = window.MarkdownUtils.renderChatContent(content);
@@ -907,11 +1023,8 @@ class OllamaWrapperApp {
             contentElement.textContent = content;
         }
         
-        messageElement.appendChild(contentElement);
-        messagesContainer.appendChild(messageElement);
-        
         // Scroll to bottom
-        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        this.scrollChatToBottom();
         
         // Store in history
         this.chatHistory.push({ role, content });
@@ -1457,9 +1570,12 @@ function toggleAutoRefresh() {
     const checkbox = document.getElementById('autoRefresh');
     
     if (checkbox.checked) {
-        // Refresh both logs and errors every 10 seconds when auto-refresh is enabled
+        if (window.ollamaApp) {
+            window.ollamaApp.connectMonitoringFeed();
+        }
+        // Poll every 10 seconds only while the push feed is down
         window.monitoringState.autoRefreshInterval = setInterval(async () => {
-            if (window.ollamaApp) {
+            if (window.ollamaApp && !window.monitoringState.feedConnected) {
                 try {
                     await window.ollamaApp.loadRealTimeData();
                 } catch (error) {
@@ -1467,8 +1583,11 @@ function toggleAutoRefresh() {
                 }
             }
         }, 10000);
-        console.log('Auto-refresh enabled (10 second interval)');
+        console.log('Auto-refresh enabled (live feed, 10 second polling fallback)');
     } else {
+        if (window.ollamaApp) {
+            window.ollamaApp.disconnectMonitoringFeed();
+        }
         if (window.monitoringState.autoRefreshInterval) {
             clearInterval(window.monitoringState.autoRefreshInterval);
             window.monitoringState.autoRefreshInterval = null;
@@ -3,12 +3,22 @@
 Test script for the Ollama Manager to verify core functionality.
 """
 
+import base64
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ollama_manager import OllamaAPI, format_size, format_datetime, app
+from ollama_manager import (
+    OllamaAPI, OllamaFleet, GenerationRouter, AdmissionController, AdmissionRejected,
+    EmbeddingBatcher, ResponseCache, ResponseCompressor, ModelInfoCache, ModelIndex, PullJobManager,
+    ConversationStore, Conversation, ContextBudget, Metrics, HealthSampler, LogStore, LogTailer,
+    EventBroadcaster, ErrorTracker, QuantileSketch, LatencyMonitor, estimate_tokens, format_size,
+    format_datetime, normalize_model_name, models_etag, etag_matches, app
+)
+import json
 import requests
+import threading
+import time
 from unittest.mock import Mock, patch
 
 def test_ollama_api():
@@ -26,8 +36,715 @@ def test_ollama_api():
     assert custom_api.base_url == "http://example.com:8080"
     print("✓ Custom URL handled correctly")
     
+    # Test pooled session and per-endpoint timeouts
+    pooled_api = OllamaAPI(pool_size=4, timeouts={'/api/tags': 2})
+    adapter = pooled_api.session.get_adapter("http://localhost:11434")
+    assert adapter._pool_maxsize == 4
+    assert pooled_api.timeouts['/api/tags'] == 2
+    assert pooled_api.timeouts['/api/pull'] == 300
+    with patch.object(pooled_api.session, 'request') as mock_request:
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.json.return_value = {'models': []}
+        assert pooled_api.list_models() == []
+        assert mock_request.call_args.kwargs['timeout'] == 2
+    print("✓ Pooled session and timeouts configured correctly")
+    
     print("OllamaAPI tests passed!")
 
+def test_model_list_cache():
+    """Test that the model list is cached, coalesced and invalidated"""
+    print("\nTesting model list cache...")
+    
+    cached_api = OllamaAPI(models_ttl=60)
+    with patch.object(cached_api.session, 'request') as mock_request:
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.json.return_value = {'models': [{'name': 'a'}]}
+        
+        # Concurrent callers share one upstream fetch
+        threads = [threading.Thread(target=cached_api.list_models) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cached_api.server_status()['status'] == 'running'
+        assert mock_request.call_count == 1
+        print("✓ Concurrent lookups coalesced into one fetch")
+        
+        # Deleting a model invalidates the cached list
+        cached_api.delete_model('a')
+        mock_request.return_value.json.return_value = {'models': []}
+        assert cached_api.list_models() == []
+        assert mock_request.call_count == 3
+        print("✓ Cache invalidated after delete")
+    
+    with patch.object(cached_api.session, 'request',
+                      side_effect=requests.exceptions.ConnectionError()):
+        cached_api.invalidate_models()
+        assert cached_api.server_status()['status'] == 'stopped'
+        print("✓ Connection errors reported as stopped")
+    
+    print("Model list cache tests passed!")
+
+def test_model_info_cache():
+    """Test single-flight caching of model info"""
+    print("\nTesting model info cache...")
+    
+    cache = ModelInfoCache(maxsize=2)
+    release = threading.Event()
+    calls = []
+    
+    def slow_fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        return {'modelfile': 'FROM test'}
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get(('m:latest', 'd1', 't'), slow_fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 5
+    print("✓ Concurrent lookups share one fetch")
+    
+    cache.get(('a:latest', 'd', 't'), lambda: {})
+    cache.get(('b:latest', 'd', 't'), lambda: {})
+    assert cache.get(('m:latest', 'd1', 't'), lambda: 'refetched') == 'refetched'
+    print("✓ Least recently used entries evicted")
+    
+    cache.evict('m:latest')
+    assert cache.get(('m:latest', 'd1', 't'), lambda: 'fresh') == 'fresh'
+    assert normalize_model_name('llama2') == 'llama2:latest'
+    assert normalize_model_name('llama2:7b') == 'llama2:7b'
+    print("✓ Model entries evicted by name")
+    
+    print("Model info cache tests passed!")
+
+def test_ollama_fleet():
+    """Test fanning out calls to several Ollama hosts"""
+    print("\nTesting Ollama fleet...")
+    
+    def host(models, delay=0.0, error=None):
+        client = Mock()
+        client.base_url = 'http://host'
+        client.timeouts = {'/api/tags': 0.3}
+        def list_models():
+            time.sleep(delay)
+            if error:
+                raise Exception(error)
+            return models
+        client.list_models.side_effect = list_models
+        def show_model_info(name):
+            if not any(model['name'] == name for model in list_models()):
+                raise Exception('model not found')
+            return {'modelfile': name}
+        client.show_model_info.side_effect = show_model_info
+        return client
+    
+    fleet = OllamaFleet(host([{'name': 'a:latest'}]), primary_name='gpu1')
+    fleet.add_host('gpu2', host([{'name': 'b:latest'}]))
+    fleet.add_host('stuck', host([{'name': 'c:latest'}], delay=2.0))
+    fleet.add_host('broken', host([], error='Connection refused'))
+    
+    started = time.time()
+    models, errors = fleet.list_models()
+    assert time.time() - started < 1.0
+    assert [(m['name'], m['host']) for m in models] == [('a:latest', 'gpu1'), ('b:latest', 'gpu2')]
+    assert errors['broken'] == 'Connection refused'
+    assert 'within 0.3s' in errors['stuck']
+    print("✓ Models merged by host; a slow host does not block the others")
+    
+    statuses = fleet.server_status()
+    assert list(statuses) == ['gpu1', 'gpu2', 'stuck', 'broken']
+    assert fleet.show_model_info('b:latest') == ('gpu2', {'modelfile': 'b:latest'})
+    try:
+        fleet.remove_host('gpu1')
+        assert False, "primary host removed"
+    except ValueError:
+        pass
+    assert fleet.remove_host('stuck') and len(fleet) == 3
+    print("✓ Info found on the right host, primary host is kept")
+    
+    # Many concurrent fan-outs with a hung host must not starve the others
+    fleet = OllamaFleet(host([{'name': 'a:latest'}], delay=0.01), primary_name='fast')
+    hung = host([], delay=1.5)
+    fleet.add_host('hung', hung)
+    outcomes = []
+    def poll():
+        outcomes.append(fleet.list_models())
+    threads = [threading.Thread(target=poll) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(errors.keys() == {'hung'} and [m['name'] for m in models] == ['a:latest']
+               for models, errors in outcomes)
+    assert hung.list_models.call_count <= 4
+    models, errors = fleet.list_models()
+    assert 'earlier call' in errors['hung'] and models
+    print("✓ A hung host gets no more work and never delays the others")
+    
+    slow_show = host([{'name': 'x:latest'}])
+    slow_show.timeouts = {'/api/tags': 0.05, '/api/show': 1.0}
+    slow_show.show_model_info.side_effect = lambda name: time.sleep(0.2) or {'modelfile': name}
+    fleet = OllamaFleet(slow_show, primary_name='only')
+    assert fleet.show_model_info('x:latest') == ('only', {'modelfile': 'x:latest'})
+    print("✓ Deadlines follow the called endpoint's timeout")
+    
+    import tempfile
+    hosts_path = os.path.join(tempfile.mkdtemp(), 'hosts.json')
+    primary = OllamaAPI('http://gpu1:11434')
+    fleet = OllamaFleet(primary, primary_name='gpu1', hosts_path=hosts_path)
+    other_worker = OllamaFleet(primary, primary_name='gpu1', hosts_path=hosts_path)
+    fleet.add_host('gpu2', 'http://gpu2:11434', timeout=5)
+    assert [h['name'] for h in other_worker.hosts()] == ['gpu1', 'gpu2']
+    assert other_worker.client('gpu1') is primary
+    print("✓ Host registry shared between workers")
+    
+    with patch('ollama_manager.fleet', fleet):
+        with app.test_client() as client:
+            assert client.delete('/api/fleet/hosts/gpu1').status_code == 400
+            data = client.post('/api/fleet/hosts', json={'name': 'gpu3', 'base_url': 'http://gpu3:11434'}).get_json()
+            assert [h['name'] for h in data['hosts']] == ['gpu1', 'gpu2', 'gpu3']
+            assert client.delete('/api/fleet/hosts/gpu3').get_json()['success']
+    print("✓ Hosts managed through /api/fleet/hosts")
+    
+    print("Ollama fleet tests passed!")
+
+def test_generation_router():
+    """Test choosing and failing over between Ollama hosts for generation"""
+    print("\nTesting generation router...")
+    
+    def host(installed, loaded):
+        client = Mock()
+        client.base_url = 'http://host'
+        client.timeouts = {'/api/tags': 1}
+        client.list_models.return_value = [{'name': name} for name in installed]
+        client.running_models.return_value = [{'name': name} for name in loaded]
+        return client
+    
+    gpu1 = host(['llama2:latest', 'phi:latest'], ['llama2:latest'])
+    gpu2 = host(['llama2:latest', 'phi:latest'], [])
+    cpu = host(['tiny:latest'], [])
+    fleet = OllamaFleet(gpu1, primary_name='gpu1')
+    fleet.add_host('gpu2', gpu2)
+    fleet.add_host('cpu', cpu)
+    router = GenerationRouter(fleet, strategy='affinity', spill=1)
+    
+    assert router.candidates('llama2') == ['gpu1', 'gpu2']
+    router.acquire('gpu1', 'llama2')
+    router.acquire('gpu1', 'llama2')
+    assert router.candidates('llama2') == ['gpu2', 'gpu1']
+    print("✓ Affinity prefers hosts with the model loaded until they are too busy")
+    
+    router.acquire('gpu2', 'phi')
+    assert router.candidates('phi')[0] == 'gpu2'
+    router.strategy = 'least-loaded'
+    router.release('gpu1', {'eval_count': 100, 'eval_duration': 1e9})
+    router.release('gpu1', {'eval_count': 100, 'eval_duration': 1e9})
+    router.release('gpu2', {'eval_count': 100, 'eval_duration': 2e9})
+    assert router.candidates('phi') == ['gpu1', 'gpu2']
+    assert router.snapshot()['gpu1']['tokens_per_second'] == 100
+    print("✓ Least-loaded orders by in-flight requests, then tokens/second")
+    
+    router.acquire('gpu1', 'phi')
+    router.release('gpu1', failed=True)
+    assert router.candidates('phi') == ['gpu2', 'gpu1']
+    assert router.candidates('tiny') == ['cpu']
+    print("✓ Failed hosts tried last, hosts without the model skipped")
+    
+    reply = Mock(status_code=200)
+    reply.json.return_value = {'response': 'hi', 'done': True, 'eval_count': 10, 'eval_duration': 1e8}
+    gpu1.request.side_effect = requests.exceptions.ConnectionError('refused')
+    gpu2.request.return_value = reply
+    router = GenerationRouter(fleet, strategy='affinity')
+    with patch('ollama_manager.fleet', fleet), patch('ollama_manager.router', router):
+        with app.test_client() as client:
+            with client.post('/api/generate', json={'model': 'llama2', 'prompt': 'Hello'}) as response:
+                assert response.get_json() == {'success': True, 'response': 'hi'}
+            assert gpu1.request.called and gpu2.request.called
+            hosts = client.get('/api/fleet/routing').get_json()['hosts']
+            assert hosts['gpu1']['cooling_down'] and hosts['gpu2']['in_flight'] == 0
+    print("✓ Generation fails over to the next host")
+    
+    print("Generation router tests passed!")
+
+def test_pull_jobs():
+    """Test background pull jobs, progress and cancellation"""
+    print("\nTesting pull jobs...")
+    
+    release = threading.Event()
+    
+    def fake_pull(model_name):
+        yield {'status': 'pulling manifest'}
+        yield {'status': 'pulling abc', 'digest': 'sha256:abc', 'total': 100, 'completed': 40}
+        release.wait(timeout=5)
+        yield {'status': 'pulling abc', 'digest': 'sha256:abc', 'total': 100, 'completed': 100}
+        yield {'status': 'success'}
+    
+    client = Mock()
+    client.pull_model_stream.side_effect = fake_pull
+    manager = PullJobManager(client, max_workers=1)
+    
+    job = manager.submit('llama2')
+    assert manager.submit('llama2:latest') is job
+    print("✓ Concurrent pulls of the same model de-duplicated")
+    
+    while job.to_dict()['completed'] != 40:
+        manager.wait_for_update(job.id, job.version, timeout=1)
+    release.set()
+    while not job.done:
+        manager.wait_for_update(job.id, job.version, timeout=1)
+    data = job.to_dict()
+    assert data['status'] == 'completed'
+    assert data['percent'] == 100.0
+    assert manager.active_count() == 0
+    print("✓ Streamed progress tracked to completion")
+    
+    release.clear()
+    job = manager.submit('mistral')
+    while job.status != 'running':
+        manager.wait_for_update(job.id, job.version, timeout=1)
+    assert manager.cancel(job.id)
+    release.set()
+    while not job.done:
+        manager.wait_for_update(job.id, job.version, timeout=1)
+    assert job.status == 'cancelled'
+    assert not manager.cancel(job.id)
+    print("✓ Running pulls can be cancelled")
+    
+    with app.test_client() as client:
+        response = client.get(f'/api/download/{job.id}')
+        assert response.status_code == 404
+        print("✓ Unknown job ids return 404")
+    
+    print("Pull job tests passed!")
+
+def test_shared_worker_state():
+    """Test that pull jobs and cache invalidation are shared across workers"""
+    print("\nTesting shared worker state...")
+    
+    import tempfile
+    state_dir = tempfile.mkdtemp()
+    release = threading.Event()
+    
+    def fake_pull(model_name):
+        yield {'status': 'pulling manifest'}
+        while not release.wait(timeout=0.01):
+            yield {'status': 'pulling abc', 'digest': 'sha256:abc', 'total': 10, 'completed': 1}
+    
+    client = Mock()
+    client.pull_model_stream.side_effect = fake_pull
+    owner = PullJobManager(client, state_dir=state_dir)
+    other = PullJobManager(Mock(), state_dir=state_dir)
+    
+    job = owner.submit('llama2')
+    assert other.submit('llama2').id == job.id
+    assert other.get(job.id).model_name == 'llama2'
+    assert [data['job_id'] for data in other.list_jobs()] == [job.id]
+    print("✓ Jobs visible and de-duplicated across workers")
+    
+    assert other.cancel(job.id)
+    while not job.done:
+        owner.wait_for_update(job.id, job.version, timeout=1)
+    release.set()
+    assert job.status == 'cancelled'
+    assert other.wait_for_update(job.id, -1).status == 'cancelled'
+    print("✓ Jobs cancellable from another worker")
+    
+    first, second = OllamaAPI(models_ttl=60), OllamaAPI(models_ttl=60)
+    for worker in (first, second):
+        worker.invalidation_path = os.path.join(state_dir, 'models.stamp')
+    with patch.object(second.session, 'request') as mock_request:
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.json.return_value = {'models': []}
+        second.list_models()
+        second.list_models()
+        assert mock_request.call_count == 1
+        time.sleep(0.01)
+        first.invalidate_models()
+        second.list_models()
+        assert mock_request.call_count == 2
+    print("✓ Model cache invalidated across workers")
+    
+    print("Shared worker state tests passed!")
+
+def test_conversation_store():
+    """Test server-side conversations and incremental prompts"""
+    print("\nTesting conversation store...")
+    
+    import tempfile
+    persist_dir = tempfile.mkdtemp()
+    
+    with app.test_client() as client:
+        with patch('ollama_manager.api.request') as mock_request:
+            mock_request.return_value.json.return_value = {
+                'response': 'Hello!', 'done': True, 'context': [1, 2, 3]
+            }
+            response = client.post('/api/generate', json={
+                'model': 'test-model', 'prompt': 'Hi', 'conversation_id': 'chat-1',
+                'history': [{'role': 'system', 'content': 'Be brief'}]
+            })
+            assert response.get_json()['conversation_id'] == 'chat-1'
+            assert 'System: Be brief' in mock_request.call_args.kwargs['json']['prompt']
+            response.close()
+            
+            client.post('/api/generate', json={
+                'model': 'test-model', 'prompt': 'Again', 'conversation_id': 'chat-1'
+            }).close()
+            payload = mock_request.call_args.kwargs['json']
+            assert payload['prompt'] == 'User: Again\nAssistant: '
+            assert payload['context'] == [1, 2, 3]
+            print("✓ Follow-up turns send only the new prompt and context")
+        
+        data = client.get('/api/conversations/chat-1').get_json()
+        assert [m['role'] for m in data['conversation']['messages']] == [
+            'system', 'user', 'assistant', 'user', 'assistant'
+        ]
+        assert client.delete('/api/conversations/chat-1').status_code == 200
+        assert client.get('/api/conversations/chat-1').status_code == 404
+        print("✓ Conversations can be read and deleted")
+    
+    store = ConversationStore(max_conversations=1, persist_dir=persist_dir)
+    first = store.get_or_create('a')
+    store.record_turn(first, 'm', 'question', 'answer', [7])
+    store.get_or_create('b')
+    assert len(store) == 1
+    reloaded = store.get('a')
+    assert reloaded is not first
+    assert reloaded.context == [7]
+    assert reloaded.next_prompt('m', 'next') == ('User: next\nAssistant: ', [7])
+    assert 'User: question' in reloaded.next_prompt('other-model', 'next')[0]
+    print("✓ Evicted conversations reloaded from disk")
+    
+    other_worker = ConversationStore(persist_dir=persist_dir)
+    assert other_worker.get('a').context == [7]
+    store.record_turn(reloaded, 'm', 'more', 'text', [8])
+    assert other_worker.get('a').context == [8]
+    print("✓ Turns recorded by another worker are picked up")
+    
+    print("Conversation store tests passed!")
+
+def test_context_budget():
+    """Test history windowing within a token budget"""
+    print("\nTesting context budget...")
+    
+    history = [{'role': 'system', 'content': 'Be brief'}]
+    for i in range(20):
+        history.append({'role': 'user', 'content': f'question {i} ' * 20})
+        history.append({'role': 'assistant', 'content': f'answer {i} ' * 20})
+    
+    budget = ContextBudget(max_tokens=200)
+    window = budget.window('m', history, 'next')
+    assert window[0] == history[0]
+    assert window[-1] == history[-1]
+    assert len(window) < len(history)
+    assert budget.history_tokens(window) + estimate_tokens('next') <= 200
+    assert budget.window('m', history[:3], 'next') == history[:3]
+    print("✓ Recent turns kept within budget with system message pinned")
+    
+    calls = []
+    
+    def summarizer(model, previous, messages):
+        calls.append(len(messages))
+        return f'{previous or ""}+{len(messages)}'
+    
+    budget = ContextBudget(max_tokens=400, summarizer=summarizer, summary_tokens=20, summary_block=4)
+    window = budget.window('m', history, 'next')
+    assert window[1]['role'] == 'system'
+    assert window[1]['content'].startswith('Summary of the earlier conversation')
+    first_calls = len(calls)
+    assert first_calls >= 1 and all(n <= 4 for n in calls)
+    
+    # One more turn reuses the cached block summaries
+    longer = history + [{'role': 'user', 'content': 'x'}, {'role': 'assistant', 'content': 'y'}]
+    budget.window('m', longer, 'next')
+    assert len(calls) - first_calls <= 1
+    print("✓ Evicted turns summarised incrementally")
+    
+    conversation = Conversation('c')
+    conversation.messages = history
+    conversation.model = 'm'
+    conversation.context = list(range(150))
+    small = ContextBudget(max_tokens=200)
+    assert conversation.next_prompt('m', 'hi', small)[1] == conversation.context
+    conversation.context = list(range(500))
+    prompt, context = conversation.next_prompt('m', 'hi', small)
+    assert context is None and 'Be brief' in prompt
+    print("✓ Conversations rebuild a windowed prompt when context outgrows the budget")
+    
+    print("Context budget tests passed!")
+
+def test_health_sampler():
+    """Test that server endpoints read from the background sampler"""
+    print("\nTesting health sampler...")
+    
+    client = Mock()
+    client.timeouts = {'/api/tags': 1}
+    client.refresh_status.return_value = {
+        'status': 'running', 'models': [{'name': 'a'}], 'response_time': 0.01,
+        'checked_at': '2024-01-15T10:30:00'
+    }
+    sampler = HealthSampler(client, interval=60, history=3)
+    
+    with patch('ollama_manager.health', sampler):
+        with app.test_client() as test_client:
+            for path in ('/api/server/status', '/api/server/logs', '/api/server/errors') * 5:
+                assert test_client.get(path).get_json()['success']
+            assert client.refresh_status.call_count == 1
+            print("✓ Polling endpoints share one background probe")
+            
+            data = test_client.get('/api/server/status').get_json()
+            assert data['status'] == 'running' and data['models_count'] == 1
+            samples = test_client.get('/api/server/health').get_json()['samples']
+            assert len(samples) == 1 and 'models' not in samples[0]
+    sampler.stop()
+    
+    for _ in range(5):
+        sampler.sample_now()
+    assert len(sampler.recent()) == 3
+    print("✓ Samples kept in a bounded ring buffer")
+    
+    print("Health sampler tests passed!")
+
+def test_log_tailing():
+    """Test tailing the Ollama log with cursors and level filters"""
+    print("\nTesting log tailing...")
+    
+    import tempfile
+    log_dir = tempfile.mkdtemp()
+    log_path = os.path.join(log_dir, 'server.log')
+    with open(log_path, 'w') as f:
+        f.write('time=2024-06-01T10:00:00Z level=INFO source=routes.go:1 msg="Listening on 127.0.0.1:11434"\n')
+        f.write('[GIN] 2024/06/01 - 10:00:01 | 500 |   12.3ms |       127.0.0.1 | POST     "/api/generate"\n')
+    
+    store = LogStore(max_entries=4)
+    tailer = LogTailer(store, log_path, poll_interval=60)
+    assert tailer.poll() == 2
+    with patch('ollama_manager.server_logs', store), patch('ollama_manager.log_tailer', tailer):
+        with app.test_client() as client:
+            data = client.get('/api/server/logs').get_json()
+            assert [log['level'] for log in data['logs']] == ['INFO', 'ERROR']
+            assert data['logs'][0]['message'] == 'Listening on 127.0.0.1:11434'
+            cursor = data['cursor']
+            
+            with open(log_path, 'a') as f:
+                f.write('time=2024-06-01T10:00:02Z level=WARN msg="low vram"\n')
+                f.write('time=2024-06-01T10:00:03Z level=INFO msg="partial')
+            assert tailer.poll() == 1
+            data = client.get(f'/api/server/logs?after={cursor}').get_json()
+            assert [log['message'] for log in data['logs']] == ['low vram']
+            assert not data['reset']
+            print("✓ Only lines after the cursor are returned")
+            
+            data = client.get('/api/server/logs?level=error,warning').get_json()
+            assert [log['level'] for log in data['logs']] == ['ERROR', 'WARNING']
+            data = client.get('/api/server/logs?after=other-3').get_json()
+            assert data['reset'] and len(data['logs']) == 3
+            print("✓ Level filters and foreign cursors handled")
+    
+    with open(log_path, 'w') as f:
+        f.write('time=2024-06-01T11:00:00Z level=INFO msg="restarted"\n')
+    assert tailer.poll() == 1
+    assert store.after(None)['logs'][-1]['message'] == 'restarted'
+    assert len(store.after(None)['logs']) == 4
+    tailer.stop()
+    print("✓ Truncated logs followed from the start, store stays bounded")
+    
+    print("Log tailing tests passed!")
+
+def test_monitoring_events():
+    """Test the pushed monitoring feed and its backpressure"""
+    print("\nTesting monitoring events...")
+    
+    events = EventBroadcaster(max_queue=3, max_subscribers=1)
+    fast = events.subscribe()
+    assert events.subscribe() is None
+    for i in range(3):
+        events.publish('logs', {'n': i})
+    assert [data['n'] for _, data in events.next_events(fast)] == [0, 1, 2]
+    for i in range(5):
+        events.publish('logs', {'n': i})
+    pending = events.next_events(fast)
+    assert [event for event, _ in pending] == ['resync', 'logs']
+    assert events.next_events(fast, timeout=0.01) == []
+    events.unsubscribe(fast)
+    assert events.subscriber_count() == 0
+    print("✓ Slow subscribers get a resync instead of an unbounded backlog")
+    
+    import ollama_manager
+    events = EventBroadcaster()
+    subscriber = events.subscribe()
+    running = {'status': 'running', 'models': [], 'response_time': 0.1}
+    with patch('ollama_manager.monitoring_events', events), patch('ollama_manager.error_tracker', ErrorTracker()):
+        ollama_manager.on_health_sample(running, None)
+        ollama_manager.on_health_sample(dict(running, response_time=0.3), running)
+        assert [event for event, _ in events.next_events(subscriber)] == ['status']
+        stopped = {'status': 'stopped', 'error': 'Connection refused'}
+        ollama_manager.on_health_sample(stopped, running)
+        pending = dict(events.next_events(subscriber))
+        assert pending['status']['status'] == 'stopped'
+        assert pending['errors'][0]['title'] == 'Server Not Running'
+        print("✓ Only status changes are broadcast")
+        
+        store = LogStore()
+        store.listeners.append(ollama_manager.on_log_records)
+        store.extend([{'message': 'a'}, {'message': 'b'}])
+        (event, data), = events.next_events(subscriber)
+        assert [log['message'] for log in data['logs']] == ['a', 'b']
+        assert data['cursor'] == store.cursor()
+        print("✓ New log lines are pushed as one batch with a cursor")
+        
+        store.extend([{'message': 'CUDA out of memory', 'level': 'ERROR'}])
+        pending = events.next_events(subscriber)
+        assert [event for event, _ in pending] == ['logs', 'errors']
+        assert [error['title'] for error in pending[1][1]] == ['Ollama Log Error']
+        ollama_manager.on_health_sample(stopped, stopped)
+        (event, data), = events.next_events(subscriber)
+        assert event == 'errors'
+        assert [(error['title'], error['count']) for error in data] == [('Server Not Running', 2)]
+        print("✓ Error events carry only the entries that changed")
+        events.unsubscribe(subscriber)
+        
+        health = Mock()
+        health.latest.return_value = running
+        with patch('ollama_manager.health', health), patch('ollama_manager.log_tailer', Mock()):
+            with app.test_client() as client:
+                response = client.get('/api/server/events')
+                assert response.mimetype == 'text/event-stream'
+                first = next(response.response)
+                first = first.decode() if isinstance(first, bytes) else first
+                assert first.startswith('event: status\n')
+                assert events.subscriber_count() == 1
+                response.close()
+        assert events.subscriber_count() == 0
+        print("✓ Event stream opens with a status snapshot and unsubscribes on close")
+        
+        with patch('ollama_manager.health', health), patch('ollama_manager.log_tailer', Mock()):
+            with app.test_client() as client:
+                for _ in range(3):
+                    client.head('/api/server/events').close()
+                client.get('/api/server/events').close()
+        assert events.subscriber_count() == 0
+        print("✓ HEAD requests and unread streams do not leak subscribers")
+    
+    print("Monitoring event tests passed!")
+
+def test_error_tracker():
+    """Test error fingerprinting, counting and rolling windows"""
+    print("\nTesting error tracker...")
+    
+    tracker = ErrorTracker(max_fingerprints=2)
+    timeout = {'level': 'error', 'title': 'Server Timeout', 'error': 'Request timed out after 10.0s'}
+    now = 1_000_000.0
+    assert tracker.record(timeout, now=now)
+    for i in range(99):
+        assert not tracker.record(dict(timeout, error=f'Request timed out after {i}.5s'), now=now + i)
+    errors = tracker.summary(now=now + 99)
+    assert len(errors) == 1
+    assert errors[0]['count'] == 100
+    assert errors[0]['error'] == 'Request timed out after 98.5s'
+    assert errors[0]['windows']['1h'] == 100
+    assert errors[0]['windows']['1m'] < errors[0]['windows']['5m'] == 100
+    print("✓ Repeated errors collapse into one counted entry")
+    
+    errors = tracker.summary(now=now + 3800)
+    assert errors[0]['windows'] == {'1m': 0, '5m': 0, '1h': 0}
+    assert errors[0]['count'] == 100
+    assert tracker.summary('1h', now=now + 3800) == []
+    print("✓ Rolling windows expire old occurrences")
+    
+    tracker.record({'title': 'Server Error', 'error': 'HTTP 500'}, now=now)
+    tracker.record({'title': 'Server Not Running', 'error': 'refused'}, now=now)
+    assert [e['title'] for e in tracker.summary(now=now)] == ['Server Not Running', 'Server Error']
+    print("✓ Fingerprint count is bounded")
+    
+    tracker = ErrorTracker()
+    with patch('ollama_manager.error_tracker', tracker):
+        health = Mock()
+        health.latest.return_value = {'status': 'stopped', 'error': 'Connection refused'}
+        with patch('ollama_manager.health', health), patch('ollama_manager.log_tailer', Mock()):
+            tracker.record({'level': 'critical', 'title': 'Server Not Running', 'error': 'Ollama server is not responding'})
+            tracker.record({'level': 'critical', 'title': 'Server Not Running', 'error': 'Ollama server is not responding'})
+            with app.test_client() as client:
+                data = client.get('/api/server/errors?window=5m').get_json()
+                assert data['success'] and data['errors'][0]['count'] == 2
+                assert client.get('/api/server/errors?window=2d').status_code == 400
+    print("✓ /api/server/errors serves aggregated errors")
+    
+    print("Error tracker tests passed!")
+
+def test_latency_baselines():
+    """Test streaming quantiles and adaptive slow-response thresholds"""
+    print("\nTesting latency baselines...")
+    
+    import random
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1) for _ in range(5000)]
+    sketch = QuantileSketch(accuracy=0.02, decay_every=10 ** 9)
+    small = QuantileSketch(accuracy=0.02, max_buckets=32, decay_every=10 ** 9)
+    for value in values:
+        sketch.add(value)
+        small.add(value)
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(sketch.quantile(q) - exact) / exact < 0.05
+    assert len(small._buckets) == 32
+    assert abs(small.quantile(0.99) - values[4949]) / values[4949] < 0.05
+    print("✓ Quantiles accurate in bounded memory")
+    
+    monitor = LatencyMonitor(min_samples=20)
+    for _ in range(50):
+        monitor.observe('model', 'big:70b', rng.uniform(8, 10))
+        monitor.observe('model', 'tiny:1b', rng.uniform(0.1, 0.2))
+    assert monitor.threshold('model', 'big:70b') > 20
+    assert monitor.threshold('model', 'tiny:1b') < 1
+    assert monitor.threshold('model', 'unknown') is None
+    print("✓ Thresholds follow each model's own baseline")
+    
+    assert not monitor.regressed('model', 'tiny:1b')
+    for _ in range(20):
+        monitor.observe('model', 'tiny:1b', 0.6)
+    assert monitor.regressed('model', 'tiny:1b')
+    print("✓ Sustained slowdowns detected from the EWMA")
+    
+    import ollama_manager
+    monitor = LatencyMonitor(min_samples=20)
+    with patch('ollama_manager.latency', monitor):
+        slow = {'status': 'running', 'models': [], 'response_time': 3.0}
+        assert ollama_manager.build_server_errors(slow, 'http://x')[0]['title'] == 'Slow Response Time'
+        for _ in range(30):
+            monitor.observe('endpoint', '/api/tags', 2.5)
+        assert ollama_manager.build_server_errors(slow, 'http://x') == []
+        assert ollama_manager.build_server_errors(dict(slow, response_time=9.0), 'http://x')
+        print("✓ Slow responses judged against the learned baseline")
+        
+        tracker = ErrorTracker()
+        with patch('ollama_manager.error_tracker', tracker):
+            for _ in range(30):
+                ollama_manager.record_first_token('tiny:1b', 0.1)
+            assert tracker.summary() == []
+            ollama_manager.record_first_token('tiny:1b', 1.0)
+            assert tracker.summary()[0]['title'] == 'Slow Response from tiny:1b'
+            # Whole non-streamed replies have their own baseline
+            for _ in range(30):
+                ollama_manager.record_generation_time('tiny:1b', 5.0)
+            assert len(tracker.summary()) == 1
+        with app.test_client() as client:
+            data = client.get('/api/server/latency').get_json()
+            assert data['latency']['model']['tiny:1b']['samples'] == 31
+            assert data['latency']['generation']['tiny:1b']['samples'] == 30
+    print("✓ Slow first tokens reported per model")
+    
+    print("Latency baseline tests passed!")
+
 def test_utility_functions():
     """Test utility functions"""
     print("\nTesting utility functions...")
@@ -129,15 +846,704 @@ def test_api_endpoints():
     
     print("API endpoints tests passed!")
 
+def test_conditional_requests():
+    """Test ETag / If-None-Match handling on the model list and info endpoints"""
+    print("\nTesting conditional requests...")
+    
+    models = [
+        {'name': 'a:latest', 'digest': 'sha256:aaa', 'modified_at': '2024-01-15T10:30:00Z', 'size': 1},
+        {'name': 'b:latest', 'digest': 'sha256:bbb', 'modified_at': '2024-01-16T10:30:00Z', 'size': 2}
+    ]
+    tag = models_etag(models)
+    assert tag.startswith('W/"')
+    assert models_etag([dict(models[0]), dict(models[1])]) == tag
+    assert models_etag([models[0], dict(models[1], digest='sha256:ccc')]) != tag
+    assert models_etag(models, {'gpu': 'timeout'}) != tag
+    assert etag_matches(tag, tag)
+    assert etag_matches(tag[2:], tag)
+    assert etag_matches(f'"other", {tag}', tag)
+    assert etag_matches('*', tag)
+    assert not etag_matches(None, tag)
+    assert not etag_matches('"other"', tag)
+    print("✓ ETags follow model digests and compare weakly")
+    
+    with app.test_client() as client:
+        with patch('ollama_manager.api') as mock_api:
+            mock_api.list_models.return_value = models
+            mock_api.show_model_info.return_value = {'modelfile': 'FROM a'}
+            
+            response = client.get('/api/models')
+            assert response.status_code == 200
+            assert response.headers['Cache-Control'] == 'no-cache'
+            etag = response.headers['ETag']
+            
+            response = client.get('/api/models', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.get_data() == b''
+            assert response.headers['ETag'] == etag
+            print("✓ Unchanged model lists answer 304 with no body")
+            
+            mock_api.list_models.return_value = [models[0], dict(models[1], digest='sha256:ccc')]
+            response = client.get('/api/models', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.headers['ETag'] != etag
+            assert len(response.get_json()['models']) == 2
+            print("✓ A changed digest sends the full list again")
+            
+            response = client.get('/api/info/a')
+            assert response.status_code == 200
+            info_tag = response.headers['ETag']
+            assert mock_api.show_model_info.call_count == 1
+            response = client.get('/api/info/a', headers={'If-None-Match': info_tag})
+            assert response.status_code == 304
+            assert mock_api.show_model_info.call_count == 1
+            print("✓ Model info revalidates without calling /api/show")
+            
+            response = client.get('/api/info/missing')
+            assert response.status_code == 200
+            assert 'ETag' not in response.headers
+            
+            mock_api.list_models.side_effect = Exception('Connection refused')
+            response = client.get('/api/models', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.get_json()['success'] == False
+            assert 'ETag' not in response.headers
+            print("✓ Errors are never tagged")
+    
+    print("Conditional request tests passed!")
+
+def test_model_index():
+    """Test sorted, filtered, cursor-paged model listings"""
+    print("\nTesting model index...")
+    
+    families = ['llama', 'qwen', 'llama', 'gemma', 'qwen']
+    models = [
+        {
+            'name': f'model-{i}:latest',
+            'digest': f'sha256:{i}',
+            'size': (i * 7) % 5 * 1000,
+            'modified_at': f'2024-01-{10 + i}T10:00:00Z',
+            'details': {'family': families[i]},
+            'host': 'local'
+        }
+        for i in range(5)
+    ]
+    index = ModelIndex()
+    index.update(models, models_etag(models))
+    assert len(index) == 5
+    
+    def walk(**kwargs):
+        names, cursor = [], None
+        while True:
+            page = index.page(limit=2, cursor=cursor, **kwargs)
+            assert len(page['models']) <= 2
+            names.extend(record.name for record in page['models'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return names, page['total']
+    
+    names, total = walk()
+    assert names == [f'model-{i}:latest' for i in range(5)] and total == 5
+    names, _ = walk(sort='size', order='desc')
+    sizes = [next(m['size'] for m in models if m['name'] == name) for name in names]
+    assert sizes == sorted(sizes, reverse=True) and len(names) == 5
+    names, _ = walk(sort='modified_at', order='desc')
+    assert names[0] == 'model-4:latest'
+    print("✓ Cursors page through every sort order without gaps or repeats")
+    
+    names, total = walk(family='QWEN')
+    assert names == ['model-1:latest', 'model-4:latest'] and total == 2
+    names, total = walk(query='-3')
+    assert names == ['model-3:latest'] and total == 1
+    print("✓ Family and substring filters apply before paging")
+    
+    # Keyset cursors survive models being added between pages
+    page = index.page(limit=2)
+    added = models + [dict(models[0], name='model-0a:latest', digest='sha256:new')]
+    index.update(added, models_etag(added))
+    rest = index.page(limit=10, cursor=page['next_cursor'])
+    assert rest['models'][0].name == 'model-2:latest'
+    records = index._records
+    index.update(added, models_etag(added))
+    assert index._records is records
+    print("✓ Index is rebuilt only when the listing changes")
+    
+    changed = [dict(models[0], digest='sha256:changed')] + models[1:]
+    index.update(changed, models_etag(changed))
+    assert index._records[0] is not records[0]
+    assert all(index._records[i] is records[i] for i in range(1, 5))
+    assert index._records[1].json == json.dumps(index._records[1].to_dict(), separators=(',', ':')).encode()
+    assert json.loads(index.listing())[0]['name'] == 'model-0:latest'
+    assert not hasattr(index._records[0], '__dict__')
+    print("✓ Unchanged models keep their formatted record and JSON bytes")
+    
+    for bad in ({'sort': 'colour'}, {'order': 'sideways'}, {'cursor': '!!!'},
+                {'sort': 'size', 'cursor': page['next_cursor']}):
+        try:
+            index.page(**bad)
+            assert False, bad
+        except ValueError:
+            pass
+    print("✓ Invalid sorts and cursors are rejected")
+    
+    with app.test_client() as client:
+        with patch('ollama_manager.api') as mock_api:
+            mock_api.list_models.return_value = [dict(m) for m in models]
+            
+            response = client.get('/api/models?sort=size&order=asc&limit=3')
+            assert response.status_code == 200
+            data = response.get_json()
+            assert len(data['models']) == 3 and data['total'] == 5
+            assert data['models'][0]['raw_size'] <= data['models'][1]['raw_size']
+            etag = response.headers['ETag']
+            
+            response = client.get(f"/api/models?sort=size&order=asc&limit=3&cursor={data['next_cursor']}")
+            data = response.get_json()
+            assert len(data['models']) == 2 and data['next_cursor'] is None
+            assert response.headers['ETag'] != etag
+            
+            response = client.get('/api/models?sort=size&order=asc&limit=3', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            
+            assert client.get('/api/models?sort=colour').status_code == 400
+            assert client.get('/api/models?limit=lots').status_code == 400
+            for sort, key in (('name', 5), ('name', [5]), ('name', ['a', 'b', 'c']),
+                              ('name', [None, 'a']), ('size', ['big', 'a', 'b']),
+                              ('size', [True, 'a', 'b']), ('family', {'a': 1})):
+                cursor = base64.urlsafe_b64encode(json.dumps([sort, 'asc', key]).encode()).decode()
+                response = client.get(f'/api/models?sort={sort}&cursor={cursor}')
+                assert response.status_code == 400, key
+            response = client.get('/api/models')
+            assert 'next_cursor' not in response.get_json()
+            assert response.mimetype == 'application/json'
+            from ollama_manager import model_index
+            assert model_index._records[0].json in response.get_data()
+            print("✓ /api/models pages when listing parameters are given")
+            
+            from ollama_manager import create_templates
+            create_templates()
+            with patch('ollama_manager.INDEX_PAGE_SIZE', 2):
+                response = client.get('/?sort=name&q=model')
+            html = response.get_data(as_text=True)
+            assert response.status_code == 200
+            assert html.count('type="radio"') == 2
+            assert 'Next page' in html and 'cursor=' in html
+            assert '5 models' in html
+            print("✓ Index page renders one page with sort links and a next-page link")
+    
+    print("Model index tests passed!")
+
+def test_generate_streaming():
+    """Test that streamed generations are relayed chunk by chunk"""
+    print("\nTesting streamed generation...")
+    
+    chunks = [
+        b'{"response": "Hel", "done": false}',
+        b'{"response": "lo", "done": false}',
+        b'{"response": "", "done": true}'
+    ]
+    upstream = Mock()
+    upstream.iter_lines.return_value = iter(chunks)
+    
+    with app.test_client() as client:
+        with patch('ollama_manager.api.request', return_value=upstream) as mock_request:
+            response = client.post('/api/generate', json={
+                'model': 'test-model',
+                'prompt': 'Hi',
+                'stream': True
+            })
+            assert response.status_code == 200
+            assert response.mimetype == 'application/x-ndjson'
+            lines = response.get_data().splitlines()
+            assert lines == chunks
+            response.close()
+            assert mock_request.call_args.kwargs['stream'] is True
+            upstream.close.assert_called_once()
+            print("✓ /api/generate relays NDJSON chunks")
+    
+    print("Streamed generation tests passed!")
+
+def test_admission_control():
+    """Test generation slots, per-model caps, priorities and rejection"""
+    print("\nTesting admission control...")
+    
+    def admit_later(controller, model, priority, results):
+        def run():
+            try:
+                results.append((model, priority, controller.admit(model, priority)))
+            except AdmissionRejected as e:
+                results.append((model, priority, e))
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.05)
+        return thread
+    
+    controller = AdmissionController(max_concurrent=2, max_per_model=1, max_queue=4, max_wait=5)
+    first = controller.admit('llama2')
+    results = []
+    waiting = [admit_later(controller, 'llama2', 'low', results)]
+    other = controller.admit('phi')
+    assert controller.snapshot()['per_model'] == {'llama2:latest': 1, 'phi:latest': 1}
+    print("✓ A model at its cap does not hold up other models")
+    
+    waiting.append(admit_later(controller, 'mistral', 'low', results))
+    waiting.append(admit_later(controller, 'gemma', 'high', results))
+    try:
+        controller.admit('qwen', 'low')
+        assert False, "low priority request should be rejected"
+    except AdmissionRejected as e:
+        assert e.status == 429 and e.retry_after >= 1
+    other.release()
+    other.release()
+    time.sleep(0.05)
+    assert [(model, priority) for model, priority, _ in results] == [('gemma', 'high')]
+    print("✓ Higher priority served first; lower classes rejected early when the queue fills")
+    
+    results[0][2].release()
+    first.release()
+    for thread in waiting:
+        thread.join(timeout=2)
+    assert sorted(model for model, _, _ in results) == ['gemma', 'llama2', 'mistral']
+    for _, _, ticket in results[1:]:
+        ticket.release()
+    assert controller.snapshot()['active'] == 0
+    
+    controller = AdmissionController(max_concurrent=1, max_wait=0.1)
+    ticket = controller.admit('llama2')
+    try:
+        controller.admit('phi')
+        assert False, "request should time out in the queue"
+    except AdmissionRejected as e:
+        assert e.status == 503
+    assert controller.queued() == 0
+    print("✓ Requests that wait too long get a 503")
+    
+    reply = Mock(status_code=200)
+    reply.json.return_value = {'response': 'hi', 'done': True}
+    with patch('ollama_manager.admission', controller), patch('ollama_manager.api.request', return_value=reply):
+        with app.test_client() as client:
+            response = client.post('/api/generate', json={'model': 'llama2', 'prompt': 'Hi'})
+            assert response.status_code == 503 and int(response.headers['Retry-After']) >= 1
+            ticket.release()
+            response = client.post('/api/generate', json={'model': 'llama2', 'prompt': 'Hi', 'priority': 'high'})
+            assert response.get_json()['success']
+            response.close()
+            assert client.get('/api/server/admission').get_json()['admission']['active'] == 0
+            assert client.post('/api/generate', json={'model': 'a', 'prompt': 'b', 'priority': 'urgent'}).status_code == 400
+    print("✓ /api/generate answers with Retry-After and frees its slot")
+    
+    upstream = Mock()
+    upstream.iter_lines.return_value = iter([b'{"response": "hi", "done": false}',
+                                             b'{"response": "", "done": true}'])
+    with patch('ollama_manager.admission', controller), patch('ollama_manager.api.request', return_value=upstream):
+        with app.test_client() as client:
+            response = client.post('/api/generate', json={'model': 'llama2', 'prompt': 'Hi', 'stream': True})
+            assert controller.snapshot()['active'] == 1
+            assert next(response.response)
+            assert controller.snapshot()['active'] == 1
+            response.close()
+            assert client.get('/api/server/admission').get_json()['admission']['active'] == 0
+            
+            upstream.iter_lines.return_value = iter([b'{"response": "", "done": true}'])
+            client.post('/api/generate', json={'model': 'llama2', 'prompt': 'Hi', 'stream': True}).close()
+            assert controller.snapshot()['active'] == 0
+    print("✓ Streamed generations hold their slot until the response is closed")
+    
+    print("Admission control tests passed!")
+
+def test_embedding_batches():
+    """Test micro-batching of concurrent embedding requests"""
+    print("\nTesting embedding batches...")
+    
+    client = Mock()
+    client.embed.side_effect = lambda model, texts: [[float(len(text))] for text in texts]
+    batcher = EmbeddingBatcher(client, window=0.1, max_batch=4)
+    
+    results = {}
+    def embed(name, texts):
+        results[name] = batcher.embed('nomic', texts)
+    threads = [
+        threading.Thread(target=embed, args=('a', ['x', 'yy'])),
+        threading.Thread(target=embed, args=('b', ['yy', 'zzz']))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.embed.call_count == 1
+    assert client.embed.call_args.args == ('nomic', ['x', 'yy', 'zzz'])
+    assert results == {'a': [[1.0], [2.0]], 'b': [[2.0], [3.0]]}
+    print("✓ Concurrent requests share one deduplicated upstream call")
+    
+    client.embed.reset_mock()
+    texts = [str(i) * (i + 1) for i in range(10)]
+    assert batcher.embed('nomic', texts) == [[float(len(text))] for text in texts]
+    assert [len(call.args[1]) for call in client.embed.call_args_list] == [4, 4, 2]
+    print("✓ Large inputs split into batches of at most max_batch")
+    
+    client.embed.side_effect = lambda model, texts: [[1.0]]
+    outcome = {}
+    def short_reply():
+        try:
+            batcher.embed('short', ['x', 'yy', 'zzz'])
+        except Exception as e:
+            outcome['error'] = str(e)
+    thread = threading.Thread(target=short_reply)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert '1 embeddings for 3 inputs' in outcome['error']
+    print("✓ A short upstream reply fails every caller instead of hanging")
+    
+    client.embed.side_effect = Exception('Failed to embed: model not found')
+    try:
+        batcher.embed('missing', ['x'])
+        assert False, "upstream error should propagate"
+    except Exception as e:
+        assert 'model not found' in str(e)
+    
+    client.embed.side_effect = lambda model, texts: [[0.5] for _ in texts]
+    with patch('ollama_manager.embeddings', batcher):
+        with app.test_client() as test_client:
+            data = test_client.post('/api/embed', json={'model': 'nomic', 'input': 'hello'}).get_json()
+            assert data['embeddings'] == [[0.5]]
+            assert test_client.post('/api/embed', json={'model': 'nomic', 'input': [1]}).status_code == 400
+    print("✓ /api/embed accepts a string or a list")
+    
+    import tempfile
+    from cli import OllamaWrapperCLI
+    corpus = os.path.join(tempfile.mkdtemp(), 'corpus.jsonl')
+    with open(corpus, 'w') as f:
+        for i in range(25):
+            f.write(json.dumps({'id': f'doc-{i}', 'text': f'chunk {i % 10}'}) + '\n')
+    def post(url, json=None, timeout=None):
+        response = Mock()
+        response.json.return_value = {'embeddings': [[float(text.split()[1])] for text in json['input']]}
+        return response
+    with patch('requests.Session.post', side_effect=post) as mock_post:
+        result = OllamaWrapperCLI().embed_file(corpus, 'nomic', corpus + '.out', workers=3, batch_size=10)
+    assert result['texts'] == 25 and mock_post.call_count == 3
+    with open(corpus + '.out') as f:
+        records = [json.loads(line) for line in f]
+    assert [r['id'] for r in records] == [f'doc-{i}' for i in range(25)]
+    assert records[13]['embedding'] == [3.0]
+    print("✓ cli.py embeds a corpus in ordered batches with a worker pool")
+    
+    print("Embedding batch tests passed!")
+
+def test_response_cache():
+    """Test caching and replaying deterministic generations"""
+    print("\nTesting response cache...")
+    
+    import tempfile
+    cache = ResponseCache(max_bytes=300, ttl=60)
+    key = ResponseCache.key('sha256:abc', 'Hi', None, {'temperature': 0, 'seed': 1})
+    assert key == ResponseCache.key('sha256:abc', 'Hi', [], {'seed': 1, 'temperature': 0})
+    assert key != ResponseCache.key('sha256:def', 'Hi', None, {'temperature': 0, 'seed': 1})
+    cache.put('a', 'x' * 100, {'done': True})
+    cache.put('b', 'y' * 100, {'done': True})
+    assert cache.get('a')['response'] == 'x' * 100
+    cache.put('c', 'z' * 100, {'done': True})
+    assert cache.get('b') is None and cache.get('a') and cache.get('c')
+    cache.put('huge', 'h' * 1000, {'done': True})
+    assert cache.get('huge') is None
+    print("✓ LRU eviction keeps the cache under its byte cap")
+    
+    disk_dir = tempfile.mkdtemp()
+    cache = ResponseCache(ttl=60, disk_dir=disk_dir)
+    cache.put('k', 'from disk', {'done': True, 'eval_count': 2})
+    restarted = ResponseCache(ttl=60, disk_dir=disk_dir)
+    assert restarted.get('k') == {'response': 'from disk', 'final': {'done': True, 'eval_count': 2}}
+    expired = ResponseCache(ttl=0, disk_dir=disk_dir)
+    assert expired.get('k') is None and not os.listdir(disk_dir)
+    print("✓ Disk tier survives restarts and honours the TTL")
+    
+    reply = Mock(status_code=200)
+    reply.json.return_value = {'model': 'llama2', 'response': 'Hello there', 'done': True, 'eval_count': 2}
+    request_json = {'model': 'llama2', 'prompt': 'Hi', 'options': {'temperature': 0, 'seed': 42}}
+    with patch('ollama_manager.response_cache', ResponseCache()), patch('ollama_manager.api') as mock_api:
+        mock_api.list_models.return_value = [{'name': 'llama2:latest', 'digest': 'sha256:abc'}]
+        mock_api.request.return_value = reply
+        with app.test_client() as client:
+            with client.post('/api/generate', json=request_json) as response:
+                assert response.get_json() == {'success': True, 'response': 'Hello there'}
+            assert mock_api.request.call_args.kwargs['json']['options'] == {'temperature': 0, 'seed': 42}
+            assert client.post('/api/generate', json=request_json).get_json()['cached']
+            assert mock_api.request.call_count == 1
+            print("✓ Identical deterministic requests are served from the cache")
+            
+            response = client.post('/api/generate', json=dict(request_json, stream=True))
+            assert response.headers['X-Cache'] == 'HIT'
+            lines = [json.loads(line) for line in response.get_data().splitlines()]
+            assert ''.join(line['response'] for line in lines) == 'Hello there'
+            assert lines[-1]['done'] and lines[-1]['eval_count'] == 2 and len(lines) == 3
+            print("✓ Cached replies replay as a stream")
+            
+            client.post('/api/generate', json=dict(request_json, options={'temperature': 0.7})).close()
+            client.post('/api/generate', json=dict(request_json, options={'temperature': 0.7})).close()
+            assert mock_api.request.call_count == 3
+            mock_api.list_models.return_value = [{'name': 'llama2:latest', 'digest': 'sha256:new'}]
+            client.post('/api/generate', json=request_json).close()
+            assert mock_api.request.call_count == 4
+    print("✓ Sampled requests and re-pulled models bypass the cache")
+    
+    print("Response cache tests passed!")
+
+def test_response_compression():
+    """Test negotiated, thresholded, cached and streamed response compression"""
+    print("\nTesting response compression...")
+    import gzip
+    import zlib
+    
+    compressor = ResponseCompressor(min_size=300)
+    with patch('ollama_manager.brotli', None):
+        assert compressor.negotiate('gzip, deflate') == 'gzip'
+        assert compressor.negotiate('br;q=1.0, gzip;q=0.5') == 'gzip'
+        assert compressor.negotiate('*') == 'gzip'
+        assert compressor.negotiate('gzip;q=0') is None
+        assert compressor.negotiate('*;q=0, identity') is None
+        assert compressor.negotiate(None) is None
+    brotli_stub = Mock()
+    with patch('ollama_manager.brotli', brotli_stub):
+        assert compressor.negotiate('gzip, br') == 'br'
+        assert compressor.negotiate('gzip, br;q=0.5') == 'gzip'
+    print("✓ Accept-Encoding is negotiated by q-value, preferring brotli")
+    
+    # Each streamed chunk is decodable as soon as it is sent
+    source = Mock()
+    source.__iter__ = Mock(return_value=iter([b'{"response": "Hel"}\n', b'{"response": "lo"}\n']))
+    pieces = compressor.compress_stream(source, 'gzip')
+    decoder = zlib.decompressobj(31)
+    assert decoder.decompress(next(pieces)) == b'{"response": "Hel"}\n'
+    assert decoder.decompress(next(pieces)) == b'{"response": "lo"}\n'
+    pieces.close()
+    source.close.assert_called_once()
+    print("✓ Streams are flushed chunk by chunk and still closed")
+    
+    info = {'license': 'Permission is hereby granted, free of charge. ' * 500, 'modelfile': 'FROM a'}
+    models = [{'name': 'a:latest', 'digest': 'sha256:a', 'modified_at': '2024-01-15T10:30:00Z'}]
+    with app.test_client() as client, patch('ollama_manager.compression', compressor):
+        with patch('ollama_manager.api') as mock_api:
+            mock_api.list_models.return_value = models
+            mock_api.show_model_info.return_value = info
+            
+            response = client.get('/api/info/a', headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['Vary']
+            body = response.get_data()
+            assert len(body) < 2000
+            assert json.loads(gzip.decompress(body))['info'] == info
+            assert response.headers['ETag'].startswith('W/')
+            assert len(compressor._cache) == 1
+            again = client.get('/api/info/a', headers={'Accept-Encoding': 'gzip'})
+            assert again.get_data() == body and len(compressor._cache) == 1
+            print("✓ Large payloads are compressed once and served from the cache")
+            
+            response = client.get('/api/info/a')
+            assert 'Content-Encoding' not in response.headers
+            assert response.get_json()['info'] == info
+            response = client.get('/api/info/a', headers={
+                'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']
+            })
+            assert response.status_code == 304 and 'Content-Encoding' not in response.headers
+            response = client.get('/api/models', headers={'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+            print("✓ Small bodies, 304s and clients without gzip are left alone")
+        
+        chunks = [json.dumps({'response': f'tok{i} ', 'done': False}).encode() for i in range(20)]
+        upstream = Mock()
+        upstream.iter_lines.return_value = iter(chunks)
+        with patch('ollama_manager.api.request', return_value=upstream):
+            response = client.post('/api/generate', headers={'Accept-Encoding': 'gzip'}, json={
+                'model': 'test-model', 'prompt': 'Hi', 'stream': True
+            })
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Content-Length' not in response.headers
+            assert gzip.decompress(response.get_data()).splitlines() == chunks
+            response.close()
+            upstream.close.assert_called_once()
+            print("✓ Generation streams are compressed")
+    
+    print("Response compression tests passed!")
+
+def test_asgi_app():
+    """Test the async serving mode against a fake upstream"""
+    print("\nTesting async serving mode...")
+    
+    import asyncio
+    from load_test import run_in_process
+    from ollama_manager_asgi import app as asgi_app
+    
+    paths = {route.path for route in asgi_app.routes}
+    for path in ('/api/generate', '/api/models', '/api/server/status',
+                 '/api/server/logs', '/api/server/errors'):
+        assert path in paths
+    print("✓ ASGI routes registered correctly")
+    
+    result = asyncio.run(run_in_process(concurrency=200, tokens=5, delay=0.05))
+    assert result['failures'] == 0
+    assert result['peak_upstream_streams'] == 200
+    print(f"✓ {result['peak_upstream_streams']} concurrent streams in {result['elapsed']:.2f}s")
+    
+    import gzip
+    import zlib
+    import httpx
+    from ollama_manager_asgi import AsyncOllamaAPI, create_app
+    
+    async def compressed_stream():
+        first_sent = asyncio.Event()
+        
+        class Upstream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield b'{"response": "Hel", "done": false}\n'
+                # Only finishes once the client has decoded the first token
+                await asyncio.wait_for(first_sent.wait(), 5)
+                yield b'{"response": "lo", "done": true}\n'
+        
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=Upstream()))
+        app = create_app(AsyncOllamaAPI(transport=transport))
+        body = json.dumps({'model': 'm', 'prompt': 'Hi', 'stream': True}).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': '/api/generate', 'raw_path': b'/api/generate', 'query_string': b'',
+            'root_path': '', 'server': ('test', 80), 'client': ('test', 1),
+            'headers': [(b'content-type', b'application/json'), (b'accept-encoding', b'gzip')]
+        }
+        requests_sent = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        async def receive():
+            if requests_sent:
+                return requests_sent.pop()
+            await asyncio.Event().wait()
+        
+        decoder = zlib.decompressobj(31)
+        sent = []
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body' and not first_sent.is_set():
+                assert decoder.decompress(message['body']) == b'{"response": "Hel", "done": false}\n'
+                first_sent.set()
+        await app(scope, receive, send)
+        return sent
+    
+    sent = asyncio.run(compressed_stream())
+    headers = dict(sent[0]['headers'])
+    assert headers[b'content-encoding'] == b'gzip'
+    data = b''.join(message.get('body', b'') for message in sent[1:])
+    assert gzip.decompress(data).splitlines()[-1] == b'{"response": "lo", "done": true}'
+    print("✓ Compressed ASGI streams deliver each token before the upstream finishes")
+    
+    async def summarised_generate():
+        from starlette.applications import Starlette
+        from starlette.responses import JSONResponse
+        from starlette.routing import Route
+        async def generate(request):
+            return JSONResponse({'response': 'Hi', 'done': True})
+        upstream = Starlette(routes=[Route('/api/generate', generate, methods=['POST'])])
+        app = create_app(AsyncOllamaAPI(transport=httpx.ASGITransport(app=upstream)))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://manager') as client:
+            return await client.post('/api/generate', json={
+                'model': 'm', 'prompt': 'Hi', 'history': [{'role': 'user', 'content': 'Earlier'}]
+            })
+    
+    budget = Mock()
+    budget.window.side_effect = lambda model, history, prompt: history
+    with patch('ollama_manager_asgi.context_budget', budget):
+        response = asyncio.run(summarised_generate())
+    assert response.json() == {'success': True, 'response': 'Hi'}
+    budget.window.assert_called_once()
+    print("✓ Summarising history runs in an executor thread")
+    
+    print("Async serving mode tests passed!")
+
+def test_metrics():
+    """Test the Prometheus metrics endpoint"""
+    print("\nTesting metrics...")
+    
+    registry = Metrics()
+    registry.describe('test_latency_seconds', 'histogram', 'Test latency', buckets=(0.1, 1.0))
+    registry.describe('test_total', 'counter', 'Test counter')
+    registry.observe('test_latency_seconds', 0.05, route='/a')
+    registry.observe('test_latency_seconds', 0.5, route='/a')
+    registry.inc('test_total', route='/a')
+    worker = threading.Thread(target=lambda: registry.inc('test_total', 2, route='/a'))
+    worker.start()
+    worker.join()
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{route="/a"} 2' in text
+    assert 'test_total{route="/a"} 3' in text
+    print("✓ Per-thread shards summed into histograms and counters")
+    
+    with app.test_client() as client:
+        with patch('ollama_manager.api.request') as mock_request:
+            mock_request.return_value.json.return_value = {
+                'response': 'Hi', 'done': True, 'eval_count': 50, 'eval_duration': 2_000_000_000
+            }
+            client.post('/api/generate', json={'model': 'metrics-model', 'prompt': 'Hi'}).close()
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+        assert 'ollama_manager_http_request_duration_seconds_count{method="POST",route="/api/generate"}' in text
+        assert 'ollama_manager_generated_tokens_total{model="metrics-model"} 50' in text
+        assert 'ollama_manager_generate_tokens_per_second_bucket{model="metrics-model",le="30"} 1' in text
+        assert 'ollama_manager_pull_jobs_active' in text
+        print("✓ /metrics exposes route, generation and job metrics")
+        
+        from ollama_manager import metrics
+        
+        def sample(name):
+            return sum(float(line.rsplit(' ', 1)[1]) for line in metrics.render().splitlines()
+                       if line.startswith(name))
+        
+        in_flight = sample('ollama_manager_http_requests_in_flight')
+        count = 'ollama_manager_http_request_duration_seconds_count{method="POST",route="/api/generate"}'
+        finished = sample(count)
+        upstream = Mock()
+        upstream.iter_lines.return_value = iter([b'{"response": "Hi", "done": true}'])
+        with patch('ollama_manager.api.request', return_value=upstream):
+            response = client.post('/api/generate', json={'model': 'metrics-model', 'prompt': 'Hi', 'stream': True})
+            assert sample('ollama_manager_http_requests_in_flight') == in_flight + 1
+            assert next(response.response)
+            assert sample(count) == finished
+            response.close()
+        assert sample('ollama_manager_http_requests_in_flight') == in_flight
+        assert sample(count) == finished + 1
+        print("✓ Streamed requests are timed until the response is closed")
+    
+    print("Metrics tests passed!")
+
 def main():
     """Run all tests"""
     print("Running Ollama Manager tests...\n")
     
     try:
         test_ollama_api()
+        test_model_list_cache()
+        test_model_info_cache()
+        test_ollama_fleet()
+        test_generation_router()
+        test_pull_jobs()
+        test_shared_worker_state()
+        test_conversation_store()
+        test_context_budget()
+        test_health_sampler()
+        test_log_tailing()
+        test_monitoring_events()
+        test_error_tracker()
+        test_latency_baselines()
         test_utility_functions()
         test_flask_app()
         test_api_endpoints()
+        test_conditional_requests()
+        test_model_index()
+        test_generate_streaming()
+        test_admission_control()
+        test_embedding_batches()
+        test_response_cache()
+        test_response_compression()
+        test_asgi_app()
+        test_metrics()
         
         print("\n🎉 All tests passed!")
         return 0